@@ -0,0 +1,55 @@
+"""
+Create upcoming message partitions and archive old ones. Intended to run
+periodically (e.g. daily cron); requires PostgreSQL with migration 0006.
+
+Partitions ending more than ARCHIVE_AFTER_DAYS ago are written to
+compressed files in ARCHIVE_DIR and dropped. History pages and exports
+still read them from there.
+
+Usage:
+    python -m app.archive_messages [--older-than-days 365] [--dry-run]
+"""
+import argparse
+import sys
+from datetime import datetime, timedelta, timezone
+from app.config import settings
+from app.database import SessionLocal
+from app.services.archive_service import archive_service
+from app.services.partition_service import partition_service
+
+
+def archive(older_than_days: int, dry_run: bool = False) -> int:
+    """Create the upcoming partitions, then archive the old ones."""
+    db = SessionLocal()
+    try:
+        if not partition_service.is_partitioned(db):
+            print("✗ messages is not partitioned (PostgreSQL with migration 0006 required)")
+            return 1
+
+        cutoff = datetime.now(timezone.utc).date() - timedelta(days=older_than_days)
+        if dry_run:
+            for name in archive_service.archivable(db, cutoff).values():
+                print(f"  Would archive {name}")
+            return 0
+
+        for name in partition_service.ensure_upcoming(db):
+            print(f"✓ Created partition {name}")
+
+        report = archive_service.archive_older_than(db, cutoff)
+        print(f"✓ Archived {len(report.partitions)} partition(s) ending before {cutoff}")
+        for name in report.partitions:
+            print(f"  {name}")
+        print(f"  Messages: {report.messages} ({report.segments} user segments)")
+        print(f"  Written: {report.bytes_written / 1024 / 1024:.1f} MiB to {settings.ARCHIVE_DIR}")
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create upcoming message partitions and archive old ones")
+    parser.add_argument("--older-than-days", type=int, default=settings.ARCHIVE_AFTER_DAYS,
+                        help="Archive partitions that ended more than this many days ago")
+    parser.add_argument("--dry-run", action="store_true", help="List the partitions that would be archived")
+    args = parser.parse_args()
+    sys.exit(archive(args.older_than_days, args.dry_run))
@@ -0,0 +1,33 @@
+"""
+Compact long-term memories: decay importance, merge near-duplicates and
+enforce the per-user cap. Intended to run periodically (e.g. daily cron).
+
+Usage:
+    python -m app.compact_memories [user_id]
+"""
+import sys
+from uuid import UUID
+from app.database import SessionLocal
+from app.services.memory_service import memory_service
+
+
+def compact(user_id: str = None):
+    """Compact memories for one user, or for all users."""
+    db = SessionLocal()
+    try:
+        report = memory_service.compact_memories(
+            db,
+            user_id=UUID(user_id) if user_id else None
+        )
+        print(f"✓ Compacted memories for {report.users} user(s)")
+        print(f"  Decayed: {report.decayed}")
+        print(f"  Merged near-duplicates: {report.merged}")
+        print(f"  Removed over cap: {report.capped}")
+        print(f"  Rows removed: {report.rows_removed}")
+        print(f"  Tokens saved: {report.tokens_saved}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    compact(sys.argv[1] if len(sys.argv) > 1 else None)
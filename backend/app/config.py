@@ -3,7 +3,7 @@ Configuration management using Pydantic Settings.
 Loads environment variables and provides type-safe configuration.
 """
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Any, Dict, List
 
 
 class Settings(BaseSettings):
@@ -14,6 +14,15 @@ class Settings(BaseSettings):
     
     # Redis
     REDIS_URL: str = "redis://localhost:6379/0"
+    REDIS_MAX_CONNECTIONS: int = 50
+    REDIS_SOCKET_TIMEOUT: float = 2.0
+    REDIS_SOCKET_CONNECT_TIMEOUT: float = 2.0
+    REDIS_HEALTH_CHECK_INTERVAL: int = 30
+    
+    # In-process cache tier in front of Redis
+    LOCAL_CACHE_ENABLED: bool = True
+    LOCAL_CACHE_MAX_ENTRIES: int = 1024
+    LOCAL_CACHE_MAX_TTL: float = 60.0  # Upper bound on local staleness, in seconds
     
     # OpenRouter / LLM
     OPENROUTER_API_KEY: str
@@ -23,6 +32,42 @@ class Settings(BaseSettings):
     AI_MAX_TOKENS: int = 500
     AI_BASE_URL: str = "https://openrouter.ai/api/v1"
     
+    # LLM HTTP connection pool (shared async client)
+    LLM_MAX_CONNECTIONS: int = 200
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = 50
+    LLM_KEEPALIVE_EXPIRY: float = 30.0
+    LLM_CONNECT_TIMEOUT: float = 5.0
+    LLM_REQUEST_TIMEOUT: float = 60.0
+    LLM_CLIENT_MAX_RETRIES: int = 0  # Retries are handled by the resilience layer
+    
+    # LLM resilience (deadlines, retries, hedging, circuit breaking)
+    LLM_FALLBACK_MODEL: str = ""  # Hedge/failover target; empty disables hedging
+    LLM_DEADLINE: float = 30.0  # Max seconds for a whole turn, across retries
+    LLM_ATTEMPT_TIMEOUT: float = 20.0
+    LLM_FIRST_TOKEN_TIMEOUT: float = 15.0  # Streaming: max wait for the first chunk
+    LLM_MAX_ATTEMPTS: int = 3
+    LLM_RETRY_BASE_DELAY: float = 0.25
+    LLM_HEDGE_PERCENTILE: float = 95.0  # Hedge once the primary is slower than this
+    LLM_HEDGE_MIN_DELAY: float = 1.0
+    LLM_HEDGE_MIN_SAMPLES: int = 20
+    LLM_LATENCY_WINDOW: int = 200
+    LLM_BREAKER_FAILURE_THRESHOLD: int = 5
+    LLM_BREAKER_RESET_TIMEOUT: float = 30.0
+    
+    # Model routing rules, first match wins (see services/model_router.py);
+    # JSON list in the environment. Empty: every turn uses AI_MODEL / AI_MAX_TOKENS
+    LLM_ROUTES: List[Dict[str, Any]] = []
+    
+    # LLM scheduling (per worker process)
+    LLM_MAX_CONCURRENCY: int = 32  # Completions in flight at once
+    LLM_MAX_QUEUE_DEPTH: int = 256  # Calls allowed to wait for a slot before rejecting
+    LLM_QUEUE_TIMEOUT: float = 30.0  # Max seconds a call waits for a slot
+    
+    # Real-time events ("redis" pub/sub or in-process "local")
+    EVENTS_BACKEND: str = "redis"
+    EVENTS_LOCAL_QUEUE_SIZE: int = 100
+    EVENTS_KEEPALIVE_INTERVAL: float = 15.0
+    
     # Application
     APP_NAME: str = "Disha AI Health Coach"
     DEBUG: bool = False
@@ -32,6 +77,63 @@ class Settings(BaseSettings):
     MAX_CONTEXT_MESSAGES: int = 15
     MAX_INPUT_TOKENS: int = 3000
     MEMORY_EXTRACTION_INTERVAL: int = 5
+    CONTEXT_WINDOW_TTL: int = 3600  # Max age of a cached context window before a DB reload
+    
+    # Memory retrieval (per-user BM25 indexes held in process)
+    MEMORY_INDEX_MAX_USERS: int = 1000
+    MEMORY_INDEX_TTL: float = 900.0
+    MEMORY_INDEX_REFRESH_INTERVAL: float = 10.0  # Seconds between checks for memories added elsewhere
+    
+    # Memory compaction
+    MEMORY_MAX_PER_USER: int = 200
+    MEMORY_MERGE_SIMILARITY: float = 0.8  # Jaccard similarity of terms for near-duplicates
+    MEMORY_DECAY_HALF_LIFE_DAYS: float = 90.0
+    MEMORY_REINFORCE_BOOST: float = 0.1  # Importance added when a memory is extracted again
+    
+    # Token counting ("heuristic", or "bpe" with a tiktoken-format vocab file)
+    TOKENIZER_BACKEND: str = "heuristic"
+    TOKENIZER_VOCAB_PATH: str = ""
+    TOKEN_CACHE_SIZE: int = 10000
+    
+    # Background jobs ("local" asyncio queue or "redis" stream)
+    JOB_QUEUE_BACKEND: str = "local"
+    JOB_QUEUE_WORKERS: int = 2
+    JOB_MAX_RETRIES: int = 3
+    JOB_RETRY_BASE_DELAY: float = 1.0
+    JOB_SHUTDOWN_TIMEOUT: float = 10.0
+    JOB_LOCAL_QUEUE_SIZE: int = 10000
+    JOB_STREAM_KEY: str = "jobs:background"
+    JOB_STREAM_MAXLEN: int = 100000
+    JOB_CONSUMER_GROUP: str = "workers"
+    JOB_CLAIM_IDLE_MS: int = 60000
+    
+    # Response cache for replies driven only by opted-in protocols
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_TTL: int = 86400
+    RESPONSE_CACHE_MAX_MESSAGE_CHARS: int = 200
+    
+    # Protocol matching
+    PROTOCOL_VERSION_CHECK_INTERVAL: float = 30.0  # Seconds between version stamp checks
+    
+    # Bulk history import and export (see services/import_service.py, export_service.py)
+    IMPORT_BATCH_SIZE: int = 5000  # Messages per multi-row INSERT or COPY
+    IMPORT_MAX_REPORTED_ERRORS: int = 100  # Rejected lines listed in the import report
+    EXPORT_BATCH_SIZE: int = 1000  # Rows fetched per round-trip from the server-side cursor
+    
+    # Message partitioning and archival (PostgreSQL; see services/partition_service.py)
+    MESSAGE_PARTITIONS_AHEAD: int = 3  # Monthly partitions created ahead of the current month
+    ARCHIVE_AFTER_DAYS: int = 365  # Partitions entirely older than this are archived
+    ARCHIVE_DIR: str = "archives"  # Must be shared by every API instance
+    ARCHIVE_CACHE_SIZE: int = 32  # Decompressed archive segments kept in memory
+    
+    # Request profiling (opt-in; see services/profiler.py)
+    PROFILING_ENABLED: bool = False
+    PROFILE_SAMPLE_RATE: float = 0.01  # Fraction of requests profiled regardless of latency
+    PROFILE_SLOW_THRESHOLD: float = 2.0  # Requests slower than this (seconds) are always kept
+    PROFILE_INTERVAL: float = 0.01  # Seconds between stack samples
+    PROFILE_DIR: str = "profiles"
+    PROFILE_MAX_FILES: int = 200  # Oldest profiles are deleted beyond this
+    PROFILE_EXCLUDE_PATHS: List[str] = ["/api/events", "/metrics"]  # Path prefixes never profiled
     
     @property
     def cors_origins_list(self) -> List[str]:
@@ -1,20 +1,58 @@
 """
 Database session management and connection configuration.
 """
+import time
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 from .config import settings
+from .services.metrics import metrics
+
+
+pool_checkout_seconds = metrics.histogram(
+    "db_pool_checkout_seconds",
+    "Time spent waiting for a connection from the database pool",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+)
+
 
 # Create database engine
 engine = create_engine(
     settings.DATABASE_URL,
+    poolclass=QueuePool,
     pool_pre_ping=True,
     pool_size=10,
     max_overflow=20,
     echo=settings.DEBUG
 )
 
+_connect = engine.connect
+
+
+def _timed_connect():
+    """Engine.connect that records how long the pool checkout takes."""
+    started = time.perf_counter()
+    try:
+        return _connect()
+    finally:
+        pool_checkout_seconds.observe(time.perf_counter() - started)
+
+
+# Sessions and engine.begin() both check out through engine.connect
+engine.connect = _timed_connect
+
+metrics.sampled(
+    "db_pool_connections",
+    "Database pool connections by state",
+    lambda: {
+        ("checked_out",): engine.pool.checkedout(),
+        ("idle",): engine.pool.checkedin(),
+        ("overflow",): max(0, engine.pool.overflow())
+    },
+    ["state"]
+)
+
 # Session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
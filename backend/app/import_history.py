@@ -0,0 +1,68 @@
+"""
+Bulk import chat history from an NDJSON file (e.g. a migration export).
+
+One message per line with user_id, role, content and timestamp; see
+services/import_service.py for the record format. Users must already exist.
+Records carrying an id (as exports do) that is already stored with the
+same timestamp are skipped, so an export can safely be imported again.
+
+Usage:
+    python -m app.import_history messages.ndjson[.gz] [--extract-memories] [--batch-size 5000]
+    python -m app.import_history - < messages.ndjson
+"""
+import argparse
+import gzip
+import sys
+import time
+from app.database import SessionLocal
+from app.services.import_service import HistoryImport
+
+
+def open_input(path: str):
+    """Open the NDJSON source as binary lines; "-" is stdin."""
+    if path == "-":
+        return sys.stdin.buffer
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def import_history(path: str, extract_memories: bool = False, batch_size: int = None):
+    """Import every line of the file, printing progress per batch."""
+    db = SessionLocal()
+    source = open_input(path)
+    started = time.perf_counter()
+    try:
+        history_import = HistoryImport(db, extract_memories=extract_memories, batch_size=batch_size)
+        for line in source:
+            if history_import.add(line):
+                history_import.flush()
+                report = history_import.report
+                rate = report.imported / (time.perf_counter() - started)
+                print(f"  {report.imported} imported, {report.rejected} rejected ({rate:.0f} messages/s)")
+        report = history_import.finish()
+    finally:
+        if source is not sys.stdin.buffer:
+            source.close()
+        db.close()
+
+    print(f"✓ Imported {report.imported} messages for {report.users} user(s) "
+          f"in {time.perf_counter() - started:.1f}s")
+    if report.duplicates:
+        print(f"  Already imported (skipped): {report.duplicates}")
+    if extract_memories:
+        print(f"  Memories stored or reinforced: {report.memories}")
+    if report.rejected:
+        print(f"  Rejected lines: {report.rejected}")
+        for error in report.errors:
+            print(f"    {error}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import chat history from NDJSON")
+    parser.add_argument("path", help="NDJSON file (.gz allowed), or - for stdin")
+    parser.add_argument("--extract-memories", action="store_true",
+                        help="Extract long-term memories from the imported user messages")
+    parser.add_argument("--batch-size", type=int, help="Messages per batch (default IMPORT_BATCH_SIZE)")
+    args = parser.parse_args()
+    import_history(args.path, args.extract_memories, args.batch_size)
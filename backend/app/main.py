@@ -3,10 +3,17 @@ FastAPI application entry point.
 """
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from datetime import datetime
 
 from .config import settings
+from .middleware import ProfilingMiddleware
 from .routes import chat, users
+from .services.llm_service import llm_service
+from .services.event_service import event_service
+from .services.cache_service import cache_service
+from .services.job_queue import job_queue
+from .services.metrics import metrics
 
 # Create FastAPI app
 app = FastAPI(
@@ -26,11 +33,30 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Opt-in sampling profiler for slow requests
+if settings.PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+
 # Include routers
 app.include_router(chat.router)
 app.include_router(users.router)
 
 
+@app.on_event("startup")
+async def startup():
+    """Start background job workers."""
+    await job_queue.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Drain background jobs and release pooled connections on shutdown."""
+    await job_queue.stop()
+    await llm_service.close()
+    await event_service.close()
+    await cache_service.close()
+
+
 @app.get("/")
 async def root():
     """Root endpoint."""
@@ -52,6 +78,19 @@ async def health_check():
     }
 
 
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    """
+    Prometheus metrics for this worker process.
+    
+    Includes per-stage chat latency, cache hit ratios, database pool
+    checkout wait, LLM token usage, scheduler and resilience metrics.
+    With several workers, scrape each one.
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000, reload=settings.DEBUG)
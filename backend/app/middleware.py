@@ -0,0 +1,61 @@
+"""
+ASGI middleware.
+"""
+import asyncio
+import random
+import time
+from .config import settings
+from .services.profiler import RequestProfile, profile_store, profiles_written, stack_sampler
+
+
+class ProfilingMiddleware:
+    """
+    Profile requests with the stack sampler and keep the interesting ones.
+    
+    Every request is sampled while in flight; its profile is written to the
+    profile directory if it was picked at PROFILE_SAMPLE_RATE or took at
+    least PROFILE_SLOW_THRESHOLD seconds. Paths under PROFILE_EXCLUDE_PATHS
+    (long-lived streams, scrapes) are passed through untouched.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(tuple(settings.PROFILE_EXCLUDE_PATHS)):
+            await self.app(scope, receive, send)
+            return
+        
+        profile = RequestProfile(
+            task=asyncio.current_task(),
+            root=ProfilingMiddleware.__call__.__code__,
+            method=scope["method"],
+            path=scope["path"],
+            sampled=random.random() < settings.PROFILE_SAMPLE_RATE
+        )
+        
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+            await send(message)
+        
+        stack_sampler.start(profile)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            stack_sampler.stop(profile)
+            duration = time.perf_counter() - profile.started
+            reason = None
+            if duration >= settings.PROFILE_SLOW_THRESHOLD:
+                reason = "slow"
+            elif profile.sampled:
+                reason = "sampled"
+            if reason is not None:
+                try:
+                    # Off the event loop; the response has already been sent
+                    await asyncio.get_running_loop().run_in_executor(
+                        None, profile_store.write, profile, duration, reason
+                    )
+                    profiles_written.inc(reason=reason)
+                except OSError as e:
+                    print(f"Profile write error: {e}")
@@ -3,42 +3,69 @@ SQLAlchemy database models for the Disha AI Health Coach.
 """
 import uuid
 from datetime import datetime, timezone
-from sqlalchemy import Column, String, Text, Boolean, Float, Integer, DateTime, ForeignKey, ARRAY
+from sqlalchemy import Column, String, Text, Boolean, Float, Integer, BigInteger, DateTime, ForeignKey, Index, ARRAY, JSON, Uuid
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import relationship
 from .database import Base
 
 
+# PostgreSQL types, with JSON stand-ins so the schema also builds on SQLite
+# (used by the benchmark suite)
+JSONType = JSONB().with_variant(JSON(), "sqlite")
+# A column declared UUID gets numeric affinity on SQLite, which turns hex
+# ids like "1234e567..." into floats; Uuid stores them as CHAR(32)
+UUIDType = UUID(as_uuid=True).with_variant(Uuid(), "sqlite")
+StringArray = ARRAY(String).with_variant(JSON(), "sqlite")
+
+
 class User(Base):
     """User model representing a health coach user."""
     __tablename__ = "users"
     
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(UUIDType, primary_key=True, default=uuid.uuid4)
     name = Column(String(255), nullable=False)
-    user_metadata = Column(JSONB, default=dict)  # Stores age, health conditions, preferences, etc.
+    user_metadata = Column(JSONType, default=dict)  # Stores age, health conditions, preferences, etc.
+    
+    # Denormalized counters, maintained by MessageService on every write
+    message_count = Column(Integer, default=0, server_default="0", nullable=False)  # Messages with role 'user'
+    onboarding_message_count = Column(Integer, default=0, server_default="0", nullable=False)
+    last_extraction_count = Column(Integer, default=0, server_default="0", nullable=False)  # message_count at last memory extraction
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
     updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc), nullable=False)
     
     # Relationships
     messages = relationship("Message", back_populates="user", cascade="all, delete-orphan")
     memories = relationship("Memory", back_populates="user", cascade="all, delete-orphan")
+    message_archives = relationship("MessageArchive", back_populates="user", cascade="all, delete-orphan")
     
     def __repr__(self):
         return f"<User(id={self.id}, name={self.name})>"
 
 
 class Message(Base):
-    """Message model for chat history."""
+    """
+    Message model for chat history.
+    
+    On PostgreSQL the table is range-partitioned by month on created_at,
+    which must therefore be part of the primary key. Old partitions are
+    moved to compressed files (see MessageArchive).
+    """
     __tablename__ = "messages"
     
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False, index=True)
+    id = Column(UUIDType, primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUIDType, ForeignKey("users.id"), nullable=False)
     role = Column(String(20), nullable=False)  # 'user' or 'assistant'
     content = Column(Text, nullable=False)
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False, index=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), primary_key=True, index=True)
     is_onboarding = Column(Boolean, default=False)
     token_count = Column(Integer, default=0)
     
+    # Serves history pages and context windows as a single range scan;
+    # also covers lookups by user_id alone
+    __table_args__ = (
+        Index("ix_messages_user_created_id", user_id, created_at.desc(), id.desc()),
+    )
+    
     # Relationships
     user = relationship("User", back_populates="messages")
     
@@ -46,20 +73,60 @@ class Message(Base):
         return f"<Message(id={self.id}, role={self.role}, user_id={self.user_id})>"
 
 
+class MessageArchive(Base):
+    """
+    Index entry for one user's messages in an archived partition file.
+    
+    Archive files are gzipped NDJSON with one gzip member per user, so a
+    user's messages are read by decompressing the byte range
+    [offset, offset + length) of the file alone.
+    """
+    __tablename__ = "message_archives"
+    
+    id = Column(UUIDType, primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUIDType, ForeignKey("users.id"), nullable=False)
+    partition = Column(String(63), nullable=False)  # Name of the archived partition
+    path = Column(String(255), nullable=False)  # Relative to ARCHIVE_DIR
+    offset = Column(BigInteger, nullable=False)
+    length = Column(BigInteger, nullable=False)
+    message_count = Column(Integer, nullable=False)
+    user_message_count = Column(Integer, nullable=False)  # For counter reconciliation
+    onboarding_message_count = Column(Integer, nullable=False)
+    first_created_at = Column(DateTime, nullable=False)
+    last_created_at = Column(DateTime, nullable=False)
+    archived_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+    
+    __table_args__ = (
+        Index("ix_message_archives_user_last_created", user_id, last_created_at.desc()),
+    )
+    
+    # Relationships
+    user = relationship("User", back_populates="message_archives")
+    
+    def __repr__(self):
+        return f"<MessageArchive(partition={self.partition}, user_id={self.user_id}, messages={self.message_count})>"
+
+
 class Memory(Base):
     """Long-term memory storage for user context."""
     __tablename__ = "memories"
     
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False, index=True)
+    id = Column(UUIDType, primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUIDType, ForeignKey("users.id"), nullable=False, index=True)
     content = Column(Text, nullable=False)
     category = Column(String(100), nullable=False)  # e.g., 'demographics', 'health_condition', 'medication'
     importance_score = Column(Float, default=0.5)  # 0.0 to 1.0
+    content_hash = Column(String(32), nullable=False)  # Hash of normalized content, for dedup
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+    scored_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))  # When importance_score was last set
     
     # Relationships
     user = relationship("User", back_populates="memories")
     
+    __table_args__ = (
+        Index("ix_memories_user_content_hash", user_id, content_hash, unique=True),
+    )
+    
     def __repr__(self):
         return f"<Memory(id={self.id}, category={self.category}, user_id={self.user_id})>"
 
@@ -68,11 +135,12 @@ class Protocol(Base):
     """Medical and operational protocols."""
     __tablename__ = "protocols"
     
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(UUIDType, primary_key=True, default=uuid.uuid4)
     name = Column(String(255), nullable=False, unique=True)
     description = Column(Text, nullable=False)
-    instructions = Column(JSONB, nullable=False)  # Structured protocol steps
-    keywords = Column(ARRAY(String), nullable=False)  # Keywords for matching
+    instructions = Column(JSONType, nullable=False)  # Structured protocol steps
+    keywords = Column(StringArray, nullable=False)  # Keywords for matching
+    response_cacheable = Column(Boolean, default=False, server_default="false", nullable=False)  # Opt in to the response cache
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
     
     def __repr__(self):
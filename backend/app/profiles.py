@@ -0,0 +1,170 @@
+"""
+Inspect request profiles captured by the profiling middleware.
+
+Usage:
+    python -m app.profiles list [--limit 20] [--slowest]
+    python -m app.profiles top [--limit 10]
+    python -m app.profiles show <profile id or prefix> [--limit 15]
+    python -m app.profiles folded <profile id or prefix> [--loop] > profile.folded
+
+`top` ranks endpoints by captured latency and functions by the time slow
+requests spent in them. `folded` prints flamegraph input (flamegraph.pl,
+speedscope).
+"""
+import argparse
+import re
+import statistics
+import sys
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Tuple
+from app.services.profiler import profile_store
+
+
+_UUID = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}", re.IGNORECASE)
+
+
+def endpoint(profile: Dict[str, Any]) -> str:
+    """Method and path with IDs collapsed, e.g. GET /api/users/{id}."""
+    return f"{profile['method']} {_UUID.sub('{id}', profile['path'])}"
+
+
+APP_PREFIX = "app/"
+
+
+def function_times(stacks: Dict[str, int]) -> Tuple[Counter, Counter, Counter]:
+    """
+    Samples per function.
+
+    Returns:
+        (app functions anywhere on the stack, innermost app function,
+        top of the stack including libraries)
+    """
+    inclusive, innermost, leaf = Counter(), Counter(), Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(";")
+        app_frames = [frame for frame in frames if frame.startswith(APP_PREFIX)]
+        for frame in set(app_frames):
+            inclusive[frame] += count
+        if app_frames:
+            innermost[app_frames[-1]] += count
+        leaf[frames[-1]] += count
+    return inclusive, innermost, leaf
+
+
+def print_functions(title: str, counts: Counter, total: int, interval_ms: float, limit: int) -> None:
+    print(f"\n{title}")
+    for frame, count in counts.most_common(limit):
+        share = count / total if total else 0.0
+        print(f"  {share:>6.1%} {count * interval_ms:>9.0f}ms  {frame}")
+
+
+def list_profiles(profiles: List[Dict[str, Any]], limit: int, slowest: bool) -> None:
+    if slowest:
+        profiles = sorted(profiles, key=lambda p: p["duration_ms"], reverse=True)
+    else:
+        profiles = list(reversed(profiles))
+
+    print(f"{'id':<25} {'ms':>9} {'reason':<8} {'status':>6}  endpoint")
+    for profile in profiles[:limit]:
+        print(
+            f"{profile['id']:<25} {profile['duration_ms']:>9.0f} {profile['reason']:<8} "
+            f"{profile['status'] or '-':>6}  {endpoint(profile)}"
+        )
+
+
+def top(profiles: List[Dict[str, Any]], limit: int) -> None:
+    by_endpoint = defaultdict(list)
+    for profile in profiles:
+        by_endpoint[endpoint(profile)].append(profile["duration_ms"])
+
+    print(f"{'endpoint':<40} {'profiles':>8} {'median ms':>10} {'max ms':>10}")
+    ranked = sorted(by_endpoint.items(), key=lambda item: max(item[1]), reverse=True)
+    for name, durations in ranked[:limit]:
+        print(f"{name:<40} {len(durations):>8} {statistics.median(durations):>10.0f} {max(durations):>10.0f}")
+
+    slow = [profile for profile in profiles if profile["reason"] == "slow"]
+    label = "slow"
+    if not slow:
+        slow, label = profiles, "captured"
+    stacks, loop_stacks = Counter(), Counter()
+    for profile in slow:
+        stacks.update(profile["stacks"])
+        loop_stacks.update(profile["loop_stacks"])
+
+    print(f"\nAcross {len(slow)} {label} profile(s):")
+    print_summary(stacks, loop_stacks, slow[0]["interval_ms"], limit)
+
+
+def print_summary(stacks: Dict[str, int], loop_stacks: Dict[str, int], interval_ms: float, limit: int) -> None:
+    total = sum(stacks.values())
+    inclusive, innermost, leaf = function_times(stacks)
+    print_functions("Time in app code (inclusive):", inclusive, total, interval_ms, limit)
+    print_functions("Innermost app function:", innermost, total, interval_ms, limit)
+    print_functions("Running or awaiting (top of stack):", leaf, total, interval_ms, limit)
+    if loop_stacks:
+        print_functions(
+            "Event loop busy with other work while waiting, in:",
+            function_times(loop_stacks)[1], total, interval_ms, limit
+        )
+
+
+def show(profile: Dict[str, Any], limit: int) -> None:
+    print(f"{profile['id']}  {endpoint(profile)}  status {profile['status']}")
+    print(f"{profile['duration_ms']:.0f}ms ({profile['reason']}), {profile['samples']} samples "
+          f"every {profile['interval_ms']:.0f}ms, started {profile['started_at']}")
+
+    print_summary(profile["stacks"], profile["loop_stacks"], profile["interval_ms"], limit)
+
+    print("\nHottest stacks:")
+    for stack, count in Counter(profile["stacks"]).most_common(min(limit, 5)):
+        print(f"  {count:>5} samples")
+        for frame in stack.split(";")[-8:]:
+            print(f"        {frame}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Inspect captured request profiles")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = commands.add_parser("list", help="Captured profiles, newest first")
+    list_parser.add_argument("--limit", type=int, default=20)
+    list_parser.add_argument("--slowest", action="store_true", help="Sort by duration")
+
+    top_parser = commands.add_parser("top", help="Slowest endpoints and hottest functions")
+    top_parser.add_argument("--limit", type=int, default=10)
+
+    show_parser = commands.add_parser("show", help="Summarize one profile")
+    show_parser.add_argument("profile_id")
+    show_parser.add_argument("--limit", type=int, default=15)
+
+    folded_parser = commands.add_parser("folded", help="Print folded stacks for flamegraph tools")
+    folded_parser.add_argument("profile_id")
+    folded_parser.add_argument("--loop", action="store_true", help="Event loop stacks instead")
+
+    args = parser.parse_args()
+
+    if args.command in ("show", "folded"):
+        profile = profile_store.load(args.profile_id)
+        if profile is None:
+            print(f"No single profile matches {args.profile_id!r} in {profile_store.directory}")
+            return 1
+        if args.command == "show":
+            show(profile, args.limit)
+        else:
+            for stack, count in profile["loop_stacks" if args.loop else "stacks"].items():
+                print(f"{stack} {count}")
+        return 0
+
+    profiles = profile_store.load_all()
+    if not profiles:
+        print(f"No profiles in {profile_store.directory}")
+        return 0
+    if args.command == "list":
+        list_profiles(profiles, args.limit, args.slowest)
+    else:
+        top(profiles, args.limit)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,27 @@
+"""
+Recompute per-user message counters from the messages table.
+
+Usage:
+    python -m app.reconcile_counters [user_id]
+"""
+import sys
+from uuid import UUID
+from app.database import SessionLocal
+from app.services.message_service import message_service
+
+
+def reconcile(user_id: str = None):
+    """Reconcile counters for one user, or for all users."""
+    db = SessionLocal()
+    try:
+        updated = message_service.reconcile_counters(
+            db,
+            user_id=UUID(user_id) if user_id else None
+        )
+        print(f"✓ Reconciled message counters for {updated} user(s)")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    reconcile(sys.argv[1] if len(sys.argv) > 1 else None)
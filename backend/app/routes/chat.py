@@ -1,28 +1,89 @@
 """
 Chat routes for message handling and conversation management.
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import Optional
+from typing import Any, AsyncIterator, Dict, Optional
 from uuid import UUID
 from datetime import datetime
+import asyncio
+import json
 
-from ..database import get_db
+from ..config import settings
+from ..database import get_db, SessionLocal
 from ..models import User, Message
 from ..schemas import (
     MessageCreate,
     MessageResponse,
     ChatResponse,
     MessageHistoryResponse,
+    HistoryImportResponse,
     OnboardingRequest,
     OnboardingResponse
 )
-from ..services.llm_service import llm_service
+from ..services.llm_service import llm_service, stage_seconds
 from ..services.cache_service import cache_service
+from ..services.event_service import event_service
+from ..services.import_service import HistoryImport
+from ..services.llm_scheduler import LLMOverloadedError, llm_scheduler
+from ..services.message_service import InvalidCursorError, message_service
+from ..services.response_cache import response_cache
 
 router = APIRouter(prefix="/api", tags=["chat"])
 
 
+def _overloaded() -> HTTPException:
+    """503 telling the client to retry once LLM capacity frees up."""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="The coach is busy right now. Please try again in a moment.",
+        headers={"Retry-After": "5"}
+    )
+
+
+def _check_llm_capacity() -> None:
+    """Reject a turn up front, before storing anything, if the LLM queue is full."""
+    if not llm_scheduler.has_capacity():
+        llm_scheduler.rejected.inc(reason="admission")
+        raise _overloaded()
+
+
+async def _set_typing(user_id: UUID, is_typing: bool) -> None:
+    """Update the polled typing flag and push the change to subscribers."""
+    await cache_service.aset_typing_indicator(str(user_id), is_typing)
+    await event_service.publish(str(user_id), "typing", {"is_typing": is_typing})
+
+
+async def _start_turn(user_id: UUID, user_message: Message) -> Optional[Dict[str, Any]]:
+    """
+    Set the typing flag, append the stored user message to the cached
+    context window and prefetch cached context, all in one Redis round-trip.
+    
+    Returns:
+        Prefetched values for build_context, or None if Redis is unavailable
+    """
+    prefetched = await cache_service.execute_batch(
+        sets={
+            cache_service.typing_key(str(user_id)): (
+                {"is_typing": True},
+                cache_service.TYPING_EXPIRY
+            )
+        },
+        list_appends=llm_service.context_window_append(user_message),
+        gets=llm_service.context_cache_keys(user_id),
+        list_gets=[llm_service.context_window_key(user_id)]
+    )
+    await event_service.publish(str(user_id), "typing", {"is_typing": True})
+    return prefetched
+
+
+async def _publish_messages(user_id: UUID, *messages: Dict[str, Any]) -> None:
+    """Push newly stored messages to subscribers."""
+    for message in messages:
+        await event_service.publish(str(user_id), "message", message)
+
+
 @router.post("/messages", response_model=ChatResponse, status_code=status.HTTP_201_CREATED)
 async def send_message(
     message_data: MessageCreate,
@@ -37,83 +98,237 @@ async def send_message(
     3. Generates AI response using LLM service
     4. Stores AI response
     5. Returns both messages
+    
+    Each step's latency is recorded in chat_stage_seconds.
     """
     # Verify user exists
-    user = db.query(User).filter(User.id == message_data.user_id).first()
+    with stage_seconds.time(handler="send_message", stage="user_lookup"):
+        user = db.query(User).filter(User.id == message_data.user_id).first()
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"User with ID {message_data.user_id} not found"
         )
     
+    _check_llm_capacity()
+    
     # Create and store user message
-    user_message = Message(
-        user_id=message_data.user_id,
-        role="user",
-        content=message_data.content,
-        is_onboarding=message_data.is_onboarding,
-        token_count=llm_service.count_tokens(message_data.content)
-    )
-    db.add(user_message)
-    db.commit()
-    db.refresh(user_message)
+    with stage_seconds.time(handler="send_message", stage="store_user_message"):
+        user_message = message_service.store_message(
+            db,
+            user_id=message_data.user_id,
+            role="user",
+            content=message_data.content,
+            is_onboarding=message_data.is_onboarding,
+            token_count=llm_service.count_tokens(message_data.content)
+        )
+        user_message_data = MessageResponse.from_orm(user_message)
+    await _publish_messages(message_data.user_id, user_message_data.model_dump(mode="json"))
     
-    # Set typing indicator
-    cache_service.set_typing_indicator(str(message_data.user_id), True)
+    # Set typing indicator and prefetch cached context
+    with stage_seconds.time(handler="send_message", stage="start_turn"):
+        prefetched = await _start_turn(message_data.user_id, user_message)
     
     try:
         # Generate AI response
-        ai_content = llm_service.generate_response(
-            user_id=message_data.user_id,
-            user_message=message_data.content,
-            db=db,
-            is_onboarding=message_data.is_onboarding
-        )
+        with stage_seconds.time(handler="send_message", stage="generate"):
+            ai_content = await llm_service.generate_response_async(
+                user_id=message_data.user_id,
+                user_message=message_data.content,
+                db=db,
+                is_onboarding=message_data.is_onboarding,
+                prefetched=prefetched
+            )
         
         # Create and store AI message
-        ai_message = Message(
-            user_id=message_data.user_id,
-            role="assistant",
-            content=ai_content,
-            is_onboarding=message_data.is_onboarding,
-            token_count=llm_service.count_tokens(ai_content)
-        )
-        db.add(ai_message)
-        db.commit()
-        db.refresh(ai_message)
+        with stage_seconds.time(handler="send_message", stage="store_ai_message"):
+            ai_message = message_service.store_message(
+                db,
+                user_id=message_data.user_id,
+                role="assistant",
+                content=ai_content,
+                is_onboarding=message_data.is_onboarding,
+                token_count=llm_service.count_tokens(ai_content)
+            )
+            ai_message_data = MessageResponse.from_orm(ai_message)
         
-        # Clear typing indicator
-        cache_service.set_typing_indicator(str(message_data.user_id), False)
+        with stage_seconds.time(handler="send_message", stage="finish"):
+            await llm_service.append_to_context_window(ai_message)
+            
+            # Clear typing indicator
+            await _set_typing(message_data.user_id, False)
+            await _publish_messages(message_data.user_id, ai_message_data.model_dump(mode="json"))
         
         return ChatResponse(
-            user_message=MessageResponse.from_orm(user_message),
-            ai_response=MessageResponse.from_orm(ai_message)
+            user_message=user_message_data,
+            ai_response=ai_message_data
         )
         
+    except LLMOverloadedError:
+        await _set_typing(message_data.user_id, False)
+        raise _overloaded()
     except Exception as e:
         # Clear typing indicator on error
-        cache_service.set_typing_indicator(str(message_data.user_id), False)
+        await _set_typing(message_data.user_id, False)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error generating response: {str(e)}"
         )
 
 
+def _sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format a Server-Sent Events frame."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/messages/stream")
+async def stream_message(
+    message_data: MessageCreate,
+    db: Session = Depends(get_db)
+):
+    """
+    Send a message and stream the AI response as Server-Sent Events.
+    
+    Emits `token` events with content deltas as the model produces them,
+    then a single `done` event carrying both stored messages (with their
+    IDs) once the assistant message has been persisted. If generation
+    fails, an `error` event precedes `done` with the fallback reply.
+    """
+    # Verify user exists
+    user = db.query(User).filter(User.id == message_data.user_id).first()
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"User with ID {message_data.user_id} not found"
+        )
+    
+    _check_llm_capacity()
+    
+    # Create and store user message
+    user_message = message_service.store_message(
+        db,
+        user_id=message_data.user_id,
+        role="user",
+        content=message_data.content,
+        is_onboarding=message_data.is_onboarding,
+        token_count=llm_service.count_tokens(message_data.content)
+    )
+    user_message_data = MessageResponse.from_orm(user_message).model_dump(mode="json")
+    await _publish_messages(message_data.user_id, user_message_data)
+    
+    prefetched = await _start_turn(message_data.user_id, user_message)
+    
+    # Serve deterministic protocol answers from the response cache
+    protocols, version = llm_service.match_protocols(message_data.content, db, prefetched)
+    cache_key = response_cache.key_for(
+        message_data.content, protocols, version, message_data.is_onboarding
+    )
+    cached = await response_cache.aget(cache_key) if cache_key is not None else None
+    
+    # Build context up front; the request session is released before the
+    # response body starts streaming. Replies that will be cached are shared
+    # between users, so they get no user context
+    context = None
+    if cached is None and cache_key is not None:
+        context = llm_service.build_cacheable_context(message_data.content, protocols)
+    elif cached is None:
+        context = llm_service.build_context(
+            message_data.user_id,
+            message_data.content,
+            db,
+            prefetched,
+            matched_protocols=protocols
+        )
+    
+    async def completion_tokens() -> AsyncIterator[str]:
+        if cached is not None:
+            yield cached
+            return
+        async for token in llm_service.stream_completion_async(
+            context,
+            message_data.user_id,
+            message_data.is_onboarding,
+            protocols
+        ):
+            yield token
+    
+    async def event_stream() -> AsyncIterator[str]:
+        chunks = []
+        failed = False
+        try:
+            try:
+                async for token in completion_tokens():
+                    chunks.append(token)
+                    yield _sse_event("token", {"content": token})
+            except Exception as e:
+                print(f"LLM stream error: {e}")
+                failed = True
+                if not chunks:
+                    chunks.append(llm_service.FALLBACK_RESPONSE)
+                yield _sse_event("error", {"detail": "Error generating response"})
+            
+            ai_content = "".join(chunks)
+            
+            # Persist the final assistant message in a session owned by the stream
+            stream_db = SessionLocal()
+            try:
+                ai_message = message_service.store_message(
+                    stream_db,
+                    user_id=message_data.user_id,
+                    role="assistant",
+                    content=ai_content,
+                    is_onboarding=message_data.is_onboarding,
+                    token_count=llm_service.count_tokens(ai_content)
+                )
+                ai_message_data = MessageResponse.from_orm(ai_message).model_dump(mode="json")
+                await llm_service.append_to_context_window(ai_message)
+            finally:
+                stream_db.close()
+            
+            if not failed:
+                if cache_key is not None and cached is None and ai_content:
+                    await response_cache.aset(cache_key, ai_content)
+                await llm_service.enqueue_memory_extraction(
+                    message_data.user_id,
+                    message_data.content,
+                    ai_content
+                )
+            
+            yield _sse_event("done", {
+                "user_message": user_message_data,
+                "ai_response": ai_message_data
+            })
+            await _publish_messages(message_data.user_id, ai_message_data)
+        finally:
+            await _set_typing(message_data.user_id, False)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+
 @router.get("/messages", response_model=MessageHistoryResponse)
 async def get_messages(
     user_id: UUID,
-    before: Optional[UUID] = None,
+    before: Optional[str] = None,
     limit: int = 50,
     db: Session = Depends(get_db)
 ):
     """
     Get paginated message history for a user.
     
-    Implements cursor-based pagination for efficient infinite scroll.
+    Implements keyset pagination on (created_at, id) for efficient
+    infinite scroll.
     
     Args:
         user_id: User ID
-        before: Message ID cursor (get messages before this ID)
+        before: Opaque cursor from a previous page's next_cursor (a plain
+            message ID is still accepted from older clients)
         limit: Number of messages to return (max 100)
         
     Returns:
@@ -131,25 +346,32 @@ async def get_messages(
             detail=f"User with ID {user_id} not found"
         )
     
-    # Build query
-    query = db.query(Message).filter(Message.user_id == user_id)
-    
-    # Apply cursor if provided
+    # Decode cursor if provided
+    cursor = None
     if before:
-        cursor_message = db.query(Message).filter(Message.id == before).first()
-        if cursor_message:
-            query = query.filter(Message.created_at < cursor_message.created_at)
-    
-    # Order by most recent first and limit
-    messages = query.order_by(Message.created_at.desc()).limit(limit + 1).all()
+        try:
+            legacy_id = UUID(before)
+        except ValueError:
+            legacy_id = None
+        
+        if legacy_id is not None:
+            cursor_message = db.query(Message).filter(Message.id == legacy_id).first()
+            if cursor_message:
+                cursor = (cursor_message.created_at, cursor_message.id)
+        else:
+            try:
+                cursor = message_service.decode_cursor(before)
+            except InvalidCursorError as e:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=str(e)
+                )
     
-    # Check if there are more messages
-    has_more = len(messages) > limit
-    if has_more:
-        messages = messages[:limit]
+    # Most recent first
+    messages, has_more = message_service.get_page(db, user_id, before=cursor, limit=limit)
     
     # Determine next cursor
-    next_cursor = messages[-1].id if messages and has_more else None
+    next_cursor = message_service.encode_cursor(messages[-1]) if messages and has_more else None
     
     # Reverse to chronological order for display
     messages.reverse()
@@ -161,6 +383,47 @@ async def get_messages(
     )
 
 
+async def _body_lines(request: Request) -> AsyncIterator[bytes]:
+    """Split a streamed request body into lines without buffering all of it."""
+    pending = b""
+    async for chunk in request.stream():
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line
+    if pending:
+        yield pending
+
+
+@router.post("/messages/import", response_model=HistoryImportResponse)
+async def import_messages(
+    request: Request,
+    extract_memories: bool = False,
+    db: Session = Depends(get_db)
+):
+    """
+    Bulk import chat history from an NDJSON body (application/x-ndjson).
+    
+    One message per line with user_id, role, content and timestamp (see
+    services/import_service.py). Messages are stored in batches without
+    calling the LLM; user counters are updated and cached context windows
+    dropped. With extract_memories, long-term memories are extracted from
+    the imported user messages too. Invalid lines and unknown users are
+    skipped and reported. For very large migrations prefer the CLI:
+    python -m app.import_history.
+    """
+    history_import = HistoryImport(db, extract_memories=extract_memories)
+    
+    # Batches are written in a worker thread so the event loop keeps
+    # serving other requests during long imports
+    async for line in _body_lines(request):
+        if history_import.add(line):
+            await asyncio.to_thread(history_import.flush)
+    report = await asyncio.to_thread(history_import.finish)
+    
+    return HistoryImportResponse(**vars(report))
+
+
 @router.post("/onboarding", response_model=OnboardingResponse)
 async def start_onboarding(
     request: OnboardingRequest,
@@ -181,21 +444,19 @@ async def start_onboarding(
         )
     
     # Check if onboarding is already complete
-    onboarding_messages = db.query(Message).filter(
-        Message.user_id == request.user_id,
-        Message.is_onboarding == True
-    ).count()
-    
-    onboarding_complete = onboarding_messages >= 10  # After ~5 exchanges
+    onboarding_complete = user.onboarding_message_count >= 10  # After ~5 exchanges
     
     if request.message:
         # User provided a response, generate next onboarding question
-        ai_response = llm_service.generate_response(
-            user_id=request.user_id,
-            user_message=request.message,
-            db=db,
-            is_onboarding=True
-        )
+        try:
+            ai_response = await llm_service.generate_response_async(
+                user_id=request.user_id,
+                user_message=request.message,
+                db=db,
+                is_onboarding=True
+            )
+        except LLMOverloadedError:
+            raise _overloaded()
     else:
         # Initial onboarding message
         ai_response = llm_service.get_onboarding_prompt(user.name)
@@ -207,12 +468,46 @@ async def start_onboarding(
     )
 
 
+@router.get("/events/{user_id}")
+async def stream_events(user_id: UUID, request: Request):
+    """
+    Push channel for typing and new-message events (Server-Sent Events).
+    
+    Emits `typing` events ({"is_typing": bool}) when the AI starts or stops
+    generating and `message` events with each newly stored message. A
+    comment line is sent periodically to keep idle connections open.
+    """
+    subscription = await event_service.subscribe(str(user_id))
+    
+    async def event_stream() -> AsyncIterator[str]:
+        try:
+            yield ": connected\n\n"
+            while not await request.is_disconnected():
+                event = await subscription.get(timeout=settings.EVENTS_KEEPALIVE_INTERVAL)
+                if event is None:
+                    yield ": keepalive\n\n"
+                    continue
+                yield _sse_event(event["type"], event["data"])
+        finally:
+            await subscription.close()
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+
 @router.get("/typing/{user_id}")
 async def get_typing_status(user_id: UUID):
     """
     Get typing indicator status for a user.
     
     Returns whether the AI is currently generating a response.
+    Kept for older clients; new clients should use /api/events/{user_id}.
     """
-    is_typing = cache_service.get_typing_indicator(str(user_id))
+    is_typing = await cache_service.aget_typing_indicator(str(user_id))
     return {"is_typing": is_typing, "user_id": str(user_id)}
@@ -2,12 +2,14 @@
 User management routes.
 """
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from uuid import UUID
 
 from ..database import get_db
 from ..models import User
 from ..schemas import UserCreate, UserResponse
+from ..services.export_service import export_service
 
 router = APIRouter(prefix="/api/users", tags=["users"])
 
@@ -41,3 +43,30 @@ async def get_user(
             detail=f"User with ID {user_id} not found"
         )
     return UserResponse.from_orm(user)
+
+
+@router.get("/{user_id}/export")
+async def export_user_history(
+    user_id: UUID,
+    db: Session = Depends(get_db)
+):
+    """
+    Stream the user's full history as NDJSON.
+    
+    One `user` line, then every `message` oldest first, then every
+    `memory`. Rows are read through a server-side cursor and written as
+    they arrive, so memory use is the same for 100 messages or a million.
+    Message lines can be fed back to POST /api/messages/import.
+    """
+    if not db.query(User.id).filter(User.id == user_id).first():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"User with ID {user_id} not found"
+        )
+    
+    # A sync iterator: Starlette runs each step in a worker thread
+    return StreamingResponse(
+        export_service.export_lines(user_id),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="history-{user_id}.ndjson"'}
+    )
@@ -66,14 +66,23 @@ class ChatResponse(BaseModel):
 
 class MessageHistoryRequest(BaseModel):
     user_id: UUID
-    before: Optional[UUID] = None  # Cursor for pagination
+    before: Optional[str] = None  # Opaque keyset cursor for pagination
     limit: int = Field(default=50, ge=1, le=100)
 
 
 class MessageHistoryResponse(BaseModel):
     messages: List[MessageResponse]
     has_more: bool
-    next_cursor: Optional[UUID] = None
+    next_cursor: Optional[str] = None
+
+
+class HistoryImportResponse(BaseModel):
+    imported: int
+    duplicates: int  # Already stored (same id and timestamp), skipped
+    rejected: int
+    users: int
+    memories: int
+    errors: List[str]  # First rejected lines, with reasons
 
 
 # ==================== Memory Schemas ====================
@@ -0,0 +1,245 @@
+"""
+Archival of old message partitions to compressed local files.
+
+A partition entirely older than ARCHIVE_AFTER_DAYS is written to
+ARCHIVE_DIR as gzipped NDJSON, then detached and dropped. Each user's rows
+form one gzip member (newest first) and get a MessageArchive index row
+with the member's byte range, so reading one user's archived history
+decompresses only their part of the file. Concatenated members are a valid
+.gz file, and lines use the history import format, so `zcat` reads an
+archive and `python -m app.import_history` restores one.
+
+History pages read archives only once the live table runs out, which
+assumes archived months are older than every live row. Importing history
+into an already archived month breaks that until the month is archived
+again.
+"""
+import gzip
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import date, datetime, timezone
+from itertools import groupby
+from sqlalchemy import insert, text
+from sqlalchemy.orm import Session
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from uuid import UUID
+from ..config import settings
+from ..models import Message, MessageArchive
+from .partition_service import PARENT, next_month, partition_service
+
+
+ArchivedRow = Tuple[datetime, UUID, Dict[str, Any]]
+
+
+def timestamp_text(value: Optional[datetime]) -> Optional[str]:
+    """ISO 8601 in UTC; stored timestamps are naive UTC."""
+    if value is None:
+        return None
+    return value.isoformat() + "Z" if value.tzinfo is None else value.isoformat()
+
+
+def message_record(row: Any) -> Dict[str, Any]:
+    """A message as an NDJSON record in the history import format."""
+    return {
+        "type": "message",
+        "id": str(row.id),
+        "user_id": str(row.user_id),
+        "role": row.role,
+        "content": row.content,
+        "timestamp": timestamp_text(row.created_at),
+        "is_onboarding": bool(row.is_onboarding),
+        "token_count": row.token_count or 0
+    }
+
+
+@dataclass
+class ArchiveReport:
+    """Outcome of an archival run."""
+    partitions: List[str] = field(default_factory=list)
+    messages: int = 0
+    segments: int = 0
+    bytes_written: int = 0
+
+
+class ArchiveService:
+    """Writes message partitions to archive files and reads them back."""
+
+    def __init__(self):
+        # Decoded segments by MessageArchive id, so paging through one
+        # archived month decompresses it once
+        self._segments: "OrderedDict[UUID, List[ArchivedRow]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def archivable(self, db: Session, cutoff: date) -> Dict[date, str]:
+        """Monthly partitions that end on or before the cutoff date."""
+        months, _ = partition_service.list_partitions(db)
+        return {month: name for month, name in sorted(months.items()) if next_month(month) <= cutoff}
+
+    def archive_partition(self, db: Session, month: date, name: str, report: Optional[ArchiveReport] = None) -> ArchiveReport:
+        """
+        Archive one partition: write its file, index it, detach and drop it.
+
+        Runs in one transaction that locks the partition against writes, so
+        the file holds exactly the rows dropped. The file is fsynced and
+        renamed into place before the drop commits; if anything fails, the
+        transaction is rolled back and the partition is untouched.
+        """
+        report = report or ArchiveReport()
+        os.makedirs(settings.ARCHIVE_DIR, exist_ok=True)
+        path = f"{name}-{datetime.now(timezone.utc):%Y%m%dT%H%M%S}.ndjson.gz"
+        full_path = os.path.join(settings.ARCHIVE_DIR, path)
+        temporary = full_path + ".tmp"
+
+        try:
+            db.execute(text(f'LOCK TABLE "{name}" IN SHARE MODE'))
+            rows = db.execute(text(
+                f"SELECT id, user_id, role, content, created_at, is_onboarding, token_count "
+                f'FROM "{name}" ORDER BY user_id, created_at DESC, id DESC'
+            ).columns(
+                Message.id, Message.user_id, Message.role, Message.content,
+                Message.created_at, Message.is_onboarding, Message.token_count
+            ).execution_options(yield_per=settings.EXPORT_BATCH_SIZE))
+
+            segments = []
+            with open(temporary, "wb") as raw:
+                for user_id, user_rows in groupby(rows, key=lambda row: row.user_id):
+                    offset = raw.tell()
+                    count = user_messages = onboarding_messages = 0
+                    with gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as member:
+                        for row in user_rows:
+                            if count == 0:
+                                last_created_at = row.created_at
+                            first_created_at = row.created_at
+                            count += 1
+                            user_messages += row.role == "user"
+                            onboarding_messages += bool(row.is_onboarding)
+                            member.write((json.dumps(message_record(row), ensure_ascii=False) + "\n").encode("utf-8"))
+                    segments.append({
+                        "user_id": user_id,
+                        "partition": name,
+                        "path": path,
+                        "offset": offset,
+                        "length": raw.tell() - offset,
+                        "message_count": count,
+                        "user_message_count": user_messages,
+                        "onboarding_message_count": onboarding_messages,
+                        "first_created_at": first_created_at,
+                        "last_created_at": last_created_at
+                    })
+                raw.flush()
+                os.fsync(raw.fileno())
+                size = raw.tell()
+
+            if segments:
+                os.replace(temporary, full_path)
+                db.execute(insert(MessageArchive), segments)
+            else:
+                os.remove(temporary)
+                size = 0
+            db.execute(text(f'ALTER TABLE {PARENT} DETACH PARTITION "{name}"'))
+            db.execute(text(f'DROP TABLE "{name}"'))
+            db.commit()
+        except BaseException:
+            db.rollback()
+            for leftover in (temporary, full_path):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+            raise
+
+        partition_service.forget(month)
+        report.partitions.append(name)
+        report.segments += len(segments)
+        report.messages += sum(segment["message_count"] for segment in segments)
+        report.bytes_written += size
+        return report
+
+    def archive_older_than(self, db: Session, cutoff: date) -> ArchiveReport:
+        """Archive every partition that ends on or before the cutoff, oldest first."""
+        report = ArchiveReport()
+        for month, name in self.archivable(db, cutoff).items():
+            self.archive_partition(db, month, name, report)
+        return report
+
+    @staticmethod
+    def read_records(archive: MessageArchive) -> List[Dict[str, Any]]:
+        """A segment's message records, newest first."""
+        with open(os.path.join(settings.ARCHIVE_DIR, archive.path), "rb") as f:
+            f.seek(archive.offset)
+            data = gzip.decompress(f.read(archive.length))
+        return [json.loads(line) for line in data.splitlines()]
+
+    def _segment(self, archive: MessageArchive) -> List[ArchivedRow]:
+        """Decoded segment rows as (created_at, id, record), newest first; cached."""
+        with self._lock:
+            rows = self._segments.get(archive.id)
+            if rows is not None:
+                self._segments.move_to_end(archive.id)
+                return rows
+
+        rows = [
+            (datetime.fromisoformat(record["timestamp"].rstrip("Z")), UUID(record["id"]), record)
+            for record in self.read_records(archive)
+        ]
+        with self._lock:
+            self._segments[archive.id] = rows
+            while len(self._segments) > settings.ARCHIVE_CACHE_SIZE:
+                self._segments.popitem(last=False)
+        return rows
+
+    @staticmethod
+    def to_message(created_at: datetime, message_id: UUID, record: Dict[str, Any]) -> Message:
+        """A transient (never added to a session) Message for an archived record."""
+        return Message(
+            id=message_id,
+            user_id=UUID(record["user_id"]),
+            role=record["role"],
+            content=record["content"],
+            created_at=created_at,
+            is_onboarding=record["is_onboarding"],
+            token_count=record["token_count"]
+        )
+
+    def get_page(
+        self,
+        db: Session,
+        user_id: UUID,
+        before: Optional[Tuple[datetime, UUID]] = None,
+        limit: int = 50
+    ) -> List[Message]:
+        """
+        Archived messages strictly before a keyset cursor, newest first.
+
+        Segments are visited newest first and reading stops once no
+        remaining segment can hold a message newer than the page's oldest.
+        """
+        query = db.query(MessageArchive).filter(MessageArchive.user_id == user_id)
+        if before is not None:
+            query = query.filter(MessageArchive.first_created_at <= before[0])
+
+        rows: List[ArchivedRow] = []
+        for archive in query.order_by(MessageArchive.last_created_at.desc()):
+            if len(rows) >= limit and archive.last_created_at < rows[-1][0]:
+                break
+            rows.extend(
+                row for row in self._segment(archive)
+                if before is None or (row[0], row[1]) < before
+            )
+            rows.sort(key=lambda row: (row[0], row[1]), reverse=True)
+            del rows[limit:]
+
+        return [self.to_message(*row) for row in rows]
+
+    def iter_records(self, db: Session, user_id: UUID) -> Iterator[Dict[str, Any]]:
+        """Every archived message record of a user, oldest first, one segment in memory at a time."""
+        segments = db.query(MessageArchive).filter(
+            MessageArchive.user_id == user_id
+        ).order_by(MessageArchive.first_created_at).all()
+        for archive in segments:
+            yield from reversed(self.read_records(archive))
+
+
+# Global archive service instance
+archive_service = ArchiveService()
@@ -2,32 +2,161 @@
 Redis caching service for session management and frequently accessed data.
 """
 import redis
+import redis.asyncio as aioredis
 import json
-from typing import Optional, Any
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional, Any, Callable, Dict, Iterable, List, Tuple
 from ..config import settings
+from .metrics import metrics
+
+
+class LocalCache:
+    """
+    Size-bounded, in-process LRU cache with per-key TTL.
+    
+    Values are stored as decoded Python objects and returned without
+    copying, so callers must treat them as read-only.
+    """
+    
+    def __init__(self, max_entries: int, max_ttl: float):
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """
+        Look up a key.
+        
+        Returns:
+            (found, value) tuple; expired entries count as misses
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._data[key]
+            self.misses += 1
+            return False, None
+    
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        """Store a value for at most min(ttl, max_ttl) seconds."""
+        ttl = min(ttl, self.max_ttl)
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+    
+    def delete(self, key: str) -> None:
+        """Remove a key if present."""
+        with self._lock:
+            self._data.pop(key, None)
+    
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._lock:
+            self._data.clear()
+    
+    def __len__(self) -> int:
+        return len(self._data)
 
 
 class CacheService:
     """Redis cache service for improved performance."""
     
+    PROTOCOL_VERSION_KEY = "protocols:version"
+    MEMORY_VERSION_EXPIRY = 86400  # Outlives any cached memory index
+    TYPING_EXPIRY = 30
+    
     def __init__(self):
-        self.redis_client = redis.from_url(
-            settings.REDIS_URL,
-            decode_responses=True
+        pool_options = {
+            "decode_responses": True,
+            "max_connections": settings.REDIS_MAX_CONNECTIONS,
+            "socket_timeout": settings.REDIS_SOCKET_TIMEOUT,
+            "socket_connect_timeout": settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+            "health_check_interval": settings.REDIS_HEALTH_CHECK_INTERVAL
+        }
+        
+        # Sync client for scripts and sync code paths
+        self.redis_client = redis.Redis(
+            connection_pool=redis.ConnectionPool.from_url(settings.REDIS_URL, **pool_options)
+        )
+        
+        # Async client for request handlers, so Redis I/O never blocks the loop
+        self.async_client = aioredis.Redis(
+            connection_pool=aioredis.ConnectionPool.from_url(settings.REDIS_URL, **pool_options)
+        )
+        
+        # Optional in-process tier for hot, near-static keys
+        self.local: Optional[LocalCache] = None
+        if settings.LOCAL_CACHE_ENABLED:
+            self.local = LocalCache(
+                max_entries=settings.LOCAL_CACHE_MAX_ENTRIES,
+                max_ttl=settings.LOCAL_CACHE_MAX_TTL
+            )
+        self.redis_hits = 0
+        self.redis_misses = 0
+        self.loads = 0
+        self._fill_locks: Dict[str, threading.Lock] = {}
+        self._fill_locks_guard = threading.Lock()
+        
+        metrics.sampled(
+            "cache_requests_total",
+            "Cache lookups by tier and result",
+            self._request_counts,
+            ["tier", "result"],
+            kind="counter"
+        )
+        metrics.sampled(
+            "cache_hit_ratio",
+            "Share of cache lookups served by each tier",
+            self._hit_ratios,
+            ["tier"]
         )
     
-    def get(self, key: str) -> Optional[Any]:
-        """Get value from cache."""
+    def get(self, key: str, local: bool = False) -> Optional[Any]:
+        """
+        Get value from cache.
+        
+        Args:
+            key: Cache key
+            local: Check and populate the in-process tier first. Only use
+                for keys where serving a value up to LOCAL_CACHE_MAX_TTL
+                seconds old is acceptable.
+        """
+        use_local = local and self.local is not None
+        if use_local:
+            found, value = self.local.get(key)
+            if found:
+                return value
+        
         try:
             value = self.redis_client.get(key)
             if value:
-                return json.loads(value)
+                self.redis_hits += 1
+                decoded = json.loads(value)
+                if use_local:
+                    self.local.set(key, decoded, ttl=self.local.max_ttl)
+                return decoded
+            self.redis_misses += 1
             return None
         except Exception as e:
             print(f"Cache get error: {e}")
             return None
     
-    def set(self, key: str, value: Any, expiry: int = 3600) -> bool:
+    def set(self, key: str, value: Any, expiry: int = 3600, local: bool = False) -> bool:
         """
         Set value in cache with expiry time.
         
@@ -35,7 +164,11 @@ class CacheService:
             key: Cache key
             value: Value to cache (will be JSON serialized)
             expiry: Expiry time in seconds (default 1 hour)
+            local: Also store the value in the in-process tier
         """
+        if local and self.local is not None:
+            self.local.set(key, value, ttl=expiry)
+        
         try:
             self.redis_client.setex(
                 key,
@@ -49,6 +182,9 @@ class CacheService:
     
     def delete(self, key: str) -> bool:
         """Delete key from cache."""
+        if self.local is not None:
+            self.local.delete(key)
+        
         try:
             self.redis_client.delete(key)
             return True
@@ -56,6 +192,236 @@ class CacheService:
             print(f"Cache delete error: {e}")
             return False
     
+    def get_or_load(
+        self,
+        key: str,
+        loader: Callable[[], Any],
+        expiry: int = 3600,
+        local: bool = False
+    ) -> Any:
+        """
+        Get a value, filling it from loader on a miss.
+        
+        Concurrent misses for the same key in this process wait for a
+        single fill instead of each calling the loader.
+        
+        Args:
+            key: Cache key
+            loader: Callable producing the JSON-serializable value
+            expiry: Expiry time in seconds for the filled value
+            local: Use the in-process tier as well
+        """
+        value = self.get(key, local=local)
+        if value is not None:
+            return value
+        
+        with self._fill_locks_guard:
+            lock = self._fill_locks.setdefault(key, threading.Lock())
+        
+        with lock:
+            try:
+                # Another caller may have filled the key while we waited
+                value = self.get(key, local=local)
+                if value is not None:
+                    return value
+                
+                value = loader()
+                self.loads += 1
+                self.set(key, value, expiry=expiry, local=local)
+                return value
+            finally:
+                with self._fill_locks_guard:
+                    if self._fill_locks.get(key) is lock:
+                        del self._fill_locks[key]
+    
+    def _decode(self, key: str, value: Optional[str], local: bool) -> Optional[Any]:
+        """Decode a raw Redis value, recording hit/miss and filling the local tier."""
+        if not value:
+            self.redis_misses += 1
+            return None
+        self.redis_hits += 1
+        decoded = json.loads(value)
+        if local and self.local is not None:
+            self.local.set(key, decoded, ttl=self.local.max_ttl)
+        return decoded
+    
+    async def aget(self, key: str, local: bool = False) -> Optional[Any]:
+        """Async variant of get."""
+        if local and self.local is not None:
+            found, value = self.local.get(key)
+            if found:
+                return value
+        
+        try:
+            return self._decode(key, await self.async_client.get(key), local)
+        except Exception as e:
+            print(f"Cache get error: {e}")
+            return None
+    
+    async def aset(self, key: str, value: Any, expiry: int = 3600, local: bool = False) -> bool:
+        """Async variant of set."""
+        if local and self.local is not None:
+            self.local.set(key, value, ttl=expiry)
+        
+        try:
+            await self.async_client.setex(key, expiry, json.dumps(value))
+            return True
+        except Exception as e:
+            print(f"Cache set error: {e}")
+            return False
+    
+    async def adelete(self, key: str) -> bool:
+        """Async variant of delete."""
+        if self.local is not None:
+            self.local.delete(key)
+        
+        try:
+            await self.async_client.delete(key)
+            return True
+        except Exception as e:
+            print(f"Cache delete error: {e}")
+            return False
+    
+    async def execute_batch(
+        self,
+        sets: Optional[Dict[str, Tuple[Any, int]]] = None,
+        gets: Iterable[str] = (),
+        deletes: Iterable[str] = (),
+        list_appends: Optional[Dict[str, Tuple[List[Any], int]]] = None,
+        list_gets: Iterable[str] = ()
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Run several cache operations in one pipelined round-trip.
+        
+        Args:
+            sets: Mapping of key -> (value, expiry seconds)
+            gets: Keys to read after the writes are applied
+            deletes: Keys to delete
+            list_appends: Mapping of list key -> (items, max length); items
+                are appended only if the list already exists, then the
+                list is trimmed to its newest max length entries
+            list_gets: List keys to read in full
+            
+        Returns:
+            Mapping of each requested get and list key to its decoded value
+            (None if absent), or None if Redis could not be reached
+        """
+        sets = sets or {}
+        list_appends = list_appends or {}
+        gets = list(gets)
+        deletes = list(deletes)
+        list_gets = list(list_gets)
+        
+        if self.local is not None:
+            for key in list(sets) + deletes:
+                self.local.delete(key)
+        
+        try:
+            async with self.async_client.pipeline(transaction=False) as pipe:
+                for key, (value, expiry) in sets.items():
+                    pipe.setex(key, expiry, json.dumps(value))
+                if deletes:
+                    pipe.delete(*deletes)
+                for key, (items, max_length) in list_appends.items():
+                    if items:
+                        pipe.rpushx(key, *[json.dumps(item) for item in items])
+                        pipe.ltrim(key, -max_length, -1)
+                for key in gets:
+                    pipe.get(key)
+                for key in list_gets:
+                    pipe.lrange(key, 0, -1)
+                results = await pipe.execute()
+        except Exception as e:
+            print(f"Cache batch error: {e}")
+            return None
+        
+        read_count = len(gets) + len(list_gets)
+        read_results = results[len(results) - read_count:] if read_count else []
+        values = {
+            key: self._decode(key, value, local=False)
+            for key, value in zip(gets, read_results)
+        }
+        for key, items in zip(list_gets, read_results[len(gets):]):
+            values[key] = self._decode_list(items)
+        return values
+    
+    def _decode_list(self, items: List[str]) -> Optional[List[Any]]:
+        """Decode a Redis list; an empty result means the key is absent."""
+        if not items:
+            self.redis_misses += 1
+            return None
+        self.redis_hits += 1
+        return [json.loads(item) for item in items]
+    
+    def get_list(self, key: str) -> Optional[List[Any]]:
+        """Get a whole JSON-encoded list, or None if absent."""
+        try:
+            return self._decode_list(self.redis_client.lrange(key, 0, -1))
+        except Exception as e:
+            print(f"Cache get error: {e}")
+            return None
+    
+    def replace_list(self, key: str, items: List[Any], expiry: int = 3600) -> bool:
+        """
+        Atomically replace a list with the given items.
+        
+        An empty item list leaves the key absent.
+        """
+        try:
+            with self.redis_client.pipeline(transaction=True) as pipe:
+                pipe.delete(key)
+                if items:
+                    pipe.rpush(key, *[json.dumps(item) for item in items])
+                    pipe.expire(key, expiry)
+                pipe.execute()
+            return True
+        except Exception as e:
+            print(f"Cache set error: {e}")
+            return False
+    
+    async def close(self) -> None:
+        """Close the async connection pool."""
+        await self.async_client.aclose()
+    
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters for both cache tiers."""
+        stats = {
+            "redis_hits": self.redis_hits,
+            "redis_misses": self.redis_misses,
+            "loads": self.loads
+        }
+        if self.local is not None:
+            stats.update({
+                "local_hits": self.local.hits,
+                "local_misses": self.local.misses,
+                "local_evictions": self.local.evictions,
+                "local_entries": len(self.local)
+            })
+        return stats
+    
+    def _request_counts(self) -> Dict[Tuple[str, str], int]:
+        counts = {
+            ("redis", "hit"): self.redis_hits,
+            ("redis", "miss"): self.redis_misses
+        }
+        if self.local is not None:
+            counts[("local", "hit")] = self.local.hits
+            counts[("local", "miss")] = self.local.misses
+        return counts
+    
+    def _hit_ratios(self) -> Dict[Tuple[str], float]:
+        counts = self._request_counts()
+        ratios = {}
+        for tier in {tier for tier, _ in counts}:
+            lookups = counts[(tier, "hit")] + counts[(tier, "miss")]
+            ratios[(tier,)] = counts[(tier, "hit")] / lookups if lookups else 0.0
+        return ratios
+    
+    @staticmethod
+    def typing_key(user_id: str) -> str:
+        """Cache key of a user's typing indicator."""
+        return f"typing:{user_id}"
+    
     def set_typing_indicator(self, user_id: str, is_typing: bool) -> bool:
         """
         Set typing indicator status for a user.
@@ -64,16 +430,28 @@ class CacheService:
             user_id: User ID
             is_typing: Whether AI is typing
         """
-        key = f"typing:{user_id}"
+        key = self.typing_key(user_id)
         if is_typing:
-            return self.set(key, {"is_typing": True}, expiry=30)
+            return self.set(key, {"is_typing": True}, expiry=self.TYPING_EXPIRY)
         else:
             return self.delete(key)
     
+    async def aset_typing_indicator(self, user_id: str, is_typing: bool) -> bool:
+        """Async variant of set_typing_indicator."""
+        key = self.typing_key(user_id)
+        if is_typing:
+            return await self.aset(key, {"is_typing": True}, expiry=self.TYPING_EXPIRY)
+        else:
+            return await self.adelete(key)
+    
     def get_typing_indicator(self, user_id: str) -> bool:
         """Get typing indicator status for a user."""
-        key = f"typing:{user_id}"
-        result = self.get(key)
+        result = self.get(self.typing_key(user_id))
+        return result.get("is_typing", False) if result else False
+    
+    async def aget_typing_indicator(self, user_id: str) -> bool:
+        """Async variant of get_typing_indicator."""
+        result = await self.aget(self.typing_key(user_id))
         return result.get("is_typing", False) if result else False
     
     def cache_protocols(self, protocols: list) -> bool:
@@ -83,6 +461,39 @@ class CacheService:
     def get_cached_protocols(self) -> Optional[list]:
         """Get cached protocols."""
         return self.get("protocols:all")
+    
+    def get_protocol_version(self) -> Optional[str]:
+        """Get the version stamp of the protocol set."""
+        return self.get(self.PROTOCOL_VERSION_KEY)
+    
+    def bump_protocol_version(self) -> Optional[str]:
+        """
+        Mark protocols as changed so every worker rebuilds its matcher.
+        
+        Returns:
+            The new version stamp, or None if it could not be stored
+        """
+        version = uuid.uuid4().hex
+        self.delete("protocols:all")
+        if self.set(self.PROTOCOL_VERSION_KEY, version, expiry=30 * 86400):  # 30 days
+            return version
+        return None
+    
+    def get_memory_version(self, user_id: Any) -> Optional[str]:
+        """Get the version stamp of a user's memories."""
+        return self.get(f"memories:version:{user_id}")
+    
+    def bump_memory_version(self, user_id: Any) -> Optional[str]:
+        """
+        Mark a user's memories as rewritten so every worker rebuilds its index.
+        
+        Returns:
+            The new version stamp, or None if it could not be stored
+        """
+        version = uuid.uuid4().hex
+        if self.set(f"memories:version:{user_id}", version, expiry=self.MEMORY_VERSION_EXPIRY):
+            return version
+        return None
 
 
 # Global cache service instance
@@ -0,0 +1,176 @@
+"""
+Real-time event service for pushing typing and message events to clients.
+
+Events are fanned out over Redis pub/sub so that every worker can deliver
+them, with an in-process fallback when Redis is unavailable or disabled.
+Each worker holds a single pub/sub connection from the shared cache pool,
+subscribed to the channels of its connected users, and hands incoming
+events to the local subscriber queues.
+"""
+import asyncio
+import json
+from typing import Any, Dict, Optional, Set
+from ..config import settings
+from .cache_service import cache_service
+
+
+class Subscription:
+    """A single client's subscription to a user's event channel."""
+
+    def __init__(self, service: "EventService", user_id: str):
+        self.service = service
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.EVENTS_LOCAL_QUEUE_SIZE)
+
+    async def get(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """
+        Wait for the next event.
+
+        Args:
+            timeout: Seconds to wait before giving up
+
+        Returns:
+            Event dict with 'type' and 'data', or None on timeout
+        """
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def close(self) -> None:
+        """Release the subscription."""
+        await self.service._remove(self.user_id, self.queue)
+
+
+class EventService:
+    """Per-user event channels backed by Redis pub/sub."""
+
+    LISTEN_TIMEOUT = 1.0
+
+    def __init__(self):
+        self.use_redis = settings.EVENTS_BACKEND == "redis"
+        self.redis_client = cache_service.async_client if self.use_redis else None
+        self._local_subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        # Users whose channel the shared pub/sub connection is subscribed to
+        self._channels: Set[str] = set()
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def channel(user_id: str) -> str:
+        """Pub/sub channel name for a user."""
+        return f"events:{user_id}"
+
+    async def publish(self, user_id: str, event_type: str, data: Dict[str, Any]) -> bool:
+        """
+        Publish an event to everyone subscribed to a user's channel.
+
+        Args:
+            user_id: User ID
+            event_type: Event name, e.g. 'typing' or 'message'
+            data: JSON-serializable payload
+        """
+        event = {"type": event_type, "data": data}
+        # Subscribers on a Redis channel get the event back from the listener
+        via_redis = user_id in self._channels
+        if not via_redis:
+            self._publish_local(user_id, event)
+
+        if not self.use_redis:
+            return True
+
+        try:
+            await self.redis_client.publish(self.channel(user_id), json.dumps(event))
+            return True
+        except Exception as e:
+            print(f"Event publish error: {e}")
+            if via_redis:
+                self._publish_local(user_id, event)
+            return False
+
+    def _publish_local(self, user_id: str, event: Dict[str, Any]) -> None:
+        """Deliver an event to in-process subscribers."""
+        for queue in list(self._local_subscribers.get(user_id, ())):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Slow consumer; drop the event rather than block publishers
+                pass
+
+    async def subscribe(self, user_id: str) -> Subscription:
+        """
+        Subscribe to a user's event channel.
+
+        Falls back to in-process delivery if Redis cannot be reached.
+        """
+        subscription = Subscription(self, user_id)
+        async with self._lock:
+            self._local_subscribers.setdefault(user_id, set()).add(subscription.queue)
+            if self.use_redis and user_id not in self._channels:
+                try:
+                    if self._pubsub is None:
+                        self._pubsub = self.redis_client.pubsub()
+                    await self._pubsub.subscribe(self.channel(user_id))
+                    self._channels.add(user_id)
+                    if self._listener is None or self._listener.done():
+                        self._listener = asyncio.create_task(self._listen())
+                except Exception as e:
+                    print(f"Event subscribe error, using local channel: {e}")
+        return subscription
+
+    async def _remove(self, user_id: str, queue: asyncio.Queue) -> None:
+        """Drop a subscriber queue, unsubscribing the channel after the last one."""
+        async with self._lock:
+            subscribers = self._local_subscribers.get(user_id)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if subscribers:
+                    return
+                self._local_subscribers.pop(user_id, None)
+
+            if user_id in self._channels:
+                self._channels.discard(user_id)
+                try:
+                    await self._pubsub.unsubscribe(self.channel(user_id))
+                except Exception as e:
+                    print(f"Event unsubscribe error: {e}")
+
+    async def _listen(self) -> None:
+        """Hand events from the shared pub/sub connection to local queues."""
+        prefix = self.channel("")
+        while True:
+            try:
+                message = await self._pubsub.get_message(
+                    ignore_subscribe_messages=True,
+                    timeout=self.LISTEN_TIMEOUT
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # The connection resubscribes its channels when it reconnects
+                print(f"Event listener error: {e}")
+                await asyncio.sleep(self.LISTEN_TIMEOUT)
+                continue
+
+            if message and message.get("type") == "message":
+                user_id = message["channel"][len(prefix):]
+                self._publish_local(user_id, json.loads(message["data"]))
+
+    async def close(self) -> None:
+        """Stop the listener and release the pub/sub connection."""
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+        self._channels.clear()
+
+
+# Global event service instance
+event_service = EventService()
@@ -0,0 +1,94 @@
+"""
+Streaming NDJSON export of a user's history.
+
+The export is one "user" line, then every message oldest first (archived
+ones included), then every memory. Message lines use the import record
+format (user_id, role, content, timestamp), so an export can be fed back
+to the history import. Rows are read through a server-side cursor
+EXPORT_BATCH_SIZE at a time (archives one segment at a time) and written
+out batch by batch, so memory use doesn't grow with the history.
+"""
+import json
+from itertools import islice
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from typing import Any, Dict, Iterator
+from uuid import UUID
+from ..config import settings
+from ..database import SessionLocal
+from ..models import Memory, Message, User
+from .archive_service import archive_service, message_record, timestamp_text
+
+
+def _line(record: Dict[str, Any]) -> str:
+    return json.dumps(record, ensure_ascii=False) + "\n"
+
+
+class ExportService:
+    """Service for exporting a user's stored history."""
+
+    @staticmethod
+    def _stream(db: Session, statement) -> Iterator[Any]:
+        """Execute with a server-side cursor, yielding partitions of rows."""
+        result = db.execute(statement.execution_options(yield_per=settings.EXPORT_BATCH_SIZE))
+        yield from result.partitions()
+
+    @staticmethod
+    def export_lines(user_id: UUID) -> Iterator[str]:
+        """
+        Yield the user's export as NDJSON chunks (one per batch of rows).
+
+        Runs in its own session because it outlives the request's: callers
+        stream it from a StreamingResponse. Writes to the history during
+        the export may or may not be included.
+        """
+        db = SessionLocal()
+        try:
+            user = db.execute(
+                select(User.id, User.name, User.user_metadata, User.created_at).where(User.id == user_id)
+            ).first()
+            if user is None:
+                return
+            yield _line({
+                "type": "user",
+                "id": str(user.id),
+                "name": user.name,
+                "user_metadata": user.user_metadata,
+                "created_at": timestamp_text(user.created_at)
+            })
+
+            archived = archive_service.iter_records(db, user_id)
+            while True:
+                records = list(islice(archived, settings.EXPORT_BATCH_SIZE))
+                if not records:
+                    break
+                yield "".join(_line(record) for record in records)
+
+            messages = select(
+                Message.id, Message.user_id, Message.role, Message.content,
+                Message.created_at, Message.is_onboarding, Message.token_count
+            ).where(Message.user_id == user_id).order_by(Message.created_at, Message.id)
+            for rows in ExportService._stream(db, messages):
+                yield "".join(_line(message_record(row)) for row in rows)
+
+            memories = select(
+                Memory.id, Memory.content, Memory.category, Memory.importance_score,
+                Memory.created_at, Memory.scored_at
+            ).where(Memory.user_id == user_id).order_by(Memory.created_at, Memory.id)
+            for rows in ExportService._stream(db, memories):
+                yield "".join(_line({
+                    "type": "memory",
+                    "id": str(row.id),
+                    "user_id": str(user_id),
+                    "content": row.content,
+                    "category": row.category,
+                    "importance_score": row.importance_score,
+                    "created_at": timestamp_text(row.created_at),
+                    "scored_at": timestamp_text(row.scored_at)
+                }) for row in rows)
+        finally:
+            db.close()
+
+
+# Global export service instance
+export_service = ExportService()
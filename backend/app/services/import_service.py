@@ -0,0 +1,333 @@
+"""
+Bulk import of chat history from NDJSON.
+
+Each line is one message:
+
+    {"user_id": "...", "role": "user", "content": "...", "timestamp": "2024-03-01T09:30:00Z"}
+
+("user" is accepted for "user_id", an optional "is_onboarding" flag is
+honoured, and timestamps may be ISO 8601 or epoch seconds; naive ones are
+taken as UTC.) Lines with a "type" other than "message" are skipped, so a
+history export can be imported as is. A record's "id" is kept when present,
+as in exports, and messages already stored with the same id and timestamp
+are skipped, so importing the same file twice adds nothing.
+
+Messages are written IMPORT_BATCH_SIZE at a time, on PostgreSQL (psycopg2)
+by COPY into a staging table followed by INSERT ... ON CONFLICT DO NOTHING,
+elsewhere by a multi-row INSERT ... ON CONFLICT DO NOTHING. Counter updates
+for the rows actually inserted are applied in the same transaction. No LLM
+calls are made.
+Optionally, memories are extracted from the imported user messages as
+they stream past.
+"""
+import csv
+import io
+import json
+import uuid
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from sqlalchemy import func, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
+from uuid import UUID
+from ..config import settings
+from ..models import Memory, Message, User
+from .llm_service import llm_service
+from .memory_service import memory_service
+from .message_service import message_service
+from .metrics import metrics
+from .partition_service import month_start, partition_service
+from .token_service import token_service
+
+
+imported_messages = metrics.counter(
+    "history_import_messages_total",
+    "Messages seen by bulk history imports, by outcome",
+    ["result"]
+)
+
+ROLES = ("user", "assistant")
+COLUMNS = ("id", "user_id", "role", "content", "created_at", "is_onboarding", "token_count")
+STAGING_TABLE = "messages_import"
+
+MessageKey = Tuple[UUID, datetime]
+
+
+class ImportRecordError(ValueError):
+    """Raised when an NDJSON line is not a valid message record."""
+
+
+@dataclass
+class ImportReport:
+    """Outcome of a history import."""
+    imported: int = 0
+    duplicates: int = 0
+    rejected: int = 0
+    users: int = 0
+    memories: int = 0
+    errors: List[str] = field(default_factory=list)
+
+
+class ImportService:
+    """Parsing and batch writing for history imports."""
+
+    @staticmethod
+    def parse_timestamp(value: Any) -> datetime:
+        """Parse an ISO 8601 string or epoch seconds as naive UTC (the column type)."""
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            timestamp = datetime.fromtimestamp(value, timezone.utc)
+        elif isinstance(value, str):
+            timestamp = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        else:
+            raise ValueError
+        if timestamp.tzinfo is not None:
+            timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+        return timestamp
+
+    @staticmethod
+    def parse_record(line: Union[str, bytes]) -> Optional[Dict[str, Any]]:
+        """
+        Parse one NDJSON line into Message insert values (without token_count).
+
+        Returns:
+            The values, or None for records that aren't messages
+
+        Raises:
+            ImportRecordError: If the line is not a valid message record
+        """
+        try:
+            record = json.loads(line)
+        except ValueError:
+            raise ImportRecordError("not valid JSON")
+        if not isinstance(record, dict):
+            raise ImportRecordError("not a JSON object")
+        if record.get("type", "message") != "message":
+            return None
+
+        try:
+            message_id = UUID(str(record["id"])) if record.get("id") is not None else uuid.uuid4()
+        except ValueError:
+            raise ImportRecordError("id not a UUID")
+
+        try:
+            user_id = UUID(str(record.get("user_id", record.get("user"))))
+        except ValueError:
+            raise ImportRecordError("user_id missing or not a UUID")
+
+        role = record.get("role")
+        if role not in ROLES:
+            raise ImportRecordError(f"role must be one of {', '.join(ROLES)}")
+
+        content = record.get("content")
+        if not isinstance(content, str) or not content.strip():
+            raise ImportRecordError("content missing or empty")
+
+        try:
+            created_at = ImportService.parse_timestamp(record.get("timestamp"))
+        except (ValueError, TypeError, OverflowError, OSError):
+            raise ImportRecordError("timestamp missing or not ISO 8601 / epoch seconds")
+
+        return {
+            "id": message_id,
+            "user_id": user_id,
+            "role": role,
+            "content": content,
+            "created_at": created_at,
+            "is_onboarding": bool(record.get("is_onboarding", False))
+        }
+
+    @staticmethod
+    def write_messages(db: Session, rows: List[Dict[str, Any]]) -> Set[MessageKey]:
+        """
+        Write message rows in the session's transaction, by COPY where available.
+
+        Rows whose (id, created_at) is already stored are skipped.
+
+        Returns:
+            (id, created_at) of the rows actually inserted
+        """
+        if db.get_bind().dialect.driver == "psycopg2":
+            inserted = ImportService._copy_messages(db, rows)
+        else:
+            insert = sqlite_insert if db.get_bind().dialect.name == "sqlite" else pg_insert
+            # Executemany of a Core insert is sent as multi-row VALUES batches
+            inserted = db.execute(
+                insert(Message).on_conflict_do_nothing(
+                    index_elements=[Message.id, Message.created_at]
+                ).returning(Message.id, Message.created_at),
+                rows
+            )
+        return {(message_id, created_at) for message_id, created_at in inserted}
+
+    @staticmethod
+    def _copy_messages(db: Session, rows: List[Dict[str, Any]]) -> Any:
+        """COPY rows into a staging table, then move the new ones into messages."""
+        buffer = io.StringIO()
+        # Quote everything so content such as "\." is never read as a COPY marker
+        writer = csv.writer(buffer, quoting=csv.QUOTE_ALL)
+        for row in rows:
+            writer.writerow([row[column] for column in COLUMNS])
+        buffer.seek(0)
+
+        columns = ", ".join(COLUMNS)
+        # Per connection, emptied by every commit or rollback
+        db.execute(text(
+            f"CREATE TEMPORARY TABLE IF NOT EXISTS {STAGING_TABLE} "
+            f"(LIKE {Message.__tablename__}) ON COMMIT DELETE ROWS"
+        ))
+        cursor = db.connection().connection.cursor()
+        try:
+            cursor.copy_expert(f"COPY {STAGING_TABLE} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+        finally:
+            cursor.close()
+
+        return db.execute(text(
+            f"INSERT INTO {Message.__tablename__} ({columns}) SELECT {columns} FROM {STAGING_TABLE} "
+            f"ON CONFLICT (id, created_at) DO NOTHING RETURNING id, created_at"
+        ).columns(Message.id, Message.created_at))
+
+
+class HistoryImport:
+    """
+    One bulk import run.
+
+    Feed lines with add(); when it returns True a batch is ready and flush()
+    should be called (the API runs flush in a worker thread between body
+    chunks). finish() writes the remainder and returns the report.
+    Records for users that don't exist are rejected, as are malformed lines.
+    """
+
+    def __init__(self, db: Session, extract_memories: bool = False, batch_size: Optional[int] = None):
+        self.db = db
+        self.extract_memories = extract_memories
+        self.batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+        self.report = ImportReport()
+        self._batch: List[Dict[str, Any]] = []
+        self._line_numbers: List[int] = []
+        self._lines = 0
+        self._known_users: Set[UUID] = set()
+        self._missing_users: Set[UUID] = set()
+        self._touched_users: Set[UUID] = set()
+
+    def _reject(self, line_number: int, reason: str) -> None:
+        self.report.rejected += 1
+        imported_messages.inc(result="rejected")
+        if len(self.report.errors) < settings.IMPORT_MAX_REPORTED_ERRORS:
+            self.report.errors.append(f"line {line_number}: {reason}")
+
+    def add(self, line: Union[str, bytes]) -> bool:
+        """Parse and buffer a line; returns True when a batch is ready to flush."""
+        self._lines += 1
+        if not line.strip():
+            return False
+        try:
+            row = ImportService.parse_record(line)
+        except ImportRecordError as e:
+            self._reject(self._lines, str(e))
+            return False
+        if row is not None:
+            self._batch.append(row)
+            self._line_numbers.append(self._lines)
+        return len(self._batch) >= self.batch_size
+
+    def flush(self) -> None:
+        """Write the buffered batch with the matching counter updates, then commit."""
+        batch, line_numbers = self._batch, self._line_numbers
+        self._batch, self._line_numbers = [], []
+        if not batch:
+            return
+
+        new_ids = {row["user_id"] for row in batch} - self._known_users - self._missing_users
+        if new_ids:
+            found = {user_id for (user_id,) in self.db.query(User.id).filter(User.id.in_(new_ids))}
+            self._known_users |= found
+            self._missing_users |= new_ids - found
+
+        rows = []
+        for row, line_number in zip(batch, line_numbers):
+            if row["user_id"] in self._missing_users:
+                self._reject(line_number, f"user {row['user_id']} not found")
+            else:
+                rows.append(row)
+        if not rows:
+            return
+
+        for row, tokens in zip(rows, token_service.count_many((row["content"] for row in rows), memoize=False)):
+            row["token_count"] = tokens
+
+        # Rows for months without a partition would land in the default one
+        partition_service.ensure_partitions(self.db, {month_start(row["created_at"]) for row in rows})
+        inserted = ImportService.write_messages(self.db, rows)
+
+        # Count only the rows inserted, each key once even if repeated in the batch
+        new_rows = []
+        for row in rows:
+            key = (row["id"], row["created_at"])
+            if key in inserted:
+                inserted.discard(key)
+                new_rows.append(row)
+        duplicates = len(rows) - len(new_rows)
+        rows = new_rows
+
+        user_messages, onboarding_messages = Counter(), Counter()
+        for row in rows:
+            if row["role"] == "user":
+                user_messages[row["user_id"]] += 1
+            if row["is_onboarding"]:
+                onboarding_messages[row["user_id"]] += 1
+
+        for user_id in {row["user_id"] for row in rows}:
+            values = message_service.counter_updates(user_messages[user_id], onboarding_messages[user_id])
+            if len(values) > 1:
+                self.db.execute(
+                    update(User).where(User.id == user_id).values(**values),
+                    execution_options={"synchronize_session": False}
+                )
+        self.db.commit()
+
+        self.report.imported += len(rows)
+        self.report.duplicates += duplicates
+        imported_messages.inc(len(rows), result="imported")
+        if duplicates:
+            imported_messages.inc(duplicates, result="duplicate")
+        self._touched_users.update(row["user_id"] for row in rows)
+
+        if self.extract_memories:
+            self._extract_memories(rows)
+
+    def _extract_memories(self, rows: List[Dict[str, Any]]) -> None:
+        """Extract memories from each imported user message; one upsert per user."""
+        extracted: Dict[UUID, Dict[str, Dict[str, Any]]] = defaultdict(dict)
+        for row in rows:
+            if row["role"] == "user":
+                for content_hash, memory in memory_service.extract_memory_rows(row["user_id"], row["content"]).items():
+                    extracted[row["user_id"]].setdefault(content_hash, memory)
+
+        for user_id, memories in extracted.items():
+            self.report.memories += len(memory_service.store_memory_rows(user_id, list(memories.values()), self.db))
+
+    def finish(self) -> ImportReport:
+        """
+        Write the final batch and settle per-user state: mark memories as
+        extracted (compacting users over the cap) and drop cached context
+        windows, which no longer match the stored history.
+        """
+        self.flush()
+
+        for user_id in self._touched_users:
+            if self.extract_memories:
+                memory_service.mark_memories_extracted(user_id, self.db)
+                memory_count = self.db.query(func.count(Memory.id)).filter(Memory.user_id == user_id).scalar()
+                if memory_count > settings.MEMORY_MAX_PER_USER:
+                    memory_service.compact_user_memories(user_id, self.db)
+            llm_service.invalidate_context_window(user_id)
+
+        self.report.users = len(self._touched_users)
+        return self.report
+
+
+# Global import service instance
+import_service = ImportService()
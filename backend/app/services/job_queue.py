@@ -0,0 +1,269 @@
+"""
+Background job queue for work that should not delay chat responses.
+
+Jobs are appended to a Redis stream and consumed by worker tasks through a
+consumer group, or kept in an in-process asyncio queue when the "local"
+backend is configured. If Redis cannot take a job, it goes to the bounded
+in-process queue instead (and is dropped, and counted, when that is full),
+so background work never runs on the request path. Handlers are plain sync functions run in a thread
+so database work never blocks the event loop.
+"""
+import asyncio
+import json
+import os
+import random
+import socket
+from typing import Any, Callable, Dict, List, Optional
+from ..config import settings
+from .cache_service import cache_service
+from .metrics import metrics
+
+
+JobHandler = Callable[[Dict[str, Any]], None]
+
+jobs_dropped = metrics.counter(
+    "background_jobs_dropped_total",
+    "Background jobs dropped because the in-process queue was full",
+    ["type"]
+)
+
+
+class JobQueue:
+    """Job queue with retrying workers and a graceful drain on shutdown."""
+
+    def __init__(self):
+        self.backend = settings.JOB_QUEUE_BACKEND
+        self.stream = settings.JOB_STREAM_KEY
+        self.group = settings.JOB_CONSUMER_GROUP
+        self._handlers: Dict[str, JobHandler] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._local_workers: List[asyncio.Task] = []
+        self._running = False
+        self.enqueued = 0
+        self.dropped = 0
+        self.processed = 0
+        self.retried = 0
+        self.failed = 0
+
+    def register(self, job_type: str, handler: JobHandler) -> None:
+        """Register the handler for a job type."""
+        self._handlers[job_type] = handler
+
+    async def enqueue(self, job_type: str, payload: Dict[str, Any]) -> bool:
+        """
+        Queue a job for background processing.
+
+        When no workers are running (scripts, one-off commands) the job is
+        run immediately instead, so work is never silently dropped.
+
+        Args:
+            job_type: Registered job type
+            payload: JSON-serializable job arguments
+
+        Returns:
+            True if the job was queued or completed, False if it was dropped
+        """
+        job = {"type": job_type, "payload": payload, "attempts": 0}
+
+        if not self._running:
+            return await self._run_with_retries(job)
+
+        self.enqueued += 1
+        if self.backend == "redis":
+            try:
+                await cache_service.async_client.xadd(
+                    self.stream,
+                    self._encode(job),
+                    maxlen=settings.JOB_STREAM_MAXLEN,
+                    approximate=True
+                )
+                return True
+            except Exception as e:
+                print(f"Job enqueue error, queueing locally: {e}")
+
+        return self._enqueue_local(job)
+
+    def _enqueue_local(self, job: Dict[str, Any]) -> bool:
+        """Put a job on the in-process queue, dropping it if the queue is full."""
+        try:
+            self._queue.put_nowait(job)
+            return True
+        except asyncio.QueueFull:
+            print(f"Local job queue full, dropping {job['type']} job")
+            self.dropped += 1
+            jobs_dropped.inc(type=job["type"])
+            return False
+
+    async def start(self) -> None:
+        """Start worker tasks."""
+        if self._running:
+            return
+
+        if self.backend == "redis":
+            try:
+                await cache_service.async_client.xgroup_create(
+                    self.stream, self.group, id="0", mkstream=True
+                )
+            except Exception as e:
+                if "BUSYGROUP" not in str(e):
+                    print(f"Job queue unavailable, falling back to local: {e}")
+                    self.backend = "local"
+
+        # Also the fallback for jobs Redis could not take
+        self._queue = asyncio.Queue(maxsize=settings.JOB_LOCAL_QUEUE_SIZE)
+
+        self._running = True
+        consumer_prefix = f"{socket.gethostname()}-{os.getpid()}"
+        if self.backend == "redis":
+            for i in range(settings.JOB_QUEUE_WORKERS):
+                self._workers.append(asyncio.create_task(self._redis_worker(f"{consumer_prefix}-{i}")))
+            local_workers = 1
+        else:
+            local_workers = settings.JOB_QUEUE_WORKERS
+        for _ in range(local_workers):
+            self._local_workers.append(asyncio.create_task(self._local_worker()))
+
+    async def stop(self) -> None:
+        """
+        Stop accepting work and drain in-flight jobs.
+
+        Local jobs still queued (including any Redis could not take) are
+        processed for up to JOB_SHUTDOWN_TIMEOUT seconds; Redis stream entries not yet read
+        stay in the stream for the next worker to pick up.
+        """
+        if not self._running:
+            return
+
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=settings.JOB_SHUTDOWN_TIMEOUT)
+        except asyncio.TimeoutError:
+            print(f"Job queue drain timed out with {self._queue.qsize()} jobs left")
+
+        self._running = False
+        if self._workers:
+            # Redis workers exit after their current read/job completes
+            done, pending = await asyncio.wait(self._workers, timeout=settings.JOB_SHUTDOWN_TIMEOUT)
+            for task in pending:
+                task.cancel()
+        for task in self._local_workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, *self._local_workers, return_exceptions=True)
+        self._workers = []
+        self._local_workers = []
+
+    def stats(self) -> Dict[str, int]:
+        """Queue counters."""
+        return {
+            "enqueued": self.enqueued,
+            "processed": self.processed,
+            "retried": self.retried,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "queued": self._queue.qsize() if self._queue is not None else 0
+        }
+
+    @staticmethod
+    def _encode(job: Dict[str, Any]) -> Dict[str, str]:
+        """Flatten a job into Redis stream fields."""
+        return {
+            "type": job["type"],
+            "payload": json.dumps(job["payload"]),
+            "attempts": str(job["attempts"])
+        }
+
+    @staticmethod
+    def _decode(fields: Dict[str, str]) -> Dict[str, Any]:
+        """Rebuild a job from Redis stream fields."""
+        return {
+            "type": fields["type"],
+            "payload": json.loads(fields["payload"]),
+            "attempts": int(fields.get("attempts", 0))
+        }
+
+    async def _run_with_retries(self, job: Dict[str, Any]) -> bool:
+        """Run a job, retrying with jittered exponential backoff."""
+        handler = self._handlers.get(job["type"])
+        if handler is None:
+            print(f"No handler registered for job type {job['type']}")
+            self.failed += 1
+            return False
+
+        while True:
+            try:
+                await asyncio.to_thread(handler, job["payload"])
+                self.processed += 1
+                return True
+            except Exception as e:
+                job["attempts"] += 1
+                if job["attempts"] > settings.JOB_MAX_RETRIES:
+                    print(f"Job {job['type']} failed after {job['attempts']} attempts: {e}")
+                    self.failed += 1
+                    return False
+
+                self.retried += 1
+                delay = settings.JOB_RETRY_BASE_DELAY * (2 ** (job["attempts"] - 1))
+                await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+
+    async def _local_worker(self) -> None:
+        """Consume jobs from the in-process queue."""
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run_with_retries(job)
+            finally:
+                self._queue.task_done()
+
+    async def _redis_worker(self, consumer: str) -> None:
+        """Consume jobs from the Redis stream."""
+        client = cache_service.async_client
+
+        # Take over entries left pending by workers that died mid-job
+        try:
+            _, claimed, *_ = await client.xautoclaim(
+                self.stream, self.group, consumer,
+                min_idle_time=settings.JOB_CLAIM_IDLE_MS,
+                start_id="0-0",
+                count=100
+            )
+            for entry_id, fields in claimed:
+                if fields:
+                    await self._process_entry(consumer, entry_id, fields)
+        except Exception as e:
+            print(f"Job claim error: {e}")
+
+        while self._running:
+            try:
+                response = await client.xreadgroup(
+                    self.group, consumer, {self.stream: ">"},
+                    count=10,
+                    block=1000
+                )
+            except Exception as e:
+                print(f"Job read error: {e}")
+                await asyncio.sleep(settings.JOB_RETRY_BASE_DELAY)
+                continue
+
+            for _, entries in response or []:
+                for entry_id, fields in entries:
+                    await self._process_entry(consumer, entry_id, fields)
+
+    async def _process_entry(self, consumer: str, entry_id: str, fields: Dict[str, str]) -> None:
+        """Run a stream entry and acknowledge it; park it if it keeps failing."""
+        client = cache_service.async_client
+        job = self._decode(fields)
+
+        if not await self._run_with_retries(job):
+            try:
+                await client.xadd(f"{self.stream}:dead", self._encode(job))
+            except Exception as e:
+                print(f"Job dead-letter error: {e}")
+
+        try:
+            await client.xack(self.stream, self.group, entry_id)
+        except Exception as e:
+            print(f"Job ack error: {e}")
+
+
+# Global job queue instance
+job_queue = JobQueue()
@@ -0,0 +1,389 @@
+"""
+Resilience layer for LLM calls: deadlines, retries, hedging and circuit
+breaking.
+
+Every turn gets an overall deadline. Each attempt is bounded by its own
+timeout and retried with jittered backoff while time remains. When the
+primary model is slower than its recent latency percentile, a hedged
+request is sent to the fallback model and whichever answers first wins.
+A per-model circuit breaker stops sending traffic to a model that keeps
+failing, so degraded providers fail fast instead of setting p99 latency.
+"""
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional
+import openai
+from ..config import settings
+from .metrics import metrics
+
+
+class CircuitOpenError(Exception):
+    """Raised when every model's circuit is open."""
+
+
+class LLMDeadlineExceeded(Exception):
+    """Raised when a turn's deadline passes without a successful response."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    Opens after LLM_BREAKER_FAILURE_THRESHOLD consecutive failures. Once
+    LLM_BREAKER_RESET_TIMEOUT seconds have passed, one probe request is let
+    through (half-open); success closes the circuit, failure re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+
+    def allow(self) -> bool:
+        """Whether a request may be sent now."""
+        if self.state == self.CLOSED:
+            return True
+        if time.monotonic() - self.opened_at >= settings.LLM_BREAKER_RESET_TIMEOUT:
+            # Let one probe through; the next waits for another reset period
+            self.state = self.HALF_OPEN
+            self.opened_at = time.monotonic()
+            return True
+        return False
+
+    def is_open(self) -> bool:
+        """Whether allow() would refuse a request now (no state change)."""
+        return (
+            self.state != self.CLOSED
+            and time.monotonic() - self.opened_at < settings.LLM_BREAKER_RESET_TIMEOUT
+        )
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= settings.LLM_BREAKER_FAILURE_THRESHOLD:
+            if self.state != self.OPEN:
+                circuit_opened.inc(model=self.name)
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """Sliding window of recent successful call latencies."""
+
+    def __init__(self, size: int):
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, percent: float) -> Optional[float]:
+        """Latency at the given percentile, or None without samples."""
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(len(ordered) * percent / 100))
+        return ordered[index]
+
+
+request_seconds = metrics.histogram(
+    "llm_request_seconds",
+    "Latency of individual LLM requests",
+    ["model", "outcome"]
+)
+hedges_sent = metrics.counter(
+    "llm_hedges_total",
+    "Hedged requests that completed, by which request answered first",
+    ["winner"]
+)
+circuit_opened = metrics.counter(
+    "llm_circuit_opened_total",
+    "Times a model's circuit breaker opened",
+    ["model"]
+)
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether an error is transient: timeouts, connection errors, 408/409/429 and 5xx."""
+    if isinstance(error, (asyncio.TimeoutError, openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in (408, 409, 429) or error.status_code >= 500
+    return False
+
+
+class LLMResilience:
+    """Runs completion calls with deadlines, retries, hedging and breakers."""
+
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._latency: Dict[str, LatencyTracker] = {}
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        if model not in self._breakers:
+            self._breakers[model] = CircuitBreaker(model)
+        return self._breakers[model]
+
+    def latency(self, model: str) -> LatencyTracker:
+        if model not in self._latency:
+            self._latency[model] = LatencyTracker(settings.LLM_LATENCY_WINDOW)
+        return self._latency[model]
+
+    def available_models(self, model: str) -> List[str]:
+        """
+        The model and the fallback model, minus those whose circuit is open.
+
+        Read-only: a half-open probe is only claimed, via allow(), when a
+        request is actually sent to the model.
+        """
+        candidates = [model]
+        if settings.LLM_FALLBACK_MODEL and settings.LLM_FALLBACK_MODEL != model:
+            candidates.append(settings.LLM_FALLBACK_MODEL)
+        return [candidate for candidate in candidates if not self.breaker(candidate).is_open()]
+
+    def hedge_delay(self, model: str) -> Optional[float]:
+        """Seconds to wait on a model before hedging, once enough samples exist."""
+        tracker = self.latency(model)
+        if len(tracker) < settings.LLM_HEDGE_MIN_SAMPLES:
+            return None
+        return max(settings.LLM_HEDGE_MIN_DELAY, tracker.percentile(settings.LLM_HEDGE_PERCENTILE))
+
+    @staticmethod
+    def backoff(attempt: int) -> float:
+        """Jittered exponential backoff before retry number attempt + 1."""
+        return settings.LLM_RETRY_BASE_DELAY * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+    async def _call(
+        self,
+        create: Callable[[str, float], Awaitable[Any]],
+        model: str,
+        timeout: float
+    ) -> Any:
+        """One request, recording its latency and outcome."""
+        if not self.breaker(model).allow():
+            # Another request claimed the half-open probe first
+            raise CircuitOpenError(f"Circuit open for {model}")
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(create(model, timeout), timeout)
+        except asyncio.CancelledError:
+            # Lost a hedge race (says nothing about the model's health), or
+            # timed out, which _attempt records
+            raise
+        except Exception as e:
+            request_seconds.observe(time.perf_counter() - started, model=model, outcome="error")
+            if is_retryable(e):
+                self.breaker(model).record_failure()
+            raise
+
+        elapsed = time.perf_counter() - started
+        request_seconds.observe(elapsed, model=model, outcome="ok")
+        self.latency(model).record(elapsed)
+        self.breaker(model).record_success()
+        return result
+
+    async def _attempt(
+        self,
+        create: Callable[[str, float], Awaitable[Any]],
+        model: str,
+        budget: float
+    ) -> Any:
+        """
+        One attempt: the primary request, plus a hedge to the fallback model
+        if the primary is slow or fails while time remains.
+        """
+        models = self.available_models(model)
+        if not models:
+            raise CircuitOpenError(f"Circuit open for {model}")
+
+        loop = asyncio.get_running_loop()
+        timeout = min(budget, settings.LLM_ATTEMPT_TIMEOUT)
+        started = loop.time()
+        end = started + timeout
+
+        primary = models[0]
+        hedge_model = models[1] if len(models) > 1 else None
+        hedge_at = self.hedge_delay(primary) if hedge_model else None
+
+        tasks = {asyncio.ensure_future(self._call(create, primary, timeout)): primary}
+        errors: List[BaseException] = []
+        hedged = False
+        try:
+            while True:
+                wait = end - loop.time()
+                if hedge_model is not None and hedge_at is not None:
+                    wait = min(wait, started + hedge_at - loop.time())
+
+                if tasks:
+                    done, _ = await asyncio.wait(
+                        tasks, timeout=max(0.0, wait), return_when=asyncio.FIRST_COMPLETED
+                    )
+                    for task in done:
+                        winner = tasks.pop(task)
+                        if task.exception() is None:
+                            if hedged:
+                                hedges_sent.inc(winner="primary" if winner == primary else "fallback")
+                            return task.result()
+                        errors.append(task.exception())
+
+                now = loop.time()
+                if now >= end:
+                    # Requests still running hit the attempt timeout; unlike the
+                    # loser of a won hedge race, that counts against the model
+                    for pending_model in tasks.values():
+                        request_seconds.observe(now - started, model=pending_model, outcome="error")
+                        self.breaker(pending_model).record_failure()
+                    raise asyncio.TimeoutError()
+
+                # Hedge when the primary is slower than usual or has failed
+                slow = hedge_at is not None and now - started >= hedge_at
+                if hedge_model is not None and (not tasks or slow):
+                    # A true hedge only if the primary is still running
+                    hedged = bool(tasks)
+                    tasks[asyncio.ensure_future(self._call(create, hedge_model, end - now))] = hedge_model
+                    hedge_model = None
+                    continue
+
+                if not tasks:
+                    raise errors[-1]
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def complete(
+        self,
+        create: Callable[[str, float], Awaitable[Any]],
+        model: str
+    ) -> Any:
+        """
+        Run a completion with retries until LLM_DEADLINE.
+
+        Args:
+            create: Sends a request for (model, timeout seconds)
+            model: Preferred model
+
+        Raises:
+            LLMDeadlineExceeded: If no attempt succeeded before the deadline
+            CircuitOpenError: If every model's circuit is open
+            Exception: The last non-retryable error
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.LLM_DEADLINE
+        last_error: Optional[BaseException] = None
+
+        for attempt in range(settings.LLM_MAX_ATTEMPTS):
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                return await self._attempt(create, model, remaining)
+            except CircuitOpenError:
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                last_error = e
+
+            delay = self.backoff(attempt)
+            if loop.time() + delay >= deadline:
+                break
+            await asyncio.sleep(delay)
+
+        raise LLMDeadlineExceeded(f"No response within {settings.LLM_DEADLINE}s: {last_error!r}")
+
+    @staticmethod
+    async def close_stream(stream: Any) -> None:
+        """Close a stream's HTTP response, if one was opened."""
+        if stream is None:
+            return
+        try:
+            await stream.close()
+        except Exception as e:
+            print(f"LLM stream close error: {e}")
+
+    async def stream(
+        self,
+        create: Callable[[str, float], Awaitable[AsyncIterator[Any]]],
+        model: str
+    ) -> AsyncIterator[Any]:
+        """
+        Open a streaming completion, retrying until the first chunk arrives.
+
+        Attempts alternate between the model and the fallback model. Once
+        the first chunk has been received the stream is committed, and
+        later errors propagate to the caller. A stream that fails to start,
+        ends, or is abandoned by the caller is closed.
+
+        Args:
+            create: Opens a stream for (model, timeout seconds)
+            model: Preferred model
+        """
+        last_error: Optional[BaseException] = None
+        for attempt in range(settings.LLM_MAX_ATTEMPTS):
+            models = self.available_models(model)
+            if not models:
+                raise CircuitOpenError(f"Circuit open for {model}")
+            current = models[attempt % len(models)]
+            if not self.breaker(current).allow():
+                # Another request claimed the half-open probe first
+                last_error = CircuitOpenError(f"Circuit open for {current}")
+                continue
+
+            started = time.perf_counter()
+            timeout = settings.LLM_FIRST_TOKEN_TIMEOUT
+            stream = None
+            try:
+                stream = await asyncio.wait_for(create(current, settings.LLM_ATTEMPT_TIMEOUT), timeout)
+                iterator = stream.__aiter__()
+                first = await asyncio.wait_for(
+                    iterator.__anext__(),
+                    max(0.0, timeout - (time.perf_counter() - started))
+                )
+            except StopAsyncIteration:
+                await self.close_stream(stream)
+                return
+            except Exception as e:
+                await self.close_stream(stream)
+                request_seconds.observe(time.perf_counter() - started, model=current, outcome="error")
+                if not is_retryable(e):
+                    raise
+                self.breaker(current).record_failure()
+                last_error = e
+                await asyncio.sleep(self.backoff(attempt))
+                continue
+            except BaseException:
+                await self.close_stream(stream)
+                raise
+
+            # Time to first chunk is what the hedge/routing latency tracks
+            elapsed = time.perf_counter() - started
+            request_seconds.observe(elapsed, model=current, outcome="ok")
+            self.latency(current).record(elapsed)
+            self.breaker(current).record_success()
+
+            try:
+                yield first
+                async for chunk in iterator:
+                    yield chunk
+            finally:
+                # Releases the connection when the consumer stops early
+                await self.close_stream(stream)
+            return
+
+        raise LLMDeadlineExceeded(f"Stream did not start: {last_error!r}")
+
+
+# Global resilience layer instance
+llm_resilience = LLMResilience()
@@ -0,0 +1,155 @@
+"""
+Concurrency scheduler for LLM calls.
+
+Caps the number of completions in flight across the worker and queues the
+rest fairly: waiting requests are grouped per user and users are served
+round-robin, so one chatty user cannot starve others. Onboarding turns are
+served before regular chat, and the queue is bounded so overload is
+rejected immediately instead of piling up behind the provider.
+"""
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, List
+from ..config import settings
+from .metrics import metrics
+
+
+class LLMOverloadedError(Exception):
+    """Raised when an LLM call is rejected because the scheduler is saturated."""
+
+    def __init__(self, reason: str):
+        super().__init__(f"LLM capacity exceeded ({reason})")
+        self.reason = reason
+
+
+class LLMScheduler:
+    """Global concurrency cap with per-user round-robin queuing."""
+
+    PRIORITY_ONBOARDING = 0
+    PRIORITY_CHAT = 1
+    PRIORITY_NAMES = {PRIORITY_ONBOARDING: "onboarding", PRIORITY_CHAT: "chat"}
+
+    def __init__(self):
+        self.max_concurrency = settings.LLM_MAX_CONCURRENCY
+        self.max_queue_depth = settings.LLM_MAX_QUEUE_DEPTH
+        self.active = 0
+        self.queued = 0
+        # priority -> user -> waiters, users in round-robin order
+        self._queues: List["OrderedDict[str, Deque[asyncio.Future]]"] = [
+            OrderedDict() for _ in self.PRIORITY_NAMES
+        ]
+
+        self.wait_seconds = metrics.histogram(
+            "llm_queue_wait_seconds",
+            "Time LLM calls waited for a concurrency slot",
+            ["priority"]
+        )
+        self.rejected = metrics.counter(
+            "llm_scheduler_rejected_total",
+            "LLM calls rejected by the scheduler",
+            ["reason"]
+        )
+        metrics.sampled(
+            "llm_scheduler_calls",
+            "LLM calls holding or waiting for a concurrency slot",
+            lambda: {("active",): self.active, ("queued",): self.queued},
+            ["state"]
+        )
+
+    def priority_for(self, is_onboarding: bool) -> int:
+        return self.PRIORITY_ONBOARDING if is_onboarding else self.PRIORITY_CHAT
+
+    def has_capacity(self) -> bool:
+        """Whether a new call could currently be run or queued."""
+        return self.active < self.max_concurrency or self.queued < self.max_queue_depth
+
+    async def acquire(self, user_id: str, priority: int = PRIORITY_CHAT) -> None:
+        """
+        Wait for a concurrency slot.
+
+        Raises:
+            LLMOverloadedError: If the queue is full, or no slot frees up
+                within LLM_QUEUE_TIMEOUT seconds
+        """
+        started = time.perf_counter()
+        label = self.PRIORITY_NAMES[priority]
+
+        if self.active < self.max_concurrency and self.queued == 0:
+            self.active += 1
+            self.wait_seconds.observe(0.0, priority=label)
+            return
+
+        if self.queued >= self.max_queue_depth:
+            self.rejected.inc(reason="queue_full")
+            raise LLMOverloadedError("queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._queues[priority].setdefault(user_id, deque()).append(waiter)
+        self.queued += 1
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=settings.LLM_QUEUE_TIMEOUT)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # Granted a slot just as we gave up; hand it on
+                self.release()
+            else:
+                waiter.cancel()
+                self._discard(priority, user_id, waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                self.rejected.inc(reason="timeout")
+                raise LLMOverloadedError("timeout")
+            raise
+
+        self.wait_seconds.observe(time.perf_counter() - started, priority=label)
+
+    def release(self) -> None:
+        """Free a slot, handing it directly to the next waiter if any."""
+        for users in self._queues:
+            while users:
+                user_id, waiters = next(iter(users.items()))
+                waiter = waiters.popleft()
+                if waiters:
+                    # Round-robin: this user's next call goes to the back
+                    users.move_to_end(user_id)
+                else:
+                    del users[user_id]
+                self.queued -= 1
+                if not waiter.done():
+                    waiter.set_result(None)
+                    return
+        self.active -= 1
+
+    def _discard(self, priority: int, user_id: str, waiter: asyncio.Future) -> None:
+        """Remove an abandoned waiter from the queue."""
+        waiters = self._queues[priority].get(user_id)
+        if waiters is None or waiter not in waiters:
+            return
+        waiters.remove(waiter)
+        if not waiters:
+            del self._queues[priority][user_id]
+        self.queued -= 1
+
+    @asynccontextmanager
+    async def slot(self, user_id: str, is_onboarding: bool = False) -> AsyncIterator[None]:
+        """Hold a concurrency slot for the duration of the block."""
+        await self.acquire(user_id, self.priority_for(is_onboarding))
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, int]:
+        """Current load."""
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "max_concurrency": self.max_concurrency,
+            "max_queue_depth": self.max_queue_depth
+        }
+
+
+# Global LLM scheduler instance
+llm_scheduler = LLMScheduler()
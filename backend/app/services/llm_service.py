@@ -1,24 +1,76 @@
 """
 LLM service for OpenRouter integration and context management.
 """
-from openai import OpenAI
+import httpx
+from contextlib import aclosing
+from openai import OpenAI, AsyncOpenAI
 from sqlalchemy.orm import Session
-from typing import List, Dict, Optional
+from typing import Any, AsyncIterator, List, Dict, Optional, Tuple
 from uuid import UUID
 
 from ..config import settings
 from ..models import Message
+from .cache_service import cache_service
+from .job_queue import job_queue
+from .llm_resilience import llm_resilience
+from .llm_scheduler import LLMOverloadedError, llm_scheduler
 from .memory_service import memory_service
-from .protocol_service import protocol_service
+from .metrics import metrics
+from .model_router import model_router
+from .prompt_service import EMPTY_FRAGMENT, prompt_service
+from .protocol_service import ProtocolSnapshot, protocol_service
+from .response_cache import response_cache
+from .token_service import token_service
+
+
+stage_seconds = metrics.histogram(
+    "chat_stage_seconds",
+    "Time spent in each stage of a chat turn",
+    ["handler", "stage"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+)
+tokens_used = metrics.counter(
+    "llm_tokens_total",
+    "Tokens reported by the LLM provider",
+    ["model", "kind"]
+)
 
 
 class LLMService:
     """Service for LLM interactions via OpenRouter."""
     
+    EXTRA_HEADERS = {
+        "HTTP-Referer": "https://github.com/Saurabhdixit93/AI-Health-Coach",
+        "X-Title": "Disha AI Health Coach"
+    }
+    
+    FALLBACK_RESPONSE = "I apologize, but I'm having trouble processing your message right now. Could you please try again in a moment?"
+    
     def __init__(self):
         self.client = OpenAI(
             api_key=settings.OPENROUTER_API_KEY,
-            base_url=settings.AI_BASE_URL
+            base_url=settings.AI_BASE_URL,
+            timeout=settings.LLM_REQUEST_TIMEOUT
+        )
+        
+        # Shared keep-alive pool for the async client so concurrent chats
+        # reuse connections instead of blocking the event loop
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY
+            ),
+            timeout=httpx.Timeout(
+                settings.LLM_REQUEST_TIMEOUT,
+                connect=settings.LLM_CONNECT_TIMEOUT
+            )
+        )
+        self.async_client = AsyncOpenAI(
+            api_key=settings.OPENROUTER_API_KEY,
+            base_url=settings.AI_BASE_URL,
+            http_client=self.http_client,
+            max_retries=settings.LLM_CLIENT_MAX_RETRIES
         )
         self.model = settings.AI_MODEL
         self.temperature = settings.AI_TEMPERATURE
@@ -26,41 +78,14 @@ class LLMService:
     
     def count_tokens(self, text: str) -> int:
         """
-        Estimate token count using character-based approximation.
-        Rough estimate: ~4 characters per token for English text.
-        This is sufficient for context management without requiring tiktoken.
+        Count tokens with the configured tokenizer backend.
+        Counts are memoized by content hash, see TokenService.
         """
-        return len(text) // 4
+        return token_service.count(text)
     
     def get_system_prompt(self) -> str:
         """Get the system prompt for Disha health coach."""
-        return """You are Disha, India's first AI health coach. You are warm, empathetic, and professional - like a caring friend on WhatsApp who happens to be a health expert.
-
-Your role is to:
-- Provide personalized health guidance based on user context and history
-- Ask thoughtful clarifying questions to understand their situation better
-- Follow medical protocols when applicable for common health issues
-- Be conversational, supportive, and natural - NOT clinical or robotic
-- Remember user details and reference them naturally in conversation
-- Keep responses concise (2-4 sentences typically) like a real chat conversation
-
-IMPORTANT GUIDELINES:
-- NEVER provide emergency medical advice - always suggest seeing a doctor for serious/emergency situations
-- Be culturally sensitive and aware of Indian context
-- Use simple, easy-to-understand language
-- Show empathy and emotional support
-- Focus on preventive care and healthy lifestyle guidance
-- Respect user privacy and confidentiality
-- Do not provide any medical advice
-- Do not provide outside information except for Dishai's website
-- Do not provide any contact information
-- Do not write, say or suggest any prescription
-- Do not write, say or suggest any medical test
-- Do not write, say or talk about AI ,code and outside information 
-- Do not write, say or talk about any other health coach or AI health coach
-- Never write , share or provide external information except for Dishai's website and related information
-
-Remember: You're a supportive health coach, not a replacement for professional medical care."""
+        return prompt_service.system.text
     
     def get_onboarding_prompt(self, user_name: Optional[str] = None) -> str:
         """Get onboarding conversation starter."""
@@ -69,11 +94,108 @@ Remember: You're a supportive health coach, not a replacement for professional m
         else:
             return "Hi there! 👋 I'm Disha, your personal health coach. I'm excited to support you on your health journey! What's your name?"
     
+    def context_cache_keys(self, user_id: UUID) -> List[str]:
+        """
+        Cache keys read by build_context.
+        
+        Routes can prefetch these (plus the list at context_window_key) in
+        the same Redis round-trip as other per-turn cache operations and
+        pass the results to build_context.
+        """
+        return [cache_service.PROTOCOL_VERSION_KEY]
+    
+    @staticmethod
+    def context_window_key(user_id: UUID) -> str:
+        """Cache key of a user's rolling window of recent messages."""
+        return f"context:{user_id}"
+    
+    @staticmethod
+    def context_entry(message: Message) -> Dict[str, Any]:
+        """Context window entry for a stored message."""
+        return {
+            "role": message.role,
+            "content": message.content,
+            "tokens": message.token_count or 0
+        }
+    
+    def get_context_window(self, user_id: UUID, db: Session) -> List[Dict[str, Any]]:
+        """
+        Get the user's most recent MAX_CONTEXT_MESSAGES messages, oldest first.
+        
+        Served from the cached window when present. On a miss the window is
+        loaded from the database and cached for CONTEXT_WINDOW_TTL seconds;
+        new messages are appended to it as they are stored, and it is not
+        refreshed, so every window is rebuilt from the database at least
+        once per TTL.
+        """
+        key = self.context_window_key(user_id)
+        window = cache_service.get_list(key)
+        if window is not None:
+            return window
+        
+        window = self.load_context_window(user_id, db)
+        cache_service.replace_list(key, window, expiry=settings.CONTEXT_WINDOW_TTL)
+        return window
+    
+    def load_context_window(self, user_id: UUID, db: Session) -> List[Dict[str, Any]]:
+        """Read the user's context window from the database, bypassing the cache."""
+        recent_messages = db.query(Message).filter(
+            Message.user_id == user_id
+        ).order_by(Message.created_at.desc(), Message.id.desc()).limit(
+            settings.MAX_CONTEXT_MESSAGES
+        ).all()
+        
+        recent_messages.reverse()  # Chronological order
+        
+        return [self.context_entry(msg) for msg in recent_messages]
+    
+    def context_window_append(self, *messages: Message) -> Dict[str, Any]:
+        """
+        List append spec for CacheService.execute_batch that adds stored
+        messages to their user's cached window (if one exists).
+        """
+        appends: Dict[str, Any] = {}
+        for message in messages:
+            key = self.context_window_key(message.user_id)
+            items, _ = appends.setdefault(key, ([], settings.MAX_CONTEXT_MESSAGES))
+            items.append(self.context_entry(message))
+        return appends
+    
+    async def append_to_context_window(self, *messages: Message) -> None:
+        """Append stored messages to their users' cached windows."""
+        await cache_service.execute_batch(list_appends=self.context_window_append(*messages))
+    
+    def invalidate_context_window(self, user_id: UUID) -> bool:
+        """Drop a user's cached window so the next turn reloads it."""
+        return cache_service.delete(self.context_window_key(user_id))
+    
+    def match_protocols(
+        self,
+        user_message: str,
+        db: Session,
+        prefetched: Optional[Dict[str, Any]] = None
+    ) -> Tuple[List[ProtocolSnapshot], Optional[str]]:
+        """
+        Match protocols for a message.
+        
+        Returns:
+            (matched protocols, version stamp of the protocol set used)
+        """
+        if prefetched is not None and cache_service.PROTOCOL_VERSION_KEY in prefetched:
+            matcher = protocol_service.get_matcher(
+                db, version=prefetched[cache_service.PROTOCOL_VERSION_KEY]
+            )
+        else:
+            matcher = protocol_service.get_matcher(db)
+        return matcher.match(user_message), matcher.version
+    
     def build_context(
         self,
         user_id: UUID,
         user_message: str,
-        db: Session
+        db: Session,
+        prefetched: Optional[Dict[str, Any]] = None,
+        matched_protocols: Optional[List[ProtocolSnapshot]] = None
     ) -> List[Dict[str, str]]:
         """
         Build context for LLM call with token management.
@@ -82,6 +204,8 @@ Remember: You're a supportive health coach, not a replacement for professional m
             user_id: User ID
             user_message: Current user message
             db: Database session
+            prefetched: Values of context_cache_keys already read by the caller
+            matched_protocols: Protocols already matched by the caller
             
         Returns:
             List of message dictionaries for OpenAI API
@@ -90,49 +214,42 @@ Remember: You're a supportive health coach, not a replacement for professional m
         total_tokens = 0
         max_input_tokens = settings.MAX_INPUT_TOKENS
         
-        # 1. System prompt
-        system_prompt = self.get_system_prompt()
-        system_tokens = self.count_tokens(system_prompt)
-        total_tokens += system_tokens
-        
+        # 1. System prompt (precomputed, with its token count)
         # 2. Get relevant memories
-        memories = memory_service.get_relevant_memories(user_id, db, limit=5)
-        memory_context = memory_service.format_memories_for_context(memories)
-        memory_tokens = self.count_tokens(memory_context)
-        total_tokens += memory_tokens
+        with stage_seconds.time(handler="build_context", stage="memories"):
+            memories = memory_service.get_relevant_memories(user_id, db, limit=5, query=user_message)
+            memory_section = prompt_service.memories_section(memories)
         
         # 3. Match protocols
-        matched_protocols = protocol_service.match_protocols(user_message, db)
-        protocol_context = protocol_service.format_protocols_for_context(matched_protocols)
-        protocol_tokens = self.count_tokens(protocol_context)
-        total_tokens += protocol_tokens
+        with stage_seconds.time(handler="build_context", stage="protocols"):
+            if matched_protocols is None:
+                matched_protocols, _ = self.match_protocols(user_message, db, prefetched)
+            protocol_section = prompt_service.protocols_section(matched_protocols)
         
         # 4. Combine system prompt with context
-        full_system_prompt = system_prompt
-        if memory_context:
-            full_system_prompt += f"\n\n{memory_context}"
-        if protocol_context:
-            full_system_prompt += f"\n\n{protocol_context}"
+        system_message = prompt_service.system_message(memory_section, protocol_section)
+        total_tokens += system_message.tokens
         
-        messages.append({"role": "system", "content": full_system_prompt})
+        messages.append({"role": "system", "content": system_message.text})
         
-        # 5. Get recent conversation history
-        recent_messages = db.query(Message).filter(
-            Message.user_id == user_id
-        ).order_by(Message.created_at.desc()).limit(
-            settings.MAX_CONTEXT_MESSAGES
-        ).all()
-        
-        recent_messages.reverse()  # Chronological order
+        # 5. Get recent conversation history (cached rolling window)
+        window = None
+        if prefetched is not None:
+            window = prefetched.get(self.context_window_key(user_id))
+        if window is None:
+            with stage_seconds.time(handler="build_context", stage="history"):
+                window = self.get_context_window(user_id, db)
         
         # Add messages while staying within token budget
         conversation_messages = []
-        for msg in recent_messages:
-            msg_tokens = self.count_tokens(msg.content)
+        for entry in window:
+            # Reuse the count stored with the message; rows written before
+            # counts were stored have 0
+            msg_tokens = entry.get("tokens") or self.count_tokens(entry["content"])
             if total_tokens + msg_tokens < max_input_tokens - 200:  # Reserve for current message
                 conversation_messages.append({
-                    "role": msg.role,
-                    "content": msg.content
+                    "role": entry["role"],
+                    "content": entry["content"]
                 })
                 total_tokens += msg_tokens
             else:
@@ -147,6 +264,83 @@ Remember: You're a supportive health coach, not a replacement for professional m
         
         return messages
     
+    def _completion_params(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str] = None,
+        max_tokens: Optional[int] = None
+    ) -> Dict:
+        """Build keyword arguments for a chat completion request."""
+        return {
+            "model": model or self.model,
+            "messages": messages,
+            "temperature": self.temperature,
+            "max_tokens": max_tokens or self.max_tokens,
+            "extra_headers": self.EXTRA_HEADERS
+        }
+    
+    @staticmethod
+    def record_usage(usage: Any, model: str) -> None:
+        """Count the prompt and completion tokens of a response's usage block."""
+        if usage is None:
+            return
+        tokens_used.inc(usage.prompt_tokens or 0, model=model, kind="prompt")
+        tokens_used.inc(usage.completion_tokens or 0, model=model, kind="completion")
+    
+    def maybe_extract_memories(
+        self,
+        user_id: UUID,
+        user_message: str,
+        ai_message: str,
+        db: Session
+    ) -> None:
+        """Extract long-term memories every N user messages."""
+        if memory_service.should_extract_memories(user_id, db, interval=settings.MEMORY_EXTRACTION_INTERVAL):
+            # Summarize recent conversation for memory extraction
+            conversation_text = f"{user_message} {ai_message}"
+            memory_service.extract_and_store_memories(user_id, conversation_text, db)
+            memory_service.mark_memories_extracted(user_id, db)
+    
+    async def enqueue_memory_extraction(
+        self,
+        user_id: UUID,
+        user_message: str,
+        ai_message: str
+    ) -> None:
+        """Queue memory extraction for a completed turn off the response path."""
+        await job_queue.enqueue("extract_memories", {
+            "user_id": str(user_id),
+            "conversation_text": f"{user_message} {ai_message}"
+        })
+    
+    def build_cacheable_context(
+        self,
+        user_message: str,
+        protocols: List[ProtocolSnapshot]
+    ) -> List[Dict[str, str]]:
+        """
+        Build a user-independent context for replies stored in the response cache.
+        
+        Cached replies are shared by everyone asking the same question, so
+        they are generated from the system prompt and protocol block only,
+        without the asking user's memories or conversation history.
+        
+        Args:
+            user_message: Current user message
+            protocols: Protocols matched for the message
+            
+        Returns:
+            List of message dictionaries for OpenAI API
+        """
+        system_message = prompt_service.system_message(
+            EMPTY_FRAGMENT,
+            prompt_service.protocols_section(protocols)
+        )
+        return [
+            {"role": "system", "content": system_message.text},
+            {"role": "user", "content": user_message}
+        ]
+    
     def generate_response(
         self,
         user_id: UUID,
@@ -157,6 +351,9 @@ Remember: You're a supportive health coach, not a replacement for professional m
         """
         Generate AI response using OpenRouter.
         
+        Blocking variant for scripts and sync callers. Async routes should
+        use generate_response_async instead.
+        
         Args:
             user_id: User ID
             user_message: User's message
@@ -167,36 +364,170 @@ Remember: You're a supportive health coach, not a replacement for professional m
             AI generated response
         """
         try:
-            # Build context
-            messages = self.build_context(user_id, user_message, db)
+            # Serve deterministic protocol answers from the response cache
+            protocols, version = self.match_protocols(user_message, db)
+            cache_key = response_cache.key_for(user_message, protocols, version, is_onboarding)
+            if cache_key is not None:
+                cached = response_cache.get(cache_key)
+                if cached is not None:
+                    self.maybe_extract_memories(user_id, user_message, cached, db)
+                    return cached
             
-            # Call OpenRouter API
+            # Build context; a reply that will be cached is shared, so it gets no user context
+            if cache_key is not None:
+                messages = self.build_cacheable_context(user_message, protocols)
+            else:
+                messages = self.build_context(user_id, user_message, db, matched_protocols=protocols)
+            
+            # Call OpenRouter API with the routed model
+            route = model_router.route(messages, is_onboarding, protocols)
             response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=self.temperature,
-                max_tokens=self.max_tokens,
-                extra_headers={
-                    "HTTP-Referer": "https://github.com/Saurabhdixit93/AI-Health-Coach",
-                    "X-Title": "Disha AI Health Coach"
-                }
+                **self._completion_params(messages, route.model, route.max_tokens)
             )
+            self.record_usage(response.usage, response.model or route.model)
             
             # Extract response
             ai_message = response.choices[0].message.content
             
-            # Check if we should extract memories
-            if memory_service.should_extract_memories(user_id, db, interval=settings.MEMORY_EXTRACTION_INTERVAL):
-                # Summarize recent conversation for memory extraction
-                conversation_text = f"{user_message} {ai_message}"
-                memory_service.extract_and_store_memories(user_id, conversation_text, db)
+            if cache_key is not None and ai_message:
+                response_cache.set(cache_key, ai_message)
+            
+            self.maybe_extract_memories(user_id, user_message, ai_message, db)
             
             return ai_message
             
         except Exception as e:
             print(f"LLM Error: {e}")
             # Fallback response
-            return "I apologize, but I'm having trouble processing your message right now. Could you please try again in a moment?"
+            return self.FALLBACK_RESPONSE
+    
+    async def generate_response_async(
+        self,
+        user_id: UUID,
+        user_message: str,
+        db: Session,
+        is_onboarding: bool = False,
+        prefetched: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """
+        Generate AI response without blocking the event loop.
+        
+        Uses the pooled AsyncOpenAI client, so a single worker can keep many
+        completions in flight while other requests are served. The call
+        waits for a slot from the LLM scheduler and runs under the
+        resilience layer's deadline, retries, hedging and circuit breaker,
+        so failures fall back to the apology within LLM_DEADLINE seconds.
+        
+        Args:
+            user_id: User ID
+            user_message: User's message
+            db: Database session
+            is_onboarding: Whether this is part of onboarding
+            prefetched: Values of context_cache_keys already read by the caller
+            
+        Returns:
+            AI generated response
+            
+        Raises:
+            LLMOverloadedError: If the scheduler rejects the call
+        """
+        try:
+            with stage_seconds.time(handler="generate", stage="match_protocols"):
+                protocols, version = self.match_protocols(user_message, db, prefetched)
+            cache_key = response_cache.key_for(user_message, protocols, version, is_onboarding)
+            if cache_key is not None:
+                with stage_seconds.time(handler="generate", stage="response_cache"):
+                    cached = await response_cache.aget(cache_key)
+                if cached is not None:
+                    await self.enqueue_memory_extraction(user_id, user_message, cached)
+                    return cached
+            
+            with stage_seconds.time(handler="generate", stage="build_context"):
+                if cache_key is not None:
+                    messages = self.build_cacheable_context(user_message, protocols)
+                else:
+                    messages = self.build_context(
+                        user_id, user_message, db, prefetched, matched_protocols=protocols
+                    )
+            
+            route = model_router.route(messages, is_onboarding, protocols)
+            
+            # Includes the wait for a scheduler slot (see llm_queue_wait_seconds)
+            with stage_seconds.time(handler="generate", stage="llm_call"):
+                async with llm_scheduler.slot(str(user_id), is_onboarding):
+                    response = await llm_resilience.complete(
+                        lambda model, timeout: self.async_client.chat.completions.create(
+                            **self._completion_params(messages, model, route.max_tokens),
+                            timeout=timeout
+                        ),
+                        route.model
+                    )
+            self.record_usage(response.usage, response.model or route.model)
+            
+            ai_message = response.choices[0].message.content
+            
+            if cache_key is not None and ai_message:
+                await response_cache.aset(cache_key, ai_message)
+            
+            await self.enqueue_memory_extraction(user_id, user_message, ai_message)
+            
+            return ai_message
+            
+        except LLMOverloadedError:
+            raise
+        except Exception as e:
+            print(f"LLM Error: {e}")
+            return self.FALLBACK_RESPONSE
+    
+    async def stream_completion_async(
+        self,
+        messages: List[Dict[str, str]],
+        user_id: UUID,
+        is_onboarding: bool = False,
+        protocols: Optional[List[ProtocolSnapshot]] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream completion tokens for an already-built context.
+        
+        The scheduler slot is held until the stream ends. Opening the
+        stream is retried (or failed over) until the first chunk arrives.
+        
+        Args:
+            messages: Context from build_context
+            user_id: User the completion is for, for fair scheduling
+            is_onboarding: Whether this is part of onboarding
+            protocols: Protocols matched for the turn, for model routing
+            
+        Yields:
+            Content deltas in the order the model produces them
+        """
+        route = model_router.route(messages, is_onboarding, protocols)
+        
+        async with llm_scheduler.slot(str(user_id), is_onboarding):
+            stream = llm_resilience.stream(
+                lambda model, timeout: self.async_client.chat.completions.create(
+                    **self._completion_params(messages, model, route.max_tokens),
+                    stream=True,
+                    stream_options={"include_usage": True},
+                    timeout=timeout
+                ),
+                route.model
+            )
+            # Closes the HTTP stream as soon as our caller stops reading
+            async with aclosing(stream):
+                async for chunk in stream:
+                    if chunk.usage is not None:
+                        # Sent on a final chunk without choices
+                        self.record_usage(chunk.usage, chunk.model or route.model)
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        yield delta
+    
+    async def close(self) -> None:
+        """Close pooled HTTP connections held by the async client."""
+        await self.async_client.close()
 
 
 # Global LLM service instance
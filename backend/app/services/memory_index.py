@@ -0,0 +1,275 @@
+"""
+Per-user BM25 index over long-term memories.
+
+Each user's memories are tokenized once into an inverted index that is kept
+in a bounded in-process LRU. New memories are added incrementally, either
+directly when they are stored by this process or by a cheap catch-up query
+for rows newer than the index's high-water mark, so ranking a message never
+rescans or re-tokenizes the user's memories. Compaction rewrites and
+deletes memories, which the catch-up query cannot see, so it bumps a
+per-user version in Redis and indexes built from an older version are
+rebuilt.
+"""
+import heapq
+import math
+import re
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from sqlalchemy.orm import Session
+from typing import Dict, Iterable, List, Optional
+from uuid import UUID
+from ..config import settings
+from ..models import Memory
+from .cache_service import LocalCache, cache_service
+
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+# Function words that carry no signal for matching memories
+_STOPWORDS = frozenset(
+    "a an and are as at be been but by can did do does for from had has have "
+    "he her his how i if in is it its me my no not of on or our she so that "
+    "the their them then there they this to was we were what when which who "
+    "will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase terms with stopwords removed and plurals folded."""
+    terms = []
+    for word in _WORD.findall(text.lower()):
+        if word in _STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+
+@dataclass(frozen=True)
+class MemorySnapshot:
+    """Detached, read-only copy of a memory held by the index."""
+    id: UUID
+    content: str
+    category: str
+    importance_score: float
+    created_at: datetime
+
+    @classmethod
+    def from_model(cls, memory: Memory) -> "MemorySnapshot":
+        return cls(
+            id=memory.id,
+            content=memory.content,
+            category=memory.category,
+            importance_score=memory.importance_score if memory.importance_score is not None else 0.5,
+            # Rows read back from the DB are naive UTC; match that for
+            # instances snapshotted before a reload
+            created_at=memory.created_at.replace(tzinfo=None)
+        )
+
+
+class MemoryIndex:
+    """
+    Okapi BM25 over one user's memories.
+
+    Postings map each term to {memory id: term frequency}; document lengths
+    and the running total are maintained on add/remove, so scoring a query
+    touches only the postings of its terms. Each term's per-memory BM25
+    weights are computed on first use and kept until the index changes.
+    """
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self):
+        self.docs: Dict[UUID, MemorySnapshot] = {}
+        self._postings: Dict[str, Dict[UUID, int]] = {}
+        self._lengths: Dict[UUID, int] = {}
+        self._total_length = 0
+        self._weights: Dict[str, Dict[UUID, float]] = {}
+        self._by_importance: Optional[List[MemorySnapshot]] = None
+        self._lock = threading.Lock()
+        self.high_water: Optional[datetime] = None
+        self.version: Optional[str] = None
+        self.checked_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def add(self, memories: Iterable[MemorySnapshot]) -> None:
+        """Index memories; ones already present are skipped."""
+        with self._lock:
+            for memory in memories:
+                if memory.id in self.docs:
+                    continue
+
+                terms = tokenize(memory.content)
+                self.docs[memory.id] = memory
+                self._lengths[memory.id] = len(terms)
+                self._total_length += len(terms)
+                for term in terms:
+                    postings = self._postings.setdefault(term, {})
+                    postings[memory.id] = postings.get(memory.id, 0) + 1
+
+                if self.high_water is None or memory.created_at > self.high_water:
+                    self.high_water = memory.created_at
+                self._weights.clear()
+                self._by_importance = None
+
+    def remove(self, memory_ids: Iterable[UUID]) -> None:
+        """Drop memories from the index."""
+        with self._lock:
+            for memory_id in memory_ids:
+                memory = self.docs.pop(memory_id, None)
+                if memory is None:
+                    continue
+
+                self._total_length -= self._lengths.pop(memory_id)
+                for term in set(tokenize(memory.content)):
+                    postings = self._postings.get(term)
+                    if postings is not None:
+                        postings.pop(memory_id, None)
+                        if not postings:
+                            del self._postings[term]
+                self._weights.clear()
+                self._by_importance = None
+
+    def _term_weights(self, term: str) -> Dict[UUID, float]:
+        """BM25 weight of a term for each memory containing it."""
+        weights = self._weights.get(term)
+        if weights is not None:
+            return weights
+
+        weights = {}
+        postings = self._postings.get(term)
+        if postings:
+            count = len(self.docs)
+            average_length = (self._total_length / count) or 1.0
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for memory_id, tf in postings.items():
+                norm = self.K1 * (1 - self.B + self.B * self._lengths[memory_id] / average_length)
+                weights[memory_id] = idf * tf * (self.K1 + 1) / (tf + norm)
+        self._weights[term] = weights
+        return weights
+
+    def search(self, query: str, limit: int) -> List[MemorySnapshot]:
+        """
+        Rank memories against a query.
+
+        Memories matching the query come first by BM25 score; remaining
+        slots are filled with the most important unmatched memories so core
+        facts stay in context.
+        """
+        with self._lock:
+            if not self.docs or limit <= 0:
+                return []
+
+            scores: Dict[UUID, float] = {}
+            for term in set(tokenize(query)):
+                weights = self._term_weights(term)
+                if not scores:
+                    scores.update(weights)
+                    continue
+                for memory_id, weight in weights.items():
+                    scores[memory_id] = scores.get(memory_id, 0.0) + weight
+
+            ranked = [
+                self.docs[memory_id]
+                for memory_id in heapq.nlargest(
+                    limit,
+                    scores,
+                    key=scores.__getitem__
+                )
+            ]
+            if len(ranked) >= limit:
+                return ranked
+
+            if self._by_importance is None:
+                self._by_importance = sorted(
+                    self.docs.values(),
+                    key=lambda memory: (memory.importance_score, memory.created_at),
+                    reverse=True
+                )
+
+            for memory in self._by_importance:
+                if len(ranked) >= limit:
+                    break
+                if memory.id not in scores:
+                    ranked.append(memory)
+            return ranked
+
+
+class MemoryIndexService:
+    """Bounded cache of per-user memory indexes."""
+
+    def __init__(self):
+        self._indexes = LocalCache(
+            max_entries=settings.MEMORY_INDEX_MAX_USERS,
+            max_ttl=settings.MEMORY_INDEX_TTL
+        )
+        self._build_lock = threading.Lock()
+
+    @staticmethod
+    def _build(user_id: UUID, db: Session) -> MemoryIndex:
+        """Index all of a user's memories."""
+        index = MemoryIndex()
+        # Read before the rows, so a compaction in between triggers a rebuild
+        index.version = cache_service.get_memory_version(user_id)
+        index.add(
+            MemorySnapshot.from_model(memory)
+            for memory in db.query(Memory).filter(Memory.user_id == user_id)
+        )
+        return index
+
+    def get(self, user_id: UUID, db: Session) -> MemoryIndex:
+        """
+        Get a user's index, building it on a miss.
+
+        Memories stored by other processes are picked up at most
+        MEMORY_INDEX_REFRESH_INTERVAL seconds late by fetching only rows
+        newer than the index's high-water mark. If the user's memories were
+        compacted since the index was built, it is rebuilt instead.
+        """
+        key = str(user_id)
+        found, index = self._indexes.get(key)
+        if found and time.monotonic() - index.checked_at >= settings.MEMORY_INDEX_REFRESH_INTERVAL:
+            index.checked_at = time.monotonic()
+            if cache_service.get_memory_version(user_id) != index.version:
+                self._indexes.delete(key)
+                found = False
+            else:
+                query = db.query(Memory).filter(Memory.user_id == user_id)
+                if index.high_water is not None:
+                    # >= so rows sharing the mark are not missed; add() skips known ids
+                    query = query.filter(Memory.created_at >= index.high_water)
+                index.add(MemorySnapshot.from_model(memory) for memory in query)
+
+        if not found:
+            with self._build_lock:
+                found, index = self._indexes.get(key)
+                if not found:
+                    index = self._build(user_id, db)
+                    self._indexes.set(key, index, settings.MEMORY_INDEX_TTL)
+        return index
+
+    def add(self, user_id: UUID, memories: Iterable[MemorySnapshot]) -> None:
+        """Add new memories to a user's index if it is cached."""
+        found, index = self._indexes.get(str(user_id))
+        if found:
+            index.add(memories)
+
+    def remove(self, user_id: UUID, memory_ids: Iterable[UUID]) -> None:
+        """Remove memories from a user's index if it is cached."""
+        found, index = self._indexes.get(str(user_id))
+        if found:
+            index.remove(memory_ids)
+
+    def invalidate(self, user_id: UUID) -> None:
+        """Drop a user's index so the next lookup rebuilds it."""
+        self._indexes.delete(str(user_id))
+
+
+# Global memory index instance
+memory_index = MemoryIndexService()
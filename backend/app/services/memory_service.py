@@ -1,11 +1,42 @@
 """
 Memory service for extracting and retrieving long-term user memories.
 """
+import hashlib
+import re
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from sqlalchemy import func, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Any, Dict, FrozenSet, List, Optional, Set, Tuple
 from uuid import UUID
-from ..models import Memory, Message
+from ..config import settings
+from ..database import SessionLocal
+from ..models import Memory, User
 from ..schemas import MemoryCreate
+from .cache_service import cache_service
+from .job_queue import job_queue
+from .memory_index import MemorySnapshot, memory_index, tokenize
+from .token_service import token_service
+
+
+_NON_ALPHANUMERIC = re.compile(r"[^a-z0-9]+")
+
+
+@dataclass
+class CompactionReport:
+    """Outcome of a memory compaction run."""
+    users: int = 0
+    decayed: int = 0
+    merged: int = 0
+    capped: int = 0
+    tokens_saved: int = 0
+    
+    @property
+    def rows_removed(self) -> int:
+        return self.merged + self.capped
 
 
 class MemoryService:
@@ -16,6 +47,9 @@ class MemoryService:
         """
         Check if we should extract memories based on message count.
         
+        Reads the user's denormalized counters, so the check is O(1)
+        regardless of history length.
+        
         Args:
             user_id: User ID
             db: Database session
@@ -24,12 +58,28 @@ class MemoryService:
         Returns:
             True if memories should be extracted
         """
-        message_count = db.query(Message).filter(
-            Message.user_id == user_id,
-            Message.role == "user"
-        ).count()
+        counters = db.query(
+            User.message_count,
+            User.last_extraction_count
+        ).filter(User.id == user_id).first()
+        
+        if not counters:
+            return False
         
-        return message_count > 0 and message_count % interval == 0
+        message_count, last_extraction_count = counters
+        return message_count > 0 and message_count - last_extraction_count >= interval
+    
+    @staticmethod
+    def mark_memories_extracted(user_id: UUID, db: Session) -> None:
+        """Record that memories are extracted up to the current message count."""
+        db.execute(
+            update(User).where(User.id == user_id).values(
+                last_extraction_count=User.message_count,
+                updated_at=User.updated_at
+            ),
+            execution_options={"synchronize_session": False}
+        )
+        db.commit()
     
     @staticmethod
     def extract_and_store_memories(
@@ -42,6 +92,8 @@ class MemoryService:
         
         In a production system, this would use an LLM to extract structured
         information. For this implementation, we'll use simple pattern matching.
+        Memories are deduplicated by normalized content hash; extracting one
+        the user already has raises its importance instead of adding a row.
         
         Args:
             user_id: User ID
@@ -49,10 +101,26 @@ class MemoryService:
             db: Database session
             
         Returns:
-            List of created memories
+            List of created or reinforced memories
         """
-        memories = []
+        rows = MemoryService.extract_memory_rows(user_id, conversation_summary)
+        return MemoryService.store_memory_rows(user_id, list(rows.values()), db)
+    
+    @staticmethod
+    def extract_memory_rows(
+        user_id: UUID,
+        conversation_summary: str,
+        now: Optional[datetime] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Extract memory rows from conversation text without storing them.
+        
+        Returns:
+            Memory insert values keyed by content hash
+        """
+        rows: Dict[str, Dict[str, Any]] = {}
         summary_lower = conversation_summary.lower()
+        now = now or datetime.now(timezone.utc)
         
         # Simple extraction patterns (in production, use LLM)
         patterns = {
@@ -70,48 +138,228 @@ class MemoryService:
                     sentences = conversation_summary.split('.')
                     for sentence in sentences:
                         if keyword in sentence.lower():
-                            memory = Memory(
-                                user_id=user_id,
-                                content=sentence.strip(),
-                                category=category,
-                                importance_score=0.7  # Default importance
-                            )
-                            db.add(memory)
-                            memories.append(memory)
+                            content = sentence.strip()
+                            content_hash = MemoryService.content_hash(content)
+                            # A sentence matched by several categories is stored once
+                            rows.setdefault(content_hash, {
+                                "id": uuid.uuid4(),
+                                "user_id": user_id,
+                                "content": content,
+                                "category": category,
+                                "importance_score": 0.7,  # Default importance
+                                "content_hash": content_hash,
+                                "created_at": now,
+                                "scored_at": now
+                            })
                             break
                     break
         
-        if memories:
-            db.commit()
+        return rows
+    
+    @staticmethod
+    def store_memory_rows(user_id: UUID, rows: List[Dict[str, Any]], db: Session) -> List[Memory]:
+        """
+        Upsert extracted memory rows for one user and commit.
+        
+        Rows must have distinct content hashes (see extract_memory_rows).
+        
+        Returns:
+            The created or reinforced memories
+        """
+        if not rows:
+            return []
+        
+        # Memories the user already has are reinforced instead of copied.
+        # SQLite (benchmarks) spells least/greatest as multi-argument min/max
+        if db.get_bind().dialect.name == "sqlite":
+            insert, least, greatest = sqlite_insert, func.min, func.max
+        else:
+            insert, least, greatest = pg_insert, func.least, func.greatest
+        statement = insert(Memory).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=[Memory.user_id, Memory.content_hash],
+            set_={
+                "importance_score": least(
+                    1.0,
+                    greatest(Memory.importance_score, statement.excluded.importance_score)
+                    + settings.MEMORY_REINFORCE_BOOST
+                ),
+                "scored_at": statement.excluded.scored_at
+            }
+        ).returning(Memory)
+        memories = list(db.scalars(statement, execution_options={"populate_existing": True}))
+        snapshots = [MemorySnapshot.from_model(memory) for memory in memories]
+        db.commit()
+        
+        # Re-adding refreshes the scores of reinforced memories
+        memory_index.remove(user_id, [snapshot.id for snapshot in snapshots])
+        memory_index.add(user_id, snapshots)
         
         return memories
     
+    @staticmethod
+    def content_hash(content: str) -> str:
+        """Hash of content with case, punctuation and spacing normalized away."""
+        normalized = _NON_ALPHANUMERIC.sub(" ", content.lower()).strip()
+        return hashlib.md5(normalized.encode("utf-8")).hexdigest()
+    
+    @staticmethod
+    def compact_user_memories(
+        user_id: UUID,
+        db: Session,
+        report: Optional[CompactionReport] = None,
+        now: Optional[datetime] = None
+    ) -> CompactionReport:
+        """
+        Decay, merge and cap one user's memories.
+        
+        Importance halves every MEMORY_DECAY_HALF_LIFE_DAYS since it was
+        last scored. Memories in the same category whose terms overlap by
+        at least MEMORY_MERGE_SIMILARITY (Jaccard) are merged into the most
+        important one, and only the MEMORY_MAX_PER_USER most important
+        memories are kept.
+        
+        Args:
+            user_id: User ID
+            db: Database session
+            report: Report to accumulate into
+            now: Reference time (naive UTC)
+            
+        Returns:
+            The report
+        """
+        report = report or CompactionReport()
+        now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+        half_life = settings.MEMORY_DECAY_HALF_LIFE_DAYS * 86400
+        report.users += 1
+        
+        memories = db.query(Memory).filter(Memory.user_id == user_id).all()
+        
+        # 1. Decay importance by the time since it was last scored
+        for memory in memories:
+            scored_at = (memory.scored_at or memory.created_at).replace(tzinfo=None)
+            elapsed = (now - scored_at).total_seconds()
+            if half_life > 0 and elapsed > 0:
+                score = memory.importance_score if memory.importance_score is not None else 0.5
+                memory.importance_score = score * 0.5 ** (elapsed / half_life)
+                memory.scored_at = now
+                report.decayed += 1
+        
+        # 2. Merge near-duplicates into the most important memory of each group
+        memories.sort(key=lambda memory: (memory.importance_score, memory.created_at), reverse=True)
+        kept: List[Memory] = []
+        kept_terms: List[FrozenSet[str]] = []
+        by_term: Dict[Tuple[str, str], List[int]] = {}
+        removed: List[Memory] = []
+        
+        for memory in memories:
+            terms = frozenset(tokenize(memory.content))
+            candidates: Set[int] = set()
+            for term in terms:
+                candidates.update(by_term.get((memory.category, term), ()))
+            
+            duplicate = any(
+                len(terms & kept_terms[index]) / len(terms | kept_terms[index])
+                >= settings.MEMORY_MERGE_SIMILARITY
+                for index in candidates
+            )
+            if duplicate:
+                removed.append(memory)
+                report.merged += 1
+                continue
+            
+            for term in terms:
+                by_term.setdefault((memory.category, term), []).append(len(kept))
+            kept.append(memory)
+            kept_terms.append(terms)
+        
+        # 3. Enforce the per-user cap, dropping the least important
+        over_cap = kept[settings.MEMORY_MAX_PER_USER:]
+        removed.extend(over_cap)
+        report.capped += len(over_cap)
+        
+        if removed:
+            report.tokens_saved += sum(token_service.count(memory.content) for memory in removed)
+            db.query(Memory).filter(
+                Memory.id.in_([memory.id for memory in removed])
+            ).delete(synchronize_session=False)
+        
+        db.commit()
+        # Other workers rebuild their index of this user on the next refresh
+        cache_service.bump_memory_version(user_id)
+        memory_index.invalidate(user_id)
+        return report
+    
+    @staticmethod
+    def compact_memories(db: Session, user_id: Optional[UUID] = None) -> CompactionReport:
+        """
+        Compact memories for one user, or for every user with memories.
+        
+        Args:
+            db: Database session
+            user_id: Only compact this user (default: all users)
+            
+        Returns:
+            Totals across all compacted users
+        """
+        report = CompactionReport()
+        if user_id is not None:
+            user_ids = [user_id]
+        else:
+            user_ids = [row[0] for row in db.query(Memory.user_id).distinct()]
+        
+        for uid in user_ids:
+            MemoryService.compact_user_memories(uid, db, report=report)
+        return report
+    
+    @staticmethod
+    def process_extraction_job(payload: Dict[str, Any]) -> None:
+        """
+        Background job handler for memory extraction.
+        
+        Args:
+            payload: Job payload with user_id and conversation_text
+        """
+        user_id = UUID(payload["user_id"])
+        db = SessionLocal()
+        try:
+            if MemoryService.should_extract_memories(user_id, db, interval=settings.MEMORY_EXTRACTION_INTERVAL):
+                MemoryService.extract_and_store_memories(user_id, payload["conversation_text"], db)
+                MemoryService.mark_memories_extracted(user_id, db)
+                
+                memory_count = db.query(func.count(Memory.id)).filter(Memory.user_id == user_id).scalar()
+                if memory_count > settings.MEMORY_MAX_PER_USER:
+                    MemoryService.compact_user_memories(user_id, db)
+        finally:
+            db.close()
+    
     @staticmethod
     def get_relevant_memories(
         user_id: UUID,
         db: Session,
-        limit: int = 5
-    ) -> List[Memory]:
+        limit: int = 5,
+        query: Optional[str] = None
+    ) -> List[MemorySnapshot]:
         """
         Get most relevant memories for a user.
         
+        With a query, memories are ranked against it by BM25 over the
+        user's cached index, topped up with the most important memories;
+        without one, the most important memories are returned.
+        
         Args:
             user_id: User ID
             db: Database session
             limit: Maximum number of memories to return
+            query: Text to rank memories against, usually the current message
             
         Returns:
             List of relevant memories
         """
-        return db.query(Memory).filter(
-            Memory.user_id == user_id
-        ).order_by(
-            Memory.importance_score.desc(),
-            Memory.created_at.desc()
-        ).limit(limit).all()
+        return memory_index.get(user_id, db).search(query or "", limit)
     
     @staticmethod
-    def format_memories_for_context(memories: List[Memory]) -> str:
+    def format_memories_for_context(memories: List[MemorySnapshot]) -> str:
         """
         Format memories for inclusion in LLM context.
         
@@ -127,18 +375,17 @@ class MemoryService:
         # Group by category
         by_category = {}
         for memory in memories:
-            if memory.category not in by_category:
-                by_category[memory.category] = []
-            by_category[memory.category].append(memory.content)
+            by_category.setdefault(memory.category, []).append(memory.content)
         
-        formatted = "\n[LONG-TERM MEMORIES]\n"
+        lines = ["\n[LONG-TERM MEMORIES]"]
         for category, contents in by_category.items():
-            formatted += f"{category.replace('_', ' ').title()}:\n"
-            for content in contents:
-                formatted += f"- {content}\n"
+            lines.append(f"{category.replace('_', ' ').title()}:")
+            lines.extend(f"- {content}" for content in contents)
         
-        return formatted
+        return "\n".join(lines) + "\n"
 
 
 # Global memory service instance
 memory_service = MemoryService()
+
+job_queue.register("extract_memories", memory_service.process_extraction_job)
@@ -0,0 +1,198 @@
+"""
+Message service for storing chat messages and maintaining per-user counters.
+"""
+import base64
+from datetime import datetime
+from sqlalchemy import func, tuple_, update
+from sqlalchemy.orm import Session
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+from ..models import Message, MessageArchive, User
+from .archive_service import archive_service
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+
+
+class MessageService:
+    """Service for writing messages together with the user's counters."""
+
+    @staticmethod
+    def counter_updates(user_messages: int, onboarding_messages: int) -> Dict:
+        """
+        Build the UPDATE values that add to a user's counters.
+
+        Increments are expressed relative to the stored value, so concurrent
+        writers never lose each other's updates.
+        """
+        # Counter writes are not profile edits; keep updated_at unchanged
+        values = {"updated_at": User.updated_at}
+        if user_messages:
+            values["message_count"] = User.message_count + user_messages
+        if onboarding_messages:
+            values["onboarding_message_count"] = User.onboarding_message_count + onboarding_messages
+        return values
+
+    @staticmethod
+    def store_message(
+        db: Session,
+        user_id: UUID,
+        role: str,
+        content: str,
+        is_onboarding: bool = False,
+        token_count: int = 0
+    ) -> Message:
+        """
+        Store a message and update the user's counters in one transaction.
+
+        Args:
+            db: Database session
+            user_id: User ID
+            role: 'user' or 'assistant'
+            content: Message content
+            is_onboarding: Whether this is part of onboarding
+            token_count: Token count of the content
+
+        Returns:
+            The stored message
+        """
+        message = Message(
+            user_id=user_id,
+            role=role,
+            content=content,
+            is_onboarding=is_onboarding,
+            token_count=token_count
+        )
+        db.add(message)
+
+        values = MessageService.counter_updates(
+            user_messages=1 if role == "user" else 0,
+            onboarding_messages=1 if is_onboarding else 0
+        )
+        if len(values) > 1:
+            db.execute(
+                update(User).where(User.id == user_id).values(**values),
+                execution_options={"synchronize_session": False}
+            )
+
+        db.commit()
+        db.refresh(message)
+        return message
+
+    @staticmethod
+    def encode_cursor(message: Message) -> str:
+        """Opaque keyset cursor pointing just before a message."""
+        raw = f"{message.created_at.isoformat()}|{message.id}"
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+        """
+        Decode a cursor from encode_cursor.
+
+        Raises:
+            InvalidCursorError: If the cursor is malformed
+        """
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            created_at, message_id = base64.urlsafe_b64decode(padded).decode().split("|")
+            return datetime.fromisoformat(created_at), UUID(message_id)
+        except Exception:
+            raise InvalidCursorError(f"Invalid cursor: {cursor}")
+
+    @staticmethod
+    def get_page(
+        db: Session,
+        user_id: UUID,
+        before: Optional[Tuple[datetime, UUID]] = None,
+        limit: int = 50
+    ) -> Tuple[List[Message], bool]:
+        """
+        Get a page of a user's messages, newest first.
+
+        Keyset pagination on (created_at, id), served by the composite
+        (user_id, created_at DESC, id DESC) index as one range scan. Messages
+        sharing a timestamp are ordered by id, so none are skipped or
+        repeated across pages. Once the live table runs out, the page is
+        filled from the user's archived partitions.
+
+        Args:
+            db: Database session
+            user_id: User ID
+            before: Decoded cursor; only messages strictly before it are returned
+            limit: Page size
+
+        Returns:
+            (messages newest first, whether older messages exist)
+        """
+        query = db.query(Message).filter(Message.user_id == user_id)
+        if before is not None:
+            query = query.filter(tuple_(Message.created_at, Message.id) < tuple_(*before))
+
+        messages = query.order_by(
+            Message.created_at.desc(),
+            Message.id.desc()
+        ).limit(limit + 1).all()
+
+        if len(messages) <= limit:
+            oldest = (messages[-1].created_at, messages[-1].id) if messages else before
+            messages += archive_service.get_page(db, user_id, before=oldest, limit=limit + 1 - len(messages))
+
+        has_more = len(messages) > limit
+        return messages[:limit], has_more
+
+    @staticmethod
+    def reconcile_counters(db: Session, user_id: Optional[UUID] = None) -> int:
+        """
+        Recompute counters from the messages table and the archive index.
+
+        Repairs drift after manual data fixes or failed writes. The
+        extraction mark is clamped so it never exceeds the message count.
+
+        Args:
+            db: Database session
+            user_id: Only reconcile this user (default: all users)
+
+        Returns:
+            Number of users updated
+        """
+        user_count = (
+            db.query(func.count(Message.id))
+            .filter(Message.user_id == User.id, Message.role == "user")
+            .scalar_subquery()
+        )
+        onboarding_count = (
+            db.query(func.count(Message.id))
+            .filter(Message.user_id == User.id, Message.is_onboarding == True)
+            .scalar_subquery()
+        )
+        archived_user_count, archived_onboarding_count = (
+            db.query(func.coalesce(func.sum(column), 0))
+            .filter(MessageArchive.user_id == User.id)
+            .scalar_subquery()
+            for column in (MessageArchive.user_message_count, MessageArchive.onboarding_message_count)
+        )
+
+        statement = update(User).values(
+            message_count=user_count + archived_user_count,
+            onboarding_message_count=onboarding_count + archived_onboarding_count,
+            updated_at=User.updated_at
+        )
+        if user_id is not None:
+            statement = statement.where(User.id == user_id)
+        result = db.execute(statement, execution_options={"synchronize_session": False})
+
+        clamp = update(User).where(
+            User.last_extraction_count > User.message_count
+        ).values(last_extraction_count=User.message_count, updated_at=User.updated_at)
+        if user_id is not None:
+            clamp = clamp.where(User.id == user_id)
+        db.execute(clamp, execution_options={"synchronize_session": False})
+
+        db.commit()
+        return result.rowcount
+
+
+# Global message service instance
+message_service = MessageService()
@@ -0,0 +1,132 @@
+"""
+Per-request model routing.
+
+Routing rules are declared in settings.LLM_ROUTES as an ordered list; the
+first rule whose conditions match a turn picks the candidate models and
+the token limit. Candidates are listed cheapest first, and the cheapest
+one whose observed median latency fits the rule's latency budget is used.
+
+Example rule:
+    {"name": "triage", "when": {"min_protocols": 2},
+     "models": ["openai/gpt-4o-mini", "openai/gpt-4o"],
+     "max_tokens": 600, "latency_budget": 4.0}
+
+Conditions (all optional, all must hold):
+    onboarding: the turn is / is not part of onboarding
+    protocols: any of these protocol names matched
+    min_protocols: at least this many protocols matched
+    min_context_tokens / max_context_tokens: bounds on prompt size
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+from ..config import settings
+from .llm_resilience import llm_resilience
+from .metrics import metrics
+from .protocol_service import ProtocolSnapshot
+from .token_service import token_service
+
+
+CONDITIONS = {"onboarding", "protocols", "min_protocols", "min_context_tokens", "max_context_tokens"}
+
+
+@dataclass(frozen=True)
+class Route:
+    """Model and token limit chosen for one completion."""
+    name: str
+    model: str
+    max_tokens: int
+
+
+class ModelRouter:
+    """Picks a model and token limit per request from configured rules."""
+
+    def __init__(self, rules: Optional[List[Dict[str, Any]]] = None):
+        self.rules = settings.LLM_ROUTES if rules is None else rules
+        for rule in self.rules:
+            unknown = set(rule.get("when", {})) - CONDITIONS
+            if unknown:
+                raise ValueError(f"Unknown conditions in route {rule.get('name')!r}: {sorted(unknown)}")
+
+        self.routed = metrics.counter(
+            "llm_routes_total",
+            "Completions by routing rule and chosen model",
+            ["route", "model"]
+        )
+
+    @staticmethod
+    def _matches(
+        when: Dict[str, Any],
+        is_onboarding: bool,
+        protocol_names: List[str],
+        context_tokens: int
+    ) -> bool:
+        if "onboarding" in when and bool(when["onboarding"]) != is_onboarding:
+            return False
+        if "protocols" in when and not set(when["protocols"]) & set(protocol_names):
+            return False
+        if len(protocol_names) < when.get("min_protocols", 0):
+            return False
+        if context_tokens < when.get("min_context_tokens", 0):
+            return False
+        if "max_context_tokens" in when and context_tokens > when["max_context_tokens"]:
+            return False
+        return True
+
+    @staticmethod
+    def choose_model(candidates: List[str], latency_budget: Optional[float] = None) -> str:
+        """
+        Cheapest healthy candidate within the latency budget.
+
+        Candidates are in cost order. Models whose circuit is open are
+        skipped; models without latency samples yet count as within budget
+        so they get measured. If none fits, the fastest healthy one is used.
+        """
+        healthy = [model for model in candidates if not llm_resilience.breaker(model).is_open()]
+        if not healthy:
+            return candidates[0]
+
+        medians = {model: llm_resilience.latency(model).percentile(50) for model in healthy}
+        for model in healthy:
+            if latency_budget is None or medians[model] is None or medians[model] <= latency_budget:
+                return model
+        return min(healthy, key=lambda model: medians[model])
+
+    def route(
+        self,
+        messages: List[Dict[str, str]],
+        is_onboarding: bool = False,
+        protocols: Optional[List[ProtocolSnapshot]] = None
+    ) -> Route:
+        """
+        Route a completion.
+
+        Args:
+            messages: Context from build_context
+            is_onboarding: Whether this is part of onboarding
+            protocols: Protocols matched for the turn
+
+        Returns:
+            The first matching rule's choice, or AI_MODEL / AI_MAX_TOKENS
+        """
+        protocol_names = [protocol.name for protocol in protocols or []]
+        context_tokens = sum(token_service.count(message["content"]) for message in messages)
+
+        route = Route("default", settings.AI_MODEL, settings.AI_MAX_TOKENS)
+        for rule in self.rules:
+            if self._matches(rule.get("when", {}), is_onboarding, protocol_names, context_tokens):
+                route = Route(
+                    name=rule.get("name", "unnamed"),
+                    model=self.choose_model(
+                        rule.get("models") or [settings.AI_MODEL],
+                        rule.get("latency_budget")
+                    ),
+                    max_tokens=rule.get("max_tokens", settings.AI_MAX_TOKENS)
+                )
+                break
+
+        self.routed.inc(route=route.name, model=route.model)
+        return route
+
+
+# Global model router instance
+model_router = ModelRouter()
@@ -0,0 +1,136 @@
+"""
+Monthly range partitions of the messages table (PostgreSQL).
+
+Partitions are named messages_yYYYYmMM and cover one calendar month of
+created_at. A DEFAULT partition catches rows for months without one; when
+such a month's partition is created later, its rows are moved out of the
+default partition first. Migration 0006 sets up the partitioned table; the
+archive job creates partitions MESSAGE_PARTITIONS_AHEAD months ahead, and
+the history import creates the ones its timestamps need.
+
+On other databases (SQLite in the benchmarks) the table is not
+partitioned and everything here is a no-op.
+"""
+import re
+from datetime import date, datetime, timezone
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from ..config import settings
+from ..models import Message
+
+
+PARENT = Message.__tablename__
+DEFAULT_PARTITION = f"{PARENT}_default"
+_PARTITION_NAME = re.compile(rf"^{PARENT}_y(\d{{4}})m(\d{{2}})$")
+
+
+def month_start(value: datetime) -> date:
+    """First day of value's month."""
+    return date(value.year, value.month, 1)
+
+
+def next_month(month: date) -> date:
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT}_y{month.year:04d}m{month.month:02d}"
+
+
+class PartitionService:
+    """Creates and lists the monthly partitions of messages."""
+
+    def __init__(self):
+        # Per process: whether messages is partitioned, and partitions known to exist
+        self._partitioned: Optional[bool] = None
+        self._known: Set[date] = set()
+
+    def is_partitioned(self, db: Session) -> bool:
+        """Whether messages is a partitioned table (checked once per process)."""
+        if self._partitioned is None:
+            if db.get_bind().dialect.name != "postgresql":
+                self._partitioned = False
+            else:
+                self._partitioned = db.execute(text(
+                    "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table pt "
+                    "JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = :parent)"
+                ), {"parent": PARENT}).scalar()
+        return self._partitioned
+
+    def list_partitions(self, db: Session) -> Tuple[Dict[date, str], bool]:
+        """
+        Current partitions.
+
+        Returns:
+            (monthly partition names keyed by month, whether the default
+            partition exists)
+        """
+        names = db.execute(text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = :parent"
+        ), {"parent": PARENT}).scalars().all()
+
+        months = {}
+        for name in names:
+            match = _PARTITION_NAME.match(name)
+            if match:
+                months[date(int(match.group(1)), int(match.group(2)), 1)] = name
+        self._known = set(months)
+        return months, DEFAULT_PARTITION in names
+
+    def ensure_partitions(self, db: Session, months: Iterable[date]) -> List[str]:
+        """
+        Create missing partitions for the given months and commit.
+
+        Each partition is built as a plain table, filled with that month's
+        rows from the default partition, then attached (which only takes a
+        SHARE UPDATE EXCLUSIVE lock on messages, so reads and writes go on).
+
+        Returns:
+            Names of the partitions created
+        """
+        if not self.is_partitioned(db):
+            return []
+        months = set(months)
+        if months <= self._known:
+            return []
+
+        existing, has_default = self.list_partitions(db)
+        created = []
+        for month in sorted(months - set(existing)):
+            name, upper = partition_name(month), next_month(month)
+            db.execute(text(f'CREATE TABLE "{name}" (LIKE {PARENT} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'))
+            if has_default:
+                db.execute(text(
+                    f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+                    f"WHERE created_at >= :lower AND created_at < :upper RETURNING *) "
+                    f'INSERT INTO "{name}" SELECT * FROM moved'
+                ), {"lower": month, "upper": upper})
+            db.execute(text(
+                f'ALTER TABLE {PARENT} ATTACH PARTITION "{name}" '
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')"
+            ))
+            db.commit()
+            self._known.add(month)
+            created.append(name)
+        return created
+
+    def ensure_upcoming(self, db: Session, today: Optional[date] = None) -> List[str]:
+        """Create partitions for this month and the next MESSAGE_PARTITIONS_AHEAD."""
+        month = month_start(today or datetime.now(timezone.utc).date())
+        months = []
+        for _ in range(settings.MESSAGE_PARTITIONS_AHEAD + 1):
+            months.append(month)
+            month = next_month(month)
+        return self.ensure_partitions(db, months)
+
+    def forget(self, month: date) -> None:
+        """Drop a month from the known set after its partition is removed."""
+        self._known.discard(month)
+
+
+# Global partition service instance
+partition_service = PartitionService()
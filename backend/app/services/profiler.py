@@ -0,0 +1,265 @@
+"""
+Sampling profiler for slow requests.
+
+A background thread samples every in-flight request at PROFILE_INTERVAL.
+Each sample records where the request was: the event loop thread's stack
+when the request's task is the one running, otherwise the chain of
+coroutines it is suspended in (ending at what it awaits). Samples taken
+while the request waits also record what the event loop was busy running
+instead, which exposes blocking code in other requests.
+
+Sampling is cheap enough to run on every request while profiling is
+enabled; a profile is only written to disk when the request was picked by
+PROFILE_SAMPLE_RATE or took longer than PROFILE_SLOW_THRESHOLD. Profiles
+are JSON files with folded stacks (flamegraph format) in PROFILE_DIR, which
+is capped at PROFILE_MAX_FILES.
+"""
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from types import CodeType, FrameType
+from typing import Any, Dict, List, Optional, Tuple
+from ..config import settings
+from .metrics import metrics
+
+
+profiles_written = metrics.counter(
+    "profiles_written_total",
+    "Request profiles written to disk, by why they were kept",
+    ["reason"]
+)
+
+
+# Our code is labelled relative to the backend directory ("app/..."),
+# libraries relative to site-packages
+_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_labels: Dict[CodeType, str] = {}
+
+
+def _label(code: CodeType) -> str:
+    """Short "path:function" name for a code object, cached."""
+    label = _labels.get(code)
+    if label is None:
+        path = code.co_filename
+        marker = "site-packages" + os.sep
+        if marker in path:
+            path = path.split(marker, 1)[1]
+        elif path.startswith(_BACKEND_DIR + os.sep):
+            path = os.path.relpath(path, _BACKEND_DIR)
+        else:
+            path = os.path.basename(path)
+        label = _labels[code] = f"{path}:{getattr(code, 'co_qualname', code.co_name)}"
+    return label
+
+
+_ASYNCIO_DIR = os.path.dirname(asyncio.__file__)
+
+
+def _trim(frames: List[FrameType], root: Optional[CodeType]) -> List[FrameType]:
+    """
+    Drop frames outside the request: everything up to the root frame (the
+    profiling middleware) or, for other tasks, up to the loop's task step.
+    """
+    start = 0
+    for index, frame in enumerate(frames):
+        code = frame.f_code
+        if code is root:
+            return frames[index + 1:]
+        if code.co_name == "_run" and code.co_filename.startswith(_ASYNCIO_DIR):
+            start = index + 1
+    return frames[start:]
+
+
+def _thread_stack(frame: Optional[FrameType]) -> List[FrameType]:
+    """Frames of a thread's stack, outermost first."""
+    frames = []
+    while frame is not None:
+        frames.append(frame)
+        frame = frame.f_back
+    frames.reverse()
+    return frames
+
+
+def _await_chain(coro: Any) -> Tuple[List[FrameType], Optional[str]]:
+    """
+    Frames of a suspended task's coroutine chain, outermost first, and the
+    type of the object it is ultimately waiting on.
+    """
+    frames = []
+    while coro is not None:
+        frame = (
+            getattr(coro, "cr_frame", None)
+            or getattr(coro, "gi_frame", None)
+            or getattr(coro, "ag_frame", None)
+        )
+        if frame is None:
+            # A Future's awaitable is its FutureIter
+            name = type(coro).__name__
+            return frames, "Future" if name == "FutureIter" else name
+        frames.append(frame)
+        coro = (
+            getattr(coro, "cr_await", None)
+            or getattr(coro, "gi_yieldfrom", None)
+            or getattr(coro, "ag_await", None)
+        )
+    return frames, None
+
+
+@dataclass
+class RequestProfile:
+    """Samples collected for one request."""
+    task: asyncio.Task
+    root: Optional[CodeType]
+    method: str
+    path: str
+    sampled: bool
+    started: float = field(default_factory=time.perf_counter)
+    started_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    status: Optional[int] = None
+    samples: int = 0
+    stacks: Counter = field(default_factory=Counter)
+    loop_stacks: Counter = field(default_factory=Counter)
+
+    def record(self, frames: List[FrameType], leaf: Optional[str] = None, loop: bool = False) -> None:
+        labels = [_label(frame.f_code) for frame in _trim(frames, self.root)]
+        if leaf:
+            labels.append(f"<{leaf}>")
+        if labels:
+            (self.loop_stacks if loop else self.stacks)[";".join(labels)] += 1
+
+
+class StackSampler:
+    """Background thread sampling the requests registered with it."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.loop_thread: Optional[int] = None
+        self._active: Dict[int, RequestProfile] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, profile: RequestProfile) -> None:
+        """Begin sampling a request (call from the event loop thread)."""
+        if self._thread is None:
+            self.loop = asyncio.get_running_loop()
+            self.loop_thread = threading.get_ident()
+            self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+            self._thread.start()
+        with self._lock:
+            self._active[id(profile)] = profile
+        self._wake.set()
+
+    def stop(self, profile: RequestProfile) -> None:
+        with self._lock:
+            self._active.pop(id(profile), None)
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait()
+            time.sleep(self.interval)
+            with self._lock:
+                profiles = list(self._active.values())
+                if not profiles:
+                    self._wake.clear()
+                    continue
+            try:
+                self._sample(profiles)
+            except Exception as e:
+                # Frames can change under us; a lost sample is harmless
+                print(f"Profiler sample error: {e}")
+
+    def _sample(self, profiles: List[RequestProfile]) -> None:
+        running = asyncio.current_task(self.loop)
+        loop_frames = _thread_stack(sys._current_frames().get(self.loop_thread))
+        # No current task: the loop is idle in select or running plain callbacks
+        busy = running is not None
+
+        for profile in profiles:
+            profile.samples += 1
+            if profile.task is running:
+                profile.record(loop_frames)
+                continue
+            if profile.task.done():
+                continue
+            frames, leaf = _await_chain(profile.task.get_coro())
+            profile.record(frames, leaf)
+            if busy:
+                profile.record(loop_frames, loop=True)
+
+
+class ProfileStore:
+    """Rotating directory of profile files."""
+
+    def __init__(self, directory: str, max_files: int):
+        self.directory = directory
+        self.max_files = max_files
+
+    def write(self, profile: RequestProfile, duration: float, reason: str) -> str:
+        """Write a profile and delete the oldest beyond max_files."""
+        os.makedirs(self.directory, exist_ok=True)
+        profile_id = f"{profile.started_at:%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+        data = {
+            "id": profile_id,
+            "reason": reason,
+            "method": profile.method,
+            "path": profile.path,
+            "status": profile.status,
+            "started_at": profile.started_at.isoformat(),
+            "duration_ms": round(duration * 1000, 1),
+            "interval_ms": settings.PROFILE_INTERVAL * 1000,
+            "samples": profile.samples,
+            "stacks": dict(profile.stacks.most_common()),
+            "loop_stacks": dict(profile.loop_stacks.most_common())
+        }
+        path = os.path.join(self.directory, f"{profile_id}.json")
+        with open(path, "w") as f:
+            json.dump(data, f, indent=1)
+
+        self.rotate()
+        return path
+
+    def rotate(self) -> None:
+        files = self.list_files()
+        for name in files[:max(0, len(files) - self.max_files)]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def list_files(self) -> List[str]:
+        """Profile file names, oldest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name for name in os.listdir(self.directory) if name.endswith(".json"))
+
+    def load_all(self) -> List[Dict[str, Any]]:
+        profiles = []
+        for name in self.list_files():
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return profiles
+
+    def load(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        """Load a profile by id or unique id prefix."""
+        matches = [name for name in self.list_files() if name.startswith(profile_id)]
+        if len(matches) != 1:
+            return None
+        with open(os.path.join(self.directory, matches[0])) as f:
+            return json.load(f)
+
+
+# Global profiler instances
+stack_sampler = StackSampler(settings.PROFILE_INTERVAL)
+profile_store = ProfileStore(settings.PROFILE_DIR, settings.PROFILE_MAX_FILES)
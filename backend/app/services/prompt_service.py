@@ -0,0 +1,103 @@
+"""
+Prompt assembly for LLM calls.
+
+Static fragments (the system prompt and section headers) are built once at
+import time together with their token counts. Protocol blocks are rendered
+once per protocol version, and every section is assembled with a single
+join, so per-turn assembly only concatenates precomputed pieces.
+"""
+from typing import List, NamedTuple
+from .memory_index import MemorySnapshot
+from .memory_service import memory_service
+from .protocol_service import ProtocolSnapshot, protocol_service
+from .token_service import token_service
+
+
+SYSTEM_PROMPT = """You are Disha, India's first AI health coach. You are warm, empathetic, and professional - like a caring friend on WhatsApp who happens to be a health expert.
+
+Your role is to:
+- Provide personalized health guidance based on user context and history
+- Ask thoughtful clarifying questions to understand their situation better
+- Follow medical protocols when applicable for common health issues
+- Be conversational, supportive, and natural - NOT clinical or robotic
+- Remember user details and reference them naturally in conversation
+- Keep responses concise (2-4 sentences typically) like a real chat conversation
+
+IMPORTANT GUIDELINES:
+- NEVER provide emergency medical advice - always suggest seeing a doctor for serious/emergency situations
+- Be culturally sensitive and aware of Indian context
+- Use simple, easy-to-understand language
+- Show empathy and emotional support
+- Focus on preventive care and healthy lifestyle guidance
+- Respect user privacy and confidentiality
+- Do not provide any medical advice
+- Do not provide outside information except for Dishai's website
+- Do not provide any contact information
+- Do not write, say or suggest any prescription
+- Do not write, say or suggest any medical test
+- Do not write, say or talk about AI ,code and outside information 
+- Do not write, say or talk about any other health coach or AI health coach
+- Never write , share or provide external information except for Dishai's website and related information
+
+Remember: You're a supportive health coach, not a replacement for professional medical care."""
+
+
+class PromptFragment(NamedTuple):
+    """A piece of prompt text with its token count."""
+    text: str
+    tokens: int
+
+
+EMPTY_FRAGMENT = PromptFragment("", 0)
+
+
+class PromptService:
+    """Builds the system message from precomputed fragments."""
+    
+    def __init__(self):
+        self.system = self.fragment(SYSTEM_PROMPT)
+        self.protocols_header = self.fragment(protocol_service.PROTOCOLS_HEADER)
+    
+    @staticmethod
+    def fragment(text: str) -> PromptFragment:
+        """Wrap text with its token count."""
+        return PromptFragment(text, token_service.count(text))
+    
+    def memories_section(self, memories: List[MemorySnapshot]) -> PromptFragment:
+        """Render the long-term memory section."""
+        text = memory_service.format_memories_for_context(memories)
+        return self.fragment(text) if text else EMPTY_FRAGMENT
+    
+    def protocols_section(self, protocols: List[ProtocolSnapshot]) -> PromptFragment:
+        """
+        Render the protocol section from cached per-protocol blocks.
+        
+        Blocks are cached on the matcher's protocol snapshots, which are
+        replaced whenever the protocol version changes.
+        """
+        if not protocols:
+            return EMPTY_FRAGMENT
+        
+        blocks = [protocol.prompt_block for protocol in protocols]
+        return PromptFragment(
+            "".join([self.protocols_header.text] + [block.text for block in blocks]),
+            self.protocols_header.tokens + sum(block.tokens for block in blocks)
+        )
+    
+    def system_message(
+        self,
+        memory_section: PromptFragment,
+        protocol_section: PromptFragment
+    ) -> PromptFragment:
+        """Combine the system prompt with the per-turn context sections."""
+        sections = [self.system] + [
+            section for section in (memory_section, protocol_section) if section.text
+        ]
+        return PromptFragment(
+            "\n\n".join(section.text for section in sections),
+            sum(section.tokens for section in sections)
+        )
+
+
+# Global prompt service instance
+prompt_service = PromptService()
@@ -1,75 +1,221 @@
 """
 Protocol matching service for medical and operational protocols.
 """
+import re
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from functools import cached_property
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Set
+from ..config import settings
 from ..models import Protocol
 from .cache_service import cache_service
+from .token_service import token_service
+
+
+@dataclass
+class ProtocolSnapshot:
+    """Detached, read-only copy of a protocol held by the in-process matcher."""
+    id: str
+    name: str
+    description: str
+    instructions: Dict[str, Any] = field(default_factory=dict)
+    keywords: List[str] = field(default_factory=list)
+    response_cacheable: bool = False
+    
+    @cached_property
+    def prompt_block(self):
+        """Rendered context block and its token count, computed once per snapshot."""
+        from .prompt_service import PromptFragment
+        text = ProtocolService.format_protocol_block(self)
+        return PromptFragment(text, token_service.count(text))
+    
+    @classmethod
+    def from_model(cls, protocol: Protocol) -> "ProtocolSnapshot":
+        return cls(
+            id=str(protocol.id),
+            name=protocol.name,
+            description=protocol.description,
+            instructions=protocol.instructions or {},
+            keywords=list(protocol.keywords or []),
+            response_cacheable=bool(protocol.response_cacheable)
+        )
+
+
+class ProtocolMatcher:
+    """
+    Keyword index over all protocols, compiled into a single regex.
+    
+    Every keyword becomes one branch of a lookahead alternation anchored at
+    a word start, so one pass over the message finds the keywords starting
+    at each position. Keywords are tried longest first; shorter keywords
+    that are prefixes of the one found are credited through a precomputed
+    owner table, so overlapping keywords still match all their protocols.
+    """
+    
+    def __init__(self, protocols: List[ProtocolSnapshot], version: Optional[str] = None):
+        self.protocols = protocols
+        self.version = version
+        
+        # keyword -> indices of protocols that declare it
+        declared: Dict[str, Set[int]] = {}
+        for index, protocol in enumerate(protocols):
+            for keyword in protocol.keywords:
+                keyword = keyword.strip().lower()
+                if keyword:
+                    declared.setdefault(keyword, set()).add(index)
+        
+        # keyword -> protocols matched when it is found, including those of
+        # shorter keywords that are prefixes of it
+        self._owners: Dict[str, Set[int]] = {}
+        for keyword in declared:
+            owners = set()
+            for end in range(1, len(keyword) + 1):
+                owners |= declared.get(keyword[:end], set())
+            self._owners[keyword] = owners
+        
+        self._pattern = None
+        if declared:
+            alternation = "|".join(
+                re.escape(keyword)
+                for keyword in sorted(declared, key=len, reverse=True)
+            )
+            self._pattern = re.compile(rf"\b(?=({alternation}))")
+    
+    def match(self, message: str) -> List[ProtocolSnapshot]:
+        """Return protocols with a keyword in the message, in declaration order."""
+        if self._pattern is None:
+            return []
+        
+        found: Set[int] = set()
+        for match in self._pattern.finditer(message.lower()):
+            found |= self._owners[match.group(1)]
+            if len(found) == len(self.protocols):
+                break
+        
+        return [self.protocols[index] for index in sorted(found)]
+
+
+# Sentinel for "version stamp not prefetched by the caller"
+_NOT_FETCHED = object()
 
 
 class ProtocolService:
     """Service for matching and retrieving relevant protocols."""
     
+    PROTOCOLS_HEADER = "\n[PROTOCOLS]\n"
+    _matcher: Optional[ProtocolMatcher] = None
+    _checked_at: float = 0.0
+    _lock = threading.Lock()
+    
     @staticmethod
     def get_all_protocols(db: Session) -> List[Protocol]:
         """Get all protocols from database."""
         return db.query(Protocol).all()
     
-    @staticmethod
-    def get_protocols_with_cache(db: Session) -> List[Protocol]:
-        """Get protocols with caching for better performance."""
-        # Try cache first
-        cached = cache_service.get_cached_protocols()
-        if cached:
-            # Convert cached data back to protocol objects
-            return [Protocol(**p) for p in cached]
+    @classmethod
+    def get_matcher(cls, db: Session, version: Any = _NOT_FETCHED) -> ProtocolMatcher:
+        """
+        Get this worker's compiled matcher, rebuilding it if stale.
         
-        # Fetch from database
-        protocols = ProtocolService.get_all_protocols(db)
+        The protocol version stamp is checked at most once every
+        PROTOCOL_VERSION_CHECK_INTERVAL seconds, unless the caller already
+        fetched it; the matcher is rebuilt only when the stamp has changed,
+        from the protocol set cached for that version (filled from the
+        database once).
         
-        # Cache for future use
-        cache_data = [
-            {
-                "id": str(p.id),
-                "name": p.name,
-                "description": p.description,
-                "instructions": p.instructions,
-                "keywords": p.keywords
-            }
-            for p in protocols
-        ]
-        cache_service.cache_protocols(cache_data)
+        Args:
+            db: Database session
+            version: Version stamp prefetched by the caller, if any
+        """
+        now = time.monotonic()
+        matcher = cls._matcher
+        if matcher is not None:
+            if version is not _NOT_FETCHED:
+                if matcher.version == version:
+                    return matcher
+            elif now - cls._checked_at < settings.PROTOCOL_VERSION_CHECK_INTERVAL:
+                return matcher
         
-        return protocols
+        with cls._lock:
+            if version is _NOT_FETCHED:
+                if cls._matcher is not None and now - cls._checked_at < settings.PROTOCOL_VERSION_CHECK_INTERVAL:
+                    return cls._matcher
+                version = cache_service.get_protocol_version()
+            if cls._matcher is None or cls._matcher.version != version:
+                # Keyed by version so no tier can serve a previous protocol set
+                cached = cache_service.get_or_load(
+                    f"protocols:{version or 'unversioned'}",
+                    lambda: [
+                        asdict(ProtocolSnapshot.from_model(p))
+                        for p in ProtocolService.get_all_protocols(db)
+                    ],
+                    expiry=86400,  # 24 hours
+                    local=True
+                )
+                snapshots = [ProtocolSnapshot(**p) for p in cached]
+                cls._matcher = ProtocolMatcher(snapshots, version)
+            cls._checked_at = now
+            return cls._matcher
     
-    @staticmethod
-    def match_protocols(message: str, db: Session) -> List[Protocol]:
+    @classmethod
+    def invalidate(cls) -> None:
+        """Drop this worker's matcher and bump the shared version stamp."""
+        cache_service.bump_protocol_version()
+        cls._matcher = None
+    
+    @classmethod
+    def match_protocols(
+        cls,
+        message: str,
+        db: Session,
+        version: Any = _NOT_FETCHED
+    ) -> List[ProtocolSnapshot]:
         """
         Match protocols based on keywords in the message.
         
+        Keywords match at the start of a word, so "vomit" matches
+        "vomiting" but "ache" does not match "headache".
+        
         Args:
             message: User's message content
             db: Database session
+            version: Protocol version stamp prefetched by the caller, if any
             
         Returns:
             List of matched protocols
         """
-        protocols = ProtocolService.get_protocols_with_cache(db)
-        matched = []
+        return cls.get_matcher(db, version).match(message)
+    
+    @staticmethod
+    def format_protocol_block(protocol: ProtocolSnapshot) -> str:
+        """
+        Format a single protocol for inclusion in LLM context.
         
-        message_lower = message.lower()
+        Args:
+            protocol: Protocol to format
+            
+        Returns:
+            Formatted block for the protocol section
+        """
+        lines = [f"\n**{protocol.name}**", protocol.description]
         
-        for protocol in protocols:
-            # Check if any keyword matches
-            for keyword in protocol.keywords:
-                if keyword.lower() in message_lower:
-                    matched.append(protocol)
-                    break  # Don't add the same protocol multiple times
+        if isinstance(protocol.instructions, dict):
+            if "steps" in protocol.instructions:
+                lines.append("Steps:")
+                lines.extend(
+                    f"{i}. {step}"
+                    for i, step in enumerate(protocol.instructions["steps"], 1)
+                )
+            
+            if "warnings" in protocol.instructions:
+                lines.append(f"\nWarnings: {', '.join(protocol.instructions['warnings'])}")
         
-        return matched
+        return "\n".join(lines) + "\n\n"
     
     @staticmethod
-    def format_protocols_for_context(protocols: List[Protocol]) -> str:
+    def format_protocols_for_context(protocols: List[ProtocolSnapshot]) -> str:
         """
         Format matched protocols for inclusion in LLM context.
         
@@ -82,23 +228,9 @@ class ProtocolService:
         if not protocols:
             return ""
         
-        formatted = "\n[PROTOCOLS]\n"
-        for protocol in protocols:
-            formatted += f"\n**{protocol.name}**\n"
-            formatted += f"{protocol.description}\n"
-            
-            if isinstance(protocol.instructions, dict):
-                if "steps" in protocol.instructions:
-                    formatted += "Steps:\n"
-                    for i, step in enumerate(protocol.instructions["steps"], 1):
-                        formatted += f"{i}. {step}\n"
-                
-                if "warnings" in protocol.instructions:
-                    formatted += f"\nWarnings: {', '.join(protocol.instructions['warnings'])}\n"
-            
-            formatted += "\n"
-        
-        return formatted
+        return ProtocolService.PROTOCOLS_HEADER + "".join(
+            ProtocolService.format_protocol_block(protocol) for protocol in protocols
+        )
 
 
 # Global protocol service instance
@@ -0,0 +1,99 @@
+"""
+Response cache for deterministic, protocol-driven answers.
+
+FAQ-style questions answered entirely by opted-in protocols (for example
+billing and refund queries) get essentially the same reply every time, so
+the reply is cached by normalized message and matched protocol set and
+served without an LLM call.
+"""
+import hashlib
+import re
+from typing import List, Optional
+from ..config import settings
+from .cache_service import cache_service
+from .metrics import metrics
+from .protocol_service import ProtocolSnapshot
+
+
+_NON_ALPHANUMERIC = re.compile(r"[^a-z0-9]+")
+
+
+class ResponseCache:
+    """Caches replies for messages matched only by cacheable protocols."""
+
+    def __init__(self):
+        self.lookups = metrics.counter(
+            "response_cache_lookups_total",
+            "Response cache lookups by result (hit, miss, ineligible)",
+            ["result"]
+        )
+        self.stores = metrics.counter(
+            "response_cache_stores_total",
+            "Responses written to the response cache"
+        )
+
+    @staticmethod
+    def normalize(message: str) -> str:
+        """Lowercase and reduce punctuation and spacing to single spaces."""
+        return _NON_ALPHANUMERIC.sub(" ", message.lower()).strip()
+
+    def key_for(
+        self,
+        message: str,
+        protocols: List[ProtocolSnapshot],
+        version: Optional[str],
+        is_onboarding: bool = False
+    ) -> Optional[str]:
+        """
+        Cache key for a message, or None if its reply must not be cached.
+
+        A reply is eligible only when the cache is enabled, the message is
+        a short non-onboarding question, and every matched protocol has
+        opted in, so a message that also matches e.g. an emergency protocol
+        always reaches the model. The protocol version is part of the key,
+        so editing protocols retires earlier replies.
+        """
+        normalized = self.normalize(message)
+        if (
+            not settings.RESPONSE_CACHE_ENABLED
+            or is_onboarding
+            or not protocols
+            or not normalized
+            or len(normalized) > settings.RESPONSE_CACHE_MAX_MESSAGE_CHARS
+            or not all(protocol.response_cacheable for protocol in protocols)
+        ):
+            self.lookups.inc(result="ineligible")
+            return None
+
+        protocol_ids = ",".join(sorted(protocol.id for protocol in protocols))
+        digest = hashlib.blake2b(
+            f"{protocol_ids}|{normalized}".encode("utf-8"),
+            digest_size=16
+        ).hexdigest()
+        return f"response:{version or 'unversioned'}:{digest}"
+
+    def _record(self, value: Optional[str]) -> Optional[str]:
+        self.lookups.inc(result="hit" if value is not None else "miss")
+        return value
+
+    def get(self, key: str) -> Optional[str]:
+        """Cached reply for a key from key_for."""
+        return self._record(cache_service.get(key, local=True))
+
+    async def aget(self, key: str) -> Optional[str]:
+        """Async variant of get."""
+        return self._record(await cache_service.aget(key, local=True))
+
+    def set(self, key: str, response: str) -> bool:
+        """Cache a reply."""
+        self.stores.inc()
+        return cache_service.set(key, response, expiry=settings.RESPONSE_CACHE_TTL, local=True)
+
+    async def aset(self, key: str, response: str) -> bool:
+        """Async variant of set."""
+        self.stores.inc()
+        return await cache_service.aset(key, response, expiry=settings.RESPONSE_CACHE_TTL, local=True)
+
+
+# Global response cache instance
+response_cache = ResponseCache()
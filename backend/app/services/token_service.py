@@ -0,0 +1,174 @@
+"""
+Token counting service with pluggable backends and memoized counts.
+
+The default heuristic backend needs no extra files. The BPE backend is a
+pure-Python byte-level BPE that loads merge ranks from a local vocab file
+in the tiktoken format (one "<base64 token> <rank>" pair per line), so
+exact counts are available without compiled dependencies.
+"""
+import base64
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List
+from ..config import settings
+
+
+# Non-ASCII characters (Devanagari, emoji, ...) cost far more tokens per
+# character than English text
+_NON_ASCII = re.compile(r"[^\x00-\x7f]")
+
+# Pre-tokenizer approximating the GPT-style split (contractions, words,
+# numbers, punctuation runs, whitespace) using only the stdlib re module
+_PRE_TOKENIZER = re.compile(
+    r"'(?:[sdmt]|ll|ve|re)| ?[^\W\d_]+| ?\d{1,3}| ?[^\s\w]+|\s+(?!\S)|\s+",
+    re.IGNORECASE
+)
+
+
+class HeuristicTokenizer:
+    """
+    Fast estimate based on character classes.
+
+    ASCII text is estimated at ~4 characters per token. Other characters
+    are estimated from their UTF-8 size, since byte-level BPE vocabularies
+    typically spend one or more tokens per Devanagari character or emoji.
+    """
+
+    name = "heuristic"
+
+    def count(self, text: str) -> int:
+        utf8_length = len(text.encode("utf-8"))
+        if utf8_length == len(text):
+            return len(text) // 4
+
+        ascii_length = len(_NON_ASCII.sub("", text))
+        non_ascii_bytes = utf8_length - ascii_length
+        return ascii_length // 4 + int(non_ascii_bytes / 2.5 + 0.5)
+
+
+class BPETokenizer:
+    """Byte-level BPE tokenizer loaded from a tiktoken-format rank file."""
+
+    name = "bpe"
+
+    def __init__(self, vocab_path: str, piece_cache_size: int = 50000):
+        self.ranks: Dict[bytes, int] = {}
+        with open(vocab_path, "rb") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                token, rank = line.split()
+                self.ranks[base64.b64decode(token)] = int(rank)
+
+        self._piece_cache: "OrderedDict[bytes, int]" = OrderedDict()
+        self._piece_cache_size = piece_cache_size
+        self._lock = threading.Lock()
+
+    def _count_piece(self, piece: bytes) -> int:
+        """Number of BPE tokens in one pre-tokenized piece."""
+        if piece in self.ranks:
+            return 1
+
+        with self._lock:
+            cached = self._piece_cache.get(piece)
+        if cached is not None:
+            return cached
+
+        # Merge the adjacent pair with the lowest rank until none remain
+        parts = [piece[i:i + 1] for i in range(len(piece))]
+        while len(parts) > 1:
+            best_rank = None
+            best_index = -1
+            for i in range(len(parts) - 1):
+                rank = self.ranks.get(parts[i] + parts[i + 1])
+                if rank is not None and (best_rank is None or rank < best_rank):
+                    best_rank = rank
+                    best_index = i
+            if best_rank is None:
+                break
+            parts[best_index:best_index + 2] = [parts[best_index] + parts[best_index + 1]]
+
+        count = len(parts)
+        with self._lock:
+            self._piece_cache[piece] = count
+            if len(self._piece_cache) > self._piece_cache_size:
+                self._piece_cache.popitem(last=False)
+        return count
+
+    def count(self, text: str) -> int:
+        return sum(
+            self._count_piece(piece.encode("utf-8"))
+            for piece in _PRE_TOKENIZER.findall(text)
+        )
+
+
+class TokenService:
+    """Counts tokens with the configured backend, memoized by content hash."""
+
+    def __init__(self):
+        self.tokenizer = self._load_tokenizer()
+        self._cache: "OrderedDict[bytes, int]" = OrderedDict()
+        self._cache_size = settings.TOKEN_CACHE_SIZE
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _load_tokenizer():
+        """Instantiate the configured backend, falling back to the heuristic."""
+        if settings.TOKENIZER_BACKEND == "bpe":
+            if settings.TOKENIZER_VOCAB_PATH:
+                try:
+                    return BPETokenizer(settings.TOKENIZER_VOCAB_PATH)
+                except Exception as e:
+                    print(f"Tokenizer load error, using heuristic: {e}")
+            else:
+                print("TOKENIZER_VOCAB_PATH not set, using heuristic tokenizer")
+        return HeuristicTokenizer()
+
+    def count(self, text: str) -> int:
+        """Count tokens in text."""
+        if not text:
+            return 0
+
+        key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return cached
+
+        count = self.tokenizer.count(text)
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = count
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return count
+
+    def count_many(self, texts: Iterable[str], memoize: bool = True) -> List[int]:
+        """
+        Count tokens for several texts.
+
+        Bulk callers counting mostly unique text (history imports) pass
+        memoize=False so they don't evict the hot entries from the cache.
+        """
+        if not memoize:
+            return [self.tokenizer.count(text) if text else 0 for text in texts]
+        return [self.count(text) for text in texts]
+
+    def stats(self) -> Dict[str, int]:
+        """Memo cache counters."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._cache)
+        }
+
+
+# Global token service instance
+token_service = TokenService()
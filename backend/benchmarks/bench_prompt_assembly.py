@@ -0,0 +1,117 @@
+"""
+Per-turn prompt assembly cost, before and after precomputed fragments.
+
+"before" reproduces the previous implementation: the system prompt is
+re-measured every turn and sections are built with repeated string
+concatenation. "after" uses PromptService.
+
+Usage (from backend/):
+    python -m benchmarks.bench_prompt_assembly [--turns N]
+"""
+import argparse
+import os
+import tempfile
+import timeit
+from types import SimpleNamespace
+
+# Settings are read at import time; nothing here touches the database or
+# OpenRouter, so placeholders are enough (the engine never connects)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'disha-bench.db')}")
+os.environ.setdefault("OPENROUTER_API_KEY", "benchmark")
+
+from app.init_db import SEED_PROTOCOLS
+from app.services.prompt_service import SYSTEM_PROMPT, prompt_service
+from app.services.protocol_service import ProtocolSnapshot
+
+
+def legacy_count_tokens(text):
+    return len(text) // 4
+
+
+def legacy_format_memories(memories):
+    if not memories:
+        return ""
+    by_category = {}
+    for memory in memories:
+        if memory.category not in by_category:
+            by_category[memory.category] = []
+        by_category[memory.category].append(memory.content)
+    formatted = "\n[LONG-TERM MEMORIES]\n"
+    for category, contents in by_category.items():
+        formatted += f"{category.replace('_', ' ').title()}:\n"
+        for content in contents:
+            formatted += f"- {content}\n"
+    return formatted
+
+
+def legacy_format_protocols(protocols):
+    if not protocols:
+        return ""
+    formatted = "\n[PROTOCOLS]\n"
+    for protocol in protocols:
+        formatted += f"\n**{protocol.name}**\n"
+        formatted += f"{protocol.description}\n"
+        if isinstance(protocol.instructions, dict):
+            if "steps" in protocol.instructions:
+                formatted += "Steps:\n"
+                for i, step in enumerate(protocol.instructions["steps"], 1):
+                    formatted += f"{i}. {step}\n"
+            if "warnings" in protocol.instructions:
+                formatted += f"\nWarnings: {', '.join(protocol.instructions['warnings'])}\n"
+        formatted += "\n"
+    return formatted
+
+
+def legacy_assemble(memories, protocols):
+    total_tokens = legacy_count_tokens(SYSTEM_PROMPT)
+    memory_context = legacy_format_memories(memories)
+    total_tokens += legacy_count_tokens(memory_context)
+    protocol_context = legacy_format_protocols(protocols)
+    total_tokens += legacy_count_tokens(protocol_context)
+    full_system_prompt = SYSTEM_PROMPT
+    if memory_context:
+        full_system_prompt += f"\n\n{memory_context}"
+    if protocol_context:
+        full_system_prompt += f"\n\n{protocol_context}"
+    return full_system_prompt, total_tokens
+
+
+def current_assemble(memories, protocols):
+    message = prompt_service.system_message(
+        prompt_service.memories_section(memories),
+        prompt_service.protocols_section(protocols)
+    )
+    return message.text, message.tokens
+
+
+def fixtures():
+    memories = [
+        SimpleNamespace(category=category, content=f"Remembered detail {i} about {category}")
+        for i, category in enumerate(["demographics", "health_condition", "medication", "lifestyle", "symptoms"])
+    ]
+    protocols = [
+        ProtocolSnapshot(id=str(i), **protocol)
+        for i, protocol in enumerate(SEED_PROTOCOLS[:3])
+    ]
+    return memories, protocols
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--turns", type=int, default=20000)
+    args = parser.parse_args()
+
+    memories, protocols = fixtures()
+    assert legacy_assemble(memories, protocols)[0] == current_assemble(memories, protocols)[0]
+
+    results = {}
+    for label, assemble in (("before", legacy_assemble), ("after", current_assemble)):
+        seconds = min(timeit.repeat(lambda: assemble(memories, protocols), number=args.turns, repeat=5))
+        results[label] = seconds / args.turns * 1e6
+        print(f"{label:>6}: {results[label]:8.2f} µs per turn")
+
+    print(f"speedup: {results['before'] / results['after']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+"""
+Compare two benchmark result files and flag regressions.
+
+Usage (from backend/):
+    python -m benchmarks.compare baseline.json results.json [--threshold 0.15]
+
+Exits with status 1 if any benchmark's median grew by more than the
+threshold, so it can gate CI.
+"""
+import argparse
+import sys
+from .harness import check, load
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.15)
+    args = parser.parse_args()
+    return check(load(args.baseline), load(args.current), args.threshold)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
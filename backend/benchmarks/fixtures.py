@@ -0,0 +1,178 @@
+"""
+Synthetic data for the benchmarks.
+
+Everything is generated from a fixed seed so runs are comparable. Users are
+bulk-inserted with their messages and memories; protocol sets start from
+the seeded protocols and are padded with generated ones.
+"""
+import random
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.init_db import SEED_PROTOCOLS
+from app.models import Memory, Message, User
+from app.services.memory_service import memory_service
+from app.services.protocol_service import ProtocolSnapshot
+from app.services.token_service import token_service
+
+
+SEED = 1234
+BATCH_SIZE = 5000
+
+# Words the generated protocols, memories and messages are drawn from
+HEALTH_WORDS = (
+    "fever headache cough cold stomach nausea vomiting diarrhea rash allergy "
+    "asthma diabetes blood pressure sugar sleep insomnia stress anxiety back "
+    "knee joint pain ache tired fatigue dizzy throat sneeze congestion acidity "
+    "bloating cramps migraine weight diet exercise walking yoga water hydration "
+    "vitamin iron thyroid cholesterol heart breathing skin itching eyes dry"
+).split()
+
+SENTENCES = [
+    "I have been taking {word} medicine for a while",
+    "I was diagnosed with {word} last year",
+    "My {word} gets worse after work",
+    "I try to exercise but my {word} makes it hard",
+    "I usually sleep late because of {word}",
+    "The doctor prescribed something for my {word}",
+    "I feel {word} most mornings",
+    "My age is 34 and I have mild {word}"
+]
+
+MESSAGES = [
+    "I have had a headache and mild fever since yesterday, what should I do?",
+    "My stomach hurts after dinner and I feel bloated",
+    "How can I get better sleep when I am stressed about work?",
+    "I want a refund for my subscription please",
+    "Is it okay to exercise with a cold and sore throat?"
+]
+
+# Sizes: (messages, memories) per user profile, and protocol set sizes
+PROFILES = [(10, 1), (1000, 100), (100000, 10000)]
+PROTOCOL_SIZES = [6, 500, 5000]
+
+
+@dataclass
+class BenchUser:
+    """A seeded user and the size of their history."""
+    id: uuid.UUID
+    messages: int
+    memories: int
+
+    @property
+    def label(self) -> str:
+        return f"n={self.messages},m={self.memories}"
+
+
+@dataclass
+class Fixtures:
+    """Everything seeded for one benchmark run."""
+    users: List[BenchUser] = field(default_factory=list)
+    protocol_sets: Dict[int, List[ProtocolSnapshot]] = field(default_factory=dict)
+
+
+def _words(rng: random.Random, count: int) -> List[str]:
+    return [rng.choice(HEALTH_WORDS) for _ in range(count)]
+
+
+def create_user(db: Session, messages: int, memories: int, rng: random.Random) -> BenchUser:
+    """Insert a user with the given number of messages and memories."""
+    user_id = uuid.uuid4()
+    now = datetime.now(timezone.utc)
+    start = now - timedelta(minutes=messages)
+
+    db.execute(insert(User), [{
+        "id": user_id,
+        "name": f"Benchmark User {messages}/{memories}",
+        "user_metadata": {"benchmark": True},
+        "message_count": messages // 2,
+        "created_at": start,
+        "updated_at": now
+    }])
+
+    for offset in range(0, messages, BATCH_SIZE):
+        rows = []
+        for i in range(offset, min(offset + BATCH_SIZE, messages)):
+            content = rng.choice(MESSAGES) if i % 2 == 0 else " ".join(_words(rng, 30))
+            rows.append({
+                "id": uuid.uuid4(),
+                "user_id": user_id,
+                "role": "user" if i % 2 == 0 else "assistant",
+                "content": content,
+                "created_at": start + timedelta(minutes=i),
+                "is_onboarding": i < 4,
+                "token_count": token_service.count(content)
+            })
+        db.execute(insert(Message), rows)
+
+    for offset in range(0, memories, BATCH_SIZE):
+        rows = []
+        for i in range(offset, min(offset + BATCH_SIZE, memories)):
+            # The index keeps contents (and so their hashes) unique
+            content = f"{rng.choice(SENTENCES).format(word=rng.choice(HEALTH_WORDS))} ({i})"
+            rows.append({
+                "id": uuid.uuid4(),
+                "user_id": user_id,
+                "content": content,
+                "category": rng.choice(["health_condition", "medication", "lifestyle", "symptoms"]),
+                "importance_score": round(rng.uniform(0.3, 0.9), 2),
+                "content_hash": memory_service.content_hash(content),
+                "created_at": start + timedelta(seconds=i),
+                "scored_at": start + timedelta(seconds=i)
+            })
+        db.execute(insert(Memory), rows)
+
+    db.commit()
+    return BenchUser(user_id, messages, memories)
+
+
+def protocol_set(size: int, rng: random.Random) -> List[ProtocolSnapshot]:
+    """The seeded protocols padded with generated ones up to size."""
+    protocols = [
+        ProtocolSnapshot(
+            id=str(uuid.uuid4()),
+            name=data["name"],
+            description=data["description"],
+            instructions=data["instructions"],
+            keywords=list(data["keywords"]),
+            response_cacheable=data.get("response_cacheable", False)
+        )
+        for data in SEED_PROTOCOLS[:size]
+    ]
+    for i in range(len(protocols), size):
+        keywords = sorted(set(_words(rng, 3))) + [f"condition{i}", f"symptom {i}"]
+        protocols.append(ProtocolSnapshot(
+            id=str(uuid.uuid4()),
+            name=f"Synthetic Protocol {i}",
+            description=f"Generated protocol {i} covering {', '.join(keywords[:3])}.",
+            instructions={
+                "steps": [f"Ask about {word}" for word in keywords[:3]],
+                "warnings": [f"See a doctor if {keywords[0]} persists"]
+            },
+            keywords=keywords
+        ))
+    return protocols
+
+
+def seed(db: Session, profiles=PROFILES, protocol_sizes=PROTOCOL_SIZES) -> Fixtures:
+    """Seed users for each profile and build each protocol set."""
+    rng = random.Random(SEED)
+    fixtures = Fixtures()
+    for messages, memories in profiles:
+        fixtures.users.append(create_user(db, messages, memories, rng))
+    for size in protocol_sizes:
+        fixtures.protocol_sets[size] = protocol_set(size, rng)
+    return fixtures
+
+
+def cleanup(db: Session, fixtures: Fixtures) -> None:
+    """Delete the seeded users and everything they own."""
+    user_ids = [user.id for user in fixtures.users]
+    db.query(Message).filter(Message.user_id.in_(user_ids)).delete(synchronize_session=False)
+    db.query(Memory).filter(Memory.user_id.in_(user_ids)).delete(synchronize_session=False)
+    db.query(User).filter(User.id.in_(user_ids)).delete(synchronize_session=False)
+    db.commit()
@@ -0,0 +1,126 @@
+"""
+Timing, result files and regression checks for the benchmarks.
+"""
+import json
+import platform
+import statistics
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Tuple
+
+
+def measure(
+    func: Callable[[], Any],
+    min_time: float = 0.5,
+    min_rounds: int = 5,
+    max_rounds: int = 100000
+) -> Dict[str, float]:
+    """
+    Time repeated calls of func.
+
+    After one warm-up call, func runs until min_time seconds have passed
+    and at least min_rounds calls were made. Times are in milliseconds.
+    """
+    func()
+    samples: List[float] = []
+    started = time.perf_counter()
+    while len(samples) < max_rounds:
+        call_started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - call_started) * 1000)
+        if len(samples) >= min_rounds and time.perf_counter() - started >= min_time:
+            break
+
+    ordered = sorted(samples)
+    return {
+        "rounds": len(samples),
+        "mean_ms": statistics.fmean(samples),
+        "median_ms": statistics.median(ordered),
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "min_ms": ordered[0],
+        "stdev_ms": statistics.stdev(samples) if len(samples) > 1 else 0.0
+    }
+
+
+def environment(database_url: str) -> Dict[str, str]:
+    """Describe where results were recorded."""
+    return {
+        "recorded_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "database": database_url.split(":", 1)[0]
+    }
+
+
+def save(path: str, results: Dict[str, Dict[str, float]], meta: Dict[str, str]) -> None:
+    with open(path, "w") as f:
+        json.dump({"meta": meta, "results": results}, f, indent=2)
+
+
+def load(path: str) -> Dict[str, Dict[str, float]]:
+    with open(path) as f:
+        return json.load(f)["results"]
+
+
+def compare(
+    baseline: Dict[str, Dict[str, float]],
+    current: Dict[str, Dict[str, float]],
+    threshold: float
+) -> Tuple[List[Tuple[str, float, float, float]], List[str]]:
+    """
+    Compare median times per benchmark.
+
+    Returns:
+        (rows of (name, baseline ms, current ms, relative change),
+        names whose median grew by more than threshold)
+    """
+    rows = []
+    regressions = []
+    for name, stats in current.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]["median_ms"]
+        after = stats["median_ms"]
+        change = (after - before) / before if before else 0.0
+        rows.append((name, before, after, change))
+        if change > threshold:
+            regressions.append(name)
+    return rows, regressions
+
+
+def print_results(results: Dict[str, Dict[str, float]]) -> None:
+    width = max((len(name) for name in results), default=10)
+    print(f"\n{'benchmark':<{width}} {'rounds':>7} {'median ms':>10} {'p95 ms':>10} {'min ms':>10}")
+    for name, stats in results.items():
+        print(
+            f"{name:<{width}} {stats['rounds']:>7} {stats['median_ms']:>10.3f} "
+            f"{stats['p95_ms']:>10.3f} {stats['min_ms']:>10.3f}"
+        )
+
+
+def print_comparison(
+    rows: List[Tuple[str, float, float, float]],
+    regressions: List[str],
+    threshold: float
+) -> None:
+    width = max((len(row[0]) for row in rows), default=10)
+    print(f"\n{'benchmark':<{width}} {'base ms':>10} {'now ms':>10} {'change':>8}")
+    for name, before, after, change in rows:
+        flag = "  REGRESSION" if name in regressions else ""
+        print(f"{name:<{width}} {before:>10.3f} {after:>10.3f} {change:>+8.1%}{flag}")
+
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) slower than baseline by more than {threshold:.0%}")
+    else:
+        print(f"\nNo regressions beyond {threshold:.0%}")
+
+
+def check(
+    baseline: Dict[str, Dict[str, float]],
+    current: Dict[str, Dict[str, float]],
+    threshold: float
+) -> int:
+    """Print a comparison; returns a process exit code (1 on regressions)."""
+    rows, regressions = compare(baseline, current, threshold)
+    print_comparison(rows, regressions, threshold)
+    return 1 if regressions else 0
@@ -0,0 +1,236 @@
+"""
+Microbenchmarks for the per-turn context pipeline.
+
+Seeds synthetic users (10 to 100k messages, 1 to 10k memories) and
+protocol sets (6 to 5,000 protocols), then times build_context,
+match_protocols, memory retrieval, extract_and_store_memories and the
+context formatters. Cache reads are passed in as prefetched values, the
+way the chat routes do, and the remaining cache calls (memory versions,
+context windows) go to an in-memory stand-in for Redis, so no Redis server
+is needed and no connection attempts land in the timed region.
+
+Usage (from backend/):
+    python -m benchmarks.run [--database-url sqlite:///bench.db] [--quick]
+        [--filter build_context] [--output results.json]
+        [--baseline baseline.json] [--threshold 0.15]
+
+Without --database-url a temporary SQLite file is used. With a Postgres URL
+the schema must exist (alembic upgrade head); seeded rows are deleted
+afterwards unless --keep is given.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from itertools import count
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--database-url", help="Default: a temporary SQLite file")
+    parser.add_argument("--quick", action="store_true", help="Skip the largest fixtures")
+    parser.add_argument("--filter", help="Only run benchmarks whose name contains this")
+    parser.add_argument("--min-time", type=float, default=0.5, help="Seconds per benchmark")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="Relative slowdown of the median that counts as a regression")
+    parser.add_argument("--keep", action="store_true", help="Keep the seeded rows")
+    return parser.parse_args()
+
+
+class LocalRedis:
+    """In-memory stand-in for the sync Redis calls CacheService makes; expiry is ignored."""
+
+    def __init__(self):
+        self.values: Dict[str, Any] = {}
+
+    def get(self, key: str) -> Optional[str]:
+        return self.values.get(key)
+
+    def setex(self, key: str, expiry: int, value: str) -> None:
+        self.values[key] = value
+
+    def delete(self, key: str) -> None:
+        self.values.pop(key, None)
+
+    def rpush(self, key: str, *items: str) -> None:
+        self.values.setdefault(key, []).extend(items)
+
+    def lrange(self, key: str, start: int, end: int) -> List[str]:
+        items = self.values.get(key, [])
+        return items[start:] if end == -1 else items[start:end + 1]
+
+    def expire(self, key: str, expiry: int) -> None:
+        pass
+
+    def pipeline(self, transaction: bool = True) -> "LocalRedis":
+        return self
+
+    def execute(self) -> None:
+        pass
+
+    def __enter__(self) -> "LocalRedis":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        pass
+
+
+def benchmarks(db, fixtures) -> Iterator[Tuple[str, Callable[[], Any]]]:
+    """
+    Yield (name, callable) pairs to time.
+
+    Each callable is timed before the next one is generated, so state set
+    up here (such as the installed protocol matcher) holds while it runs.
+    """
+    from app.services.cache_service import cache_service
+    from app.services.llm_service import llm_service
+    from app.services.memory_index import memory_index
+    from app.services.memory_service import memory_service
+    from app.services.protocol_service import ProtocolMatcher, ProtocolService, protocol_service
+    from .fixtures import MESSAGES
+
+    turns = count()
+
+    def next_message() -> str:
+        return MESSAGES[next(turns) % len(MESSAGES)]
+
+    def use_protocols(size: int) -> Dict[str, Any]:
+        """Install a protocol set as this worker's matcher; returns prefetched values."""
+        version = f"benchmark-{size}"
+        ProtocolService._matcher = ProtocolMatcher(fixtures.protocol_sets[size], version)
+        ProtocolService._checked_at = time.monotonic()
+        return {cache_service.PROTOCOL_VERSION_KEY: version}
+
+    # Protocol matching and formatting
+    for size in fixtures.protocol_sets:
+        prefetched = use_protocols(size)
+        yield f"match_protocols[p={size}]", lambda p=prefetched: llm_service.match_protocols(next_message(), db, p)
+
+    largest = fixtures.protocol_sets[max(fixtures.protocol_sets)]
+    for matched in (1, 3, 10):
+        protocols = largest[:matched]
+        yield (
+            f"format_protocols_for_context[k={matched}]",
+            lambda p=protocols: protocol_service.format_protocols_for_context(p)
+        )
+
+    # Memories
+    for user in fixtures.users:
+        yield (
+            f"get_relevant_memories[m={user.memories}]",
+            lambda u=user: memory_service.get_relevant_memories(u.id, db, limit=5, query=next_message())
+        )
+
+        def rebuild(u=user):
+            memory_index.invalidate(u.id)
+            return memory_index.get(u.id, db)
+        yield f"memory_index_build[m={user.memories}]", rebuild
+
+    user = fixtures.users[-1]
+    for limit in (5, 20):
+        memories = memory_service.get_relevant_memories(user.id, db, limit=limit, query=MESSAGES[0])
+        yield (
+            f"format_memories_for_context[k={limit}]",
+            lambda m=memories: memory_service.format_memories_for_context(m)
+        )
+
+    # History
+    for user in fixtures.users:
+        yield f"load_context_window[n={user.messages}]", lambda u=user: llm_service.load_context_window(u.id, db)
+
+    # Full context assembly, each user paired with a protocol set of matching scale
+    sizes = sorted(fixtures.protocol_sets)
+    for index, user in enumerate(fixtures.users):
+        size = sizes[min(index, len(sizes) - 1)]
+        prefetched = use_protocols(size)
+        prefetched[llm_service.context_window_key(user.id)] = llm_service.load_context_window(user.id, db)
+
+        yield (
+            f"build_context[{user.label},p={size}]",
+            lambda u=user, p=prefetched: llm_service.build_context(u.id, next_message(), db, prefetched=p)
+        )
+
+    # Memory extraction: new memories, then ones the user already has
+    for user in fixtures.users:
+        sequence = count()
+        yield (
+            f"extract_and_store_memories[insert,m={user.memories}]",
+            lambda u=user, s=sequence: memory_service.extract_and_store_memories(
+                u.id, f"I was diagnosed with asthma in {next(s)}. I take my medicine daily.", db
+            )
+        )
+        yield (
+            f"extract_and_store_memories[reinforce,m={user.memories}]",
+            lambda u=user: memory_service.extract_and_store_memories(
+                u.id, "I was diagnosed with asthma. I take my medicine daily.", db
+            )
+        )
+
+
+def main() -> int:
+    args = parse_args()
+
+    temporary = None
+    database_url = args.database_url
+    if not database_url:
+        handle, temporary = tempfile.mkstemp(prefix="disha-bench-", suffix=".db")
+        os.close(handle)
+        database_url = f"sqlite:///{temporary}"
+
+    # Settings are read at import time
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.setdefault("OPENROUTER_API_KEY", "benchmark")
+
+    from app.database import Base, SessionLocal, engine
+    from app.services.cache_service import cache_service
+    from . import fixtures as fixture_data
+    from .harness import check, environment, load, measure, print_results, save
+
+    profiles = fixture_data.PROFILES
+    protocol_sizes = fixture_data.PROTOCOL_SIZES
+    if args.quick:
+        profiles, protocol_sizes = profiles[:-1], protocol_sizes[:-1]
+
+    if engine.dialect.name == "sqlite":
+        Base.metadata.create_all(engine)
+    cache_service.redis_client = LocalRedis()
+
+    db = SessionLocal()
+    try:
+        print(f"Seeding fixtures on {engine.dialect.name}...")
+        started = time.perf_counter()
+        fixtures = fixture_data.seed(db, profiles, protocol_sizes)
+        print(f"✓ Seeded in {time.perf_counter() - started:.1f}s")
+
+        results: Dict[str, Dict[str, float]] = {}
+        for name, func in benchmarks(db, fixtures):
+            if args.filter and args.filter not in name:
+                continue
+            print(f"  {name}...", flush=True)
+            results[name] = measure(func, min_time=args.min_time)
+            db.rollback()
+
+        if not args.keep:
+            fixture_data.cleanup(db, fixtures)
+    finally:
+        db.close()
+        if temporary:
+            engine.dispose()
+            os.remove(temporary)
+
+    print_results(results)
+    if args.output:
+        save(args.output, results, environment(database_url))
+        print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        return check(load(args.baseline), results, args.threshold)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""
+OpenAI-compatible stub server for load testing without provider costs.
+
+Serves POST /v1/chat/completions (plain and streaming) with configurable
+latency, streaming speed and error rate. Point the backend at it with:
+
+    AI_BASE_URL=http://127.0.0.1:8100/v1
+
+Usage (from backend/):
+    python -m loadtest.fake_llm [--port 8100] [--latency-ms 800]
+        [--jitter-ms 200] [--ttft-ms 300] [--tokens-per-second 50]
+        [--reply-words 60] [--error-rate 0.0] [--error-status 500]
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+WORDS = (
+    "rest hydrate sleep track your symptoms and check in with a doctor if "
+    "things get worse over the next few days while eating light meals"
+).split()
+
+# Defaults, overridden from the command line
+config = {
+    "latency_ms": 800.0,
+    "jitter_ms": 200.0,
+    "ttft_ms": 300.0,
+    "tokens_per_second": 50.0,
+    "reply_words": 60,
+    "error_rate": 0.0,
+    "error_status": 500
+}
+
+app = FastAPI(title="Fake LLM")
+
+
+def _reply(max_tokens: int) -> List[str]:
+    """Pseudo-random reply words, at most max_tokens of them."""
+    count = min(config["reply_words"], max_tokens or config["reply_words"])
+    return [random.choice(WORDS) for _ in range(max(1, count))]
+
+
+def _latency() -> float:
+    """Total response latency in seconds for a non-streaming call."""
+    return max(0.0, random.gauss(config["latency_ms"], config["jitter_ms"])) / 1000
+
+
+def _usage(messages: List[Dict[str, Any]], words: List[str]) -> Dict[str, int]:
+    prompt_tokens = sum(len(str(message.get("content", ""))) // 4 for message in messages)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": len(words),
+        "total_tokens": prompt_tokens + len(words)
+    }
+
+
+def _error() -> JSONResponse:
+    return JSONResponse(
+        status_code=config["error_status"],
+        content={"error": {"message": "Injected failure", "type": "server_error"}}
+    )
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "fake-model")
+    messages = body.get("messages", [])
+    words = _reply(body.get("max_tokens") or 0)
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+
+    if random.random() < config["error_rate"]:
+        await asyncio.sleep(_latency() / 2)
+        return _error()
+
+    if not body.get("stream"):
+        await asyncio.sleep(_latency())
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": " ".join(words)},
+                "finish_reason": "stop"
+            }],
+            "usage": _usage(messages, words)
+        }
+
+    async def stream() -> AsyncIterator[str]:
+        def chunk(delta: Dict[str, Any], finish_reason=None) -> str:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            }
+            return f"data: {json.dumps(payload)}\n\n"
+
+        await asyncio.sleep(config["ttft_ms"] / 1000)
+        yield chunk({"role": "assistant", "content": ""})
+        interval = 1 / config["tokens_per_second"] if config["tokens_per_second"] > 0 else 0
+        for i, word in enumerate(words):
+            yield chunk({"content": word if i == 0 else f" {word}"})
+            if interval:
+                await asyncio.sleep(interval)
+        yield chunk({}, finish_reason="stop")
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+@app.get("/v1/models")
+async def list_models():
+    return {"object": "list", "data": [{"id": "fake-model", "object": "model", "owned_by": "loadtest"}]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=config["latency_ms"])
+    parser.add_argument("--jitter-ms", type=float, default=config["jitter_ms"])
+    parser.add_argument("--ttft-ms", type=float, default=config["ttft_ms"])
+    parser.add_argument("--tokens-per-second", type=float, default=config["tokens_per_second"])
+    parser.add_argument("--reply-words", type=int, default=config["reply_words"])
+    parser.add_argument("--error-rate", type=float, default=config["error_rate"])
+    parser.add_argument("--error-status", type=int, default=config["error_status"])
+    args = parser.parse_args()
+
+    config.update({
+        "latency_ms": args.latency_ms,
+        "jitter_ms": args.jitter_ms,
+        "ttft_ms": args.ttft_ms,
+        "tokens_per_second": args.tokens_per_second,
+        "reply_words": args.reply_words,
+        "error_rate": args.error_rate,
+        "error_status": args.error_status
+    })
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+Load generator for the chat API.
+
+Each virtual user runs the full flow against a running backend: create a
+user, onboard, chat for a number of turns and page through the history.
+Reports requests per second and p50/p95/p99 latency per endpoint, and can
+write the results to JSON for comparing runs.
+
+Run the backend against the fake LLM server (see loadtest.fake_llm), then
+(from backend/):
+    python -m loadtest.load_generator [--base-url http://127.0.0.1:8000]
+        [--users 50] [--turns 5] [--onboarding-turns 2] [--stream]
+        [--history-pages 2] [--output results.json]
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+
+MESSAGES = [
+    "I have had a headache since this morning",
+    "What should I eat when I have a fever?",
+    "I can't sleep well lately",
+    "How do I get a refund for my subscription?",
+    "I have a cold and a sore throat",
+    "My stomach hurts after meals",
+    "How much water should I drink every day?",
+    "I feel tired all the time"
+]
+
+ONBOARDING_ANSWERS = [
+    "I'm 32 and live in Pune",
+    "I have mild asthma and take an inhaler",
+    "I want to sleep better and exercise more"
+]
+
+
+class Recorder:
+    """Collects latencies and failures per endpoint."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.statuses: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+
+    async def request(
+        self,
+        client: httpx.AsyncClient,
+        endpoint: str,
+        method: str,
+        url: str,
+        stream: bool = False,
+        **kwargs
+    ) -> Optional[httpx.Response]:
+        """Send a request, timing it under an endpoint label."""
+        started = time.perf_counter()
+        try:
+            if stream:
+                async with client.stream(method, url, **kwargs) as response:
+                    await response.aread()
+            else:
+                response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.errors[endpoint] += 1
+            return None
+
+        self.latencies[endpoint].append(time.perf_counter() - started)
+        self.statuses[endpoint][response.status_code] += 1
+        if response.status_code >= 400:
+            self.errors[endpoint] += 1
+        return response
+
+
+def percentile(samples: List[float], percent: float) -> float:
+    """Nearest-rank percentile."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered), math.ceil(percent / 100 * len(ordered))) - 1)
+    return ordered[index]
+
+
+async def virtual_user(
+    client: httpx.AsyncClient,
+    recorder: Recorder,
+    index: int,
+    args: argparse.Namespace
+) -> None:
+    """One user's session: create, onboard, chat, read history."""
+    response = await recorder.request(
+        client, "POST /api/users", "POST", "/api/users",
+        json={"name": f"Load User {index}", "user_metadata": {"source": "loadtest"}}
+    )
+    if response is None or response.status_code >= 400:
+        return
+    user_id = response.json()["id"]
+
+    await recorder.request(
+        client, "POST /api/onboarding", "POST", "/api/onboarding",
+        json={"user_id": user_id}
+    )
+    for answer in ONBOARDING_ANSWERS[:args.onboarding_turns]:
+        await recorder.request(
+            client, "POST /api/onboarding (reply)", "POST", "/api/onboarding",
+            json={"user_id": user_id, "message": answer}
+        )
+
+    for _ in range(args.turns):
+        payload = {"user_id": user_id, "content": random.choice(MESSAGES)}
+        if args.stream:
+            await recorder.request(
+                client, "POST /api/messages/stream", "POST", "/api/messages/stream",
+                stream=True, json=payload
+            )
+        else:
+            await recorder.request(client, "POST /api/messages", "POST", "/api/messages", json=payload)
+        if args.think_time:
+            await asyncio.sleep(random.uniform(0, args.think_time))
+
+    cursor = None
+    for _ in range(args.history_pages):
+        params = {"user_id": user_id, "limit": args.page_size}
+        if cursor:
+            params["before"] = cursor
+        response = await recorder.request(client, "GET /api/messages", "GET", "/api/messages", params=params)
+        if response is None or response.status_code >= 400:
+            break
+        cursor = response.json().get("next_cursor")
+        if not cursor:
+            break
+
+
+def report(recorder: Recorder, elapsed: float) -> Dict[str, Any]:
+    """Summarize and print results."""
+    endpoints = {}
+    for endpoint in sorted(set(recorder.latencies) | set(recorder.errors)):
+        samples = recorder.latencies[endpoint]
+        endpoints[endpoint] = {
+            "requests": len(samples),
+            "errors": recorder.errors[endpoint],
+            "statuses": dict(recorder.statuses[endpoint]),
+            "rps": len(samples) / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(samples, 50) * 1000,
+            "p95_ms": percentile(samples, 95) * 1000,
+            "p99_ms": percentile(samples, 99) * 1000
+        }
+
+    total = sum(endpoint["requests"] for endpoint in endpoints.values())
+    summary = {
+        "elapsed_s": elapsed,
+        "requests": total,
+        "errors": sum(endpoint["errors"] for endpoint in endpoints.values()),
+        "rps": total / elapsed if elapsed else 0.0,
+        "endpoints": endpoints
+    }
+
+    print(f"\n{'endpoint':<30} {'reqs':>6} {'errs':>5} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, stats in endpoints.items():
+        print(
+            f"{name:<30} {stats['requests']:>6} {stats['errors']:>5} {stats['rps']:>8.1f} "
+            f"{stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f}"
+        )
+    print(f"\nTotal: {total} requests, {summary['errors']} errors in {elapsed:.1f}s ({summary['rps']:.1f} req/s)")
+    return summary
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            virtual_user(client, recorder, index, args)
+            for index in range(args.users)
+        ))
+        elapsed = time.perf_counter() - started
+    return report(recorder, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--users", type=int, default=50, help="Concurrent virtual users")
+    parser.add_argument("--turns", type=int, default=5, help="Chat messages per user")
+    parser.add_argument("--onboarding-turns", type=int, default=2)
+    parser.add_argument("--history-pages", type=int, default=2)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--stream", action="store_true", help="Chat via /api/messages/stream")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Max random pause between turns (s)")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    summary = asyncio.run(run(args))
+    if args.output:
+        summary["config"] = {
+            key: value for key, value in vars(args).items() if key != "output"
+        }
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Initial schema
+
+Creates the tables previously created by Base.metadata.create_all. Tables
+that already exist (databases initialized before migrations were added)
+are left untouched, so this revision is safe to apply to them.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _has_table(name):
+    """Whether a table already exists (always False when emitting SQL offline)."""
+    if op.get_context().as_sql:
+        return False
+    return sa.inspect(op.get_bind()).has_table(name)
+
+
+def upgrade():
+    if not _has_table("users"):
+        op.create_table(
+            "users",
+            sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True),
+            sa.Column("name", sa.String(255), nullable=False),
+            sa.Column("user_metadata", postgresql.JSONB()),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+            sa.Column("updated_at", sa.DateTime(), nullable=False),
+        )
+
+    if not _has_table("messages"):
+        op.create_table(
+            "messages",
+            sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True),
+            sa.Column("user_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("role", sa.String(20), nullable=False),
+            sa.Column("content", sa.Text(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+            sa.Column("is_onboarding", sa.Boolean()),
+            sa.Column("token_count", sa.Integer()),
+        )
+        op.create_index("ix_messages_user_id", "messages", ["user_id"])
+        op.create_index("ix_messages_created_at", "messages", ["created_at"])
+
+    if not _has_table("memories"):
+        op.create_table(
+            "memories",
+            sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True),
+            sa.Column("user_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("content", sa.Text(), nullable=False),
+            sa.Column("category", sa.String(100), nullable=False),
+            sa.Column("importance_score", sa.Float()),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+        )
+        op.create_index("ix_memories_user_id", "memories", ["user_id"])
+
+    if not _has_table("protocols"):
+        op.create_table(
+            "protocols",
+            sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True),
+            sa.Column("name", sa.String(255), nullable=False, unique=True),
+            sa.Column("description", sa.Text(), nullable=False),
+            sa.Column("instructions", postgresql.JSONB(), nullable=False),
+            sa.Column("keywords", postgresql.ARRAY(sa.String()), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+        )
+
+
+def downgrade():
+    op.drop_table("protocols")
+    op.drop_table("memories")
+    op.drop_table("messages")
+    op.drop_table("users")
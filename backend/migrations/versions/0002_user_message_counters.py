@@ -0,0 +1,42 @@
+"""Per-user message counters
+
+Adds denormalized counters to users so extraction and onboarding checks
+no longer run COUNT(*) over messages, and backfills them from history.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("users", sa.Column("message_count", sa.Integer(), nullable=False, server_default="0"))
+    op.add_column("users", sa.Column("onboarding_message_count", sa.Integer(), nullable=False, server_default="0"))
+    op.add_column("users", sa.Column("last_extraction_count", sa.Integer(), nullable=False, server_default="0"))
+
+    op.execute("""
+        UPDATE users SET
+            message_count = (
+                SELECT COUNT(*) FROM messages
+                WHERE messages.user_id = users.id AND messages.role = 'user'
+            ),
+            onboarding_message_count = (
+                SELECT COUNT(*) FROM messages
+                WHERE messages.user_id = users.id AND messages.is_onboarding
+            )
+    """)
+    # Existing histories start a fresh extraction interval
+    op.execute("UPDATE users SET last_extraction_count = message_count")
+
+
+def downgrade():
+    op.drop_column("users", "last_extraction_count")
+    op.drop_column("users", "onboarding_message_count")
+    op.drop_column("users", "message_count")
@@ -0,0 +1,51 @@
+"""Composite keyset index on messages
+
+Adds (user_id, created_at DESC, id DESC) for keyset pagination and recent
+history reads, and drops the single-column user_id index it supersedes.
+Both are built concurrently so the table stays writable.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_messages_user_created_id",
+            "messages",
+            ["user_id", sa.text("created_at DESC"), sa.text("id DESC")],
+            postgresql_concurrently=True,
+            if_not_exists=True
+        )
+        op.drop_index(
+            "ix_messages_user_id",
+            table_name="messages",
+            postgresql_concurrently=True,
+            if_exists=True
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_messages_user_id",
+            "messages",
+            ["user_id"],
+            postgresql_concurrently=True,
+            if_not_exists=True
+        )
+        op.drop_index(
+            "ix_messages_user_created_id",
+            table_name="messages",
+            postgresql_concurrently=True,
+            if_exists=True
+        )
@@ -0,0 +1,56 @@
+"""Memory deduplication
+
+Adds a normalized content hash with a per-user unique index so repeated
+extractions reinforce an existing memory instead of inserting a copy, and
+scored_at so importance can be decayed by compaction. Existing exact
+duplicates are collapsed onto their most important row.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("memories", sa.Column("content_hash", sa.String(32), nullable=True))
+    op.add_column("memories", sa.Column("scored_at", sa.DateTime(), nullable=True))
+
+    # Same normalization as MemoryService.content_hash
+    op.execute("""
+        UPDATE memories SET
+            content_hash = md5(btrim(regexp_replace(lower(content), '[^a-z0-9]+', ' ', 'g'))),
+            scored_at = created_at
+    """)
+    op.execute("""
+        DELETE FROM memories WHERE id IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (
+                    PARTITION BY user_id, content_hash
+                    ORDER BY importance_score DESC NULLS LAST, created_at
+                ) AS position
+                FROM memories
+            ) ranked
+            WHERE position > 1
+        )
+    """)
+
+    op.alter_column("memories", "content_hash", nullable=False)
+    op.create_index(
+        "ix_memories_user_content_hash",
+        "memories",
+        ["user_id", "content_hash"],
+        unique=True
+    )
+
+
+def downgrade():
+    op.drop_index("ix_memories_user_content_hash", table_name="memories")
+    op.drop_column("memories", "scored_at")
+    op.drop_column("memories", "content_hash")
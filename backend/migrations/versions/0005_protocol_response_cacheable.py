@@ -0,0 +1,28 @@
+"""Protocol response cache opt-in
+
+Adds protocols.response_cacheable and opts in the seeded Refund Policy
+protocol, whose replies do not depend on the user.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "protocols",
+        sa.Column("response_cacheable", sa.Boolean(), nullable=False, server_default=sa.false())
+    )
+    op.execute("UPDATE protocols SET response_cacheable = true WHERE name = 'Refund Policy'")
+
+
+def downgrade():
+    op.drop_column("protocols", "response_cacheable")
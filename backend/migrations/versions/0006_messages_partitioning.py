@@ -0,0 +1,130 @@
+"""Partition messages by month and add the archive index
+
+Recreates messages as a table range-partitioned on created_at, with one
+partition per month from the oldest message to MESSAGE_PARTITIONS_AHEAD
+(3) months ahead plus a DEFAULT partition, and copies the existing rows
+over. The primary key becomes (id, created_at), as partitioned tables
+require. Also adds message_archives, which indexes the per-user segments
+of partitions moved to archive files by app.archive_messages.
+
+The copy rewrites the whole table while holding its lock, so run this in a
+maintenance window on large databases.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+COLUMNS = "id, user_id, role, content, created_at, is_onboarding, token_count"
+
+
+def _create_messages(primary_key, partitioned):
+    op.execute(f"""
+        CREATE TABLE messages (
+            id UUID NOT NULL,
+            user_id UUID NOT NULL REFERENCES users (id),
+            role VARCHAR(20) NOT NULL,
+            content TEXT NOT NULL,
+            created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            is_onboarding BOOLEAN,
+            token_count INTEGER,
+            CONSTRAINT messages_pkey PRIMARY KEY ({primary_key})
+        ){" PARTITION BY RANGE (created_at)" if partitioned else ""}
+    """)
+
+
+def _rename_messages(suffix):
+    """Move the current table and its index names out of the way."""
+    op.execute(f"ALTER TABLE messages RENAME TO messages_{suffix}")
+    op.execute(f"ALTER INDEX IF EXISTS messages_pkey RENAME TO messages_{suffix}_pkey")
+    op.execute(f"ALTER INDEX IF EXISTS ix_messages_user_created_id RENAME TO ix_messages_{suffix}_user_created_id")
+    op.execute(f"ALTER INDEX IF EXISTS ix_messages_created_at RENAME TO ix_messages_{suffix}_created_at")
+
+
+def _create_indexes():
+    # Built after the copy; on a partitioned table each partition gets its own
+    op.create_index(
+        "ix_messages_user_created_id",
+        "messages",
+        ["user_id", sa.text("created_at DESC"), sa.text("id DESC")]
+    )
+    op.create_index("ix_messages_created_at", "messages", ["created_at"])
+
+
+def upgrade():
+    _rename_messages("unpartitioned")
+    _create_messages("id, created_at", partitioned=True)
+
+    # Same naming as PartitionService (messages_yYYYYmMM)
+    op.execute("CREATE TABLE messages_default PARTITION OF messages DEFAULT")
+    op.execute("""
+        DO $$
+        DECLARE
+            partition_start timestamp;
+        BEGIN
+            FOR partition_start IN
+                SELECT generate_series(
+                    date_trunc('month', LEAST(
+                        (SELECT MIN(created_at) FROM messages_unpartitioned),
+                        now() AT TIME ZONE 'UTC'
+                    )),
+                    date_trunc('month', now() AT TIME ZONE 'UTC') + interval '3 months',
+                    interval '1 month'
+                )
+            LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF messages FOR VALUES FROM (%L) TO (%L)',
+                    'messages_y' || to_char(partition_start, 'YYYY') || 'm' || to_char(partition_start, 'MM'),
+                    partition_start,
+                    partition_start + interval '1 month'
+                );
+            END LOOP;
+        END $$
+    """)
+
+    op.execute(f"INSERT INTO messages ({COLUMNS}) SELECT {COLUMNS} FROM messages_unpartitioned")
+    _create_indexes()
+    op.drop_table("messages_unpartitioned")
+
+    op.create_table(
+        "message_archives",
+        sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column("user_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("partition", sa.String(63), nullable=False),
+        sa.Column("path", sa.String(255), nullable=False),
+        sa.Column("offset", sa.BigInteger(), nullable=False),
+        sa.Column("length", sa.BigInteger(), nullable=False),
+        sa.Column("message_count", sa.Integer(), nullable=False),
+        sa.Column("user_message_count", sa.Integer(), nullable=False),
+        sa.Column("onboarding_message_count", sa.Integer(), nullable=False),
+        sa.Column("first_created_at", sa.DateTime(), nullable=False),
+        sa.Column("last_created_at", sa.DateTime(), nullable=False),
+        sa.Column("archived_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index(
+        "ix_message_archives_user_last_created",
+        "message_archives",
+        ["user_id", sa.text("last_created_at DESC")]
+    )
+
+
+def downgrade():
+    # Archived messages stay in their files; restore them with
+    # python -m app.import_history <file> before downgrading if needed
+    op.drop_index("ix_message_archives_user_last_created", table_name="message_archives")
+    op.drop_table("message_archives")
+
+    _rename_messages("partitioned")
+    _create_messages("id", partitioned=False)
+    op.execute(f"INSERT INTO messages ({COLUMNS}) SELECT {COLUMNS} FROM messages_partitioned")
+    _create_indexes()
+    # Drops every partition with it
+    op.drop_table("messages_partitioned")
@@ -0,0 +1,47 @@
+"""
+Shared fixtures: a throwaway SQLite database and no external services.
+
+Settings and the database engine are created when app modules are first
+imported, so the environment is set here before any test imports them.
+Redis points at a closed port: cache calls fail fast and fall back the way
+they do in production when Redis is down.
+"""
+import os
+import tempfile
+
+_DATA_DIR = tempfile.mkdtemp(prefix="disha-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_DATA_DIR}/test.db"
+os.environ["REDIS_URL"] = "redis://127.0.0.1:1/0"
+os.environ.setdefault("OPENROUTER_API_KEY", "test")
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def engine():
+    from app.database import Base, engine
+    from app import models  # noqa: F401 (registers the tables)
+
+    Base.metadata.create_all(engine)
+    return engine
+
+
+@pytest.fixture
+def db(engine):
+    from app.database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def user(db):
+    from app.models import User
+
+    user = User(name="Test User")
+    db.add(user)
+    db.commit()
+    return user
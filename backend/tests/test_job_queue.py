@@ -0,0 +1,68 @@
+"""Tests for the Redis fallback and full-queue drops in job_queue."""
+import asyncio
+import threading
+import pytest
+from app.config import settings
+from app.services import job_queue as job_queue_module
+from app.services.job_queue import JobQueue
+
+
+class DownRedis:
+    """Stream client whose group exists but which cannot take new entries."""
+
+    async def xgroup_create(self, *args, **kwargs):
+        return True
+
+    async def xautoclaim(self, *args, **kwargs):
+        return "0-0", [], []
+
+    async def xreadgroup(self, *args, **kwargs):
+        await asyncio.sleep(0.01)
+        return []
+
+    async def xadd(self, *args, **kwargs):
+        raise ConnectionError("Connection refused")
+
+
+@pytest.fixture
+def redis_down(monkeypatch):
+    monkeypatch.setattr(settings, "JOB_QUEUE_BACKEND", "redis")
+    monkeypatch.setattr(job_queue_module.cache_service, "async_client", DownRedis())
+
+
+@pytest.mark.asyncio
+async def test_jobs_go_to_the_local_queue_when_redis_is_down(redis_down):
+    queue = JobQueue()
+    ran = []
+    queue.register("record", lambda payload: ran.append(payload["n"]))
+    await queue.start()
+    assert queue.backend == "redis"
+
+    assert await queue.enqueue("record", {"n": 1})
+    # Queued for a worker rather than run before enqueue returned
+    assert ran == []
+
+    await queue.stop()
+    assert ran == [1]
+    assert queue.stats()["processed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_full_local_queue_drops_and_counts(redis_down, monkeypatch):
+    monkeypatch.setattr(settings, "JOB_LOCAL_QUEUE_SIZE", 1)
+    queue = JobQueue()
+    release = threading.Event()
+    queue.register("slow", lambda payload: release.wait(1))
+    await queue.start()
+    dropped = job_queue_module.jobs_dropped
+
+    assert await queue.enqueue("slow", {})
+    await asyncio.sleep(0.01)  # The worker takes the first job
+    assert await queue.enqueue("slow", {})
+    before = dropped.value(type="slow")
+    assert not await queue.enqueue("slow", {})
+
+    assert queue.stats()["dropped"] == 1
+    assert dropped.value(type="slow") == before + 1
+    release.set()
+    await queue.stop()
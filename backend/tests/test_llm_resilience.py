@@ -0,0 +1,243 @@
+"""Tests for circuit breaking, hedging and deadlines in llm_resilience."""
+import asyncio
+import time
+from types import SimpleNamespace
+import pytest
+from app.config import settings
+from app.services import llm_resilience as resilience_module
+from app.services.llm_resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    LLMDeadlineExceeded,
+    LLMResilience,
+)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Manual clock for the breaker; asyncio keeps the real one."""
+    now = {"value": 1000.0}
+    monkeypatch.setattr(resilience_module, "time", SimpleNamespace(
+        monotonic=lambda: now["value"],
+        perf_counter=time.perf_counter
+    ))
+
+    def advance(seconds):
+        now["value"] += seconds
+
+    return advance
+
+
+@pytest.fixture(autouse=True)
+def resilience_settings(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_FALLBACK_MODEL", "fallback")
+    monkeypatch.setattr(settings, "LLM_BREAKER_FAILURE_THRESHOLD", 2)
+    monkeypatch.setattr(settings, "LLM_BREAKER_RESET_TIMEOUT", 30.0)
+    monkeypatch.setattr(settings, "LLM_RETRY_BASE_DELAY", 0.001)
+    monkeypatch.setattr(settings, "LLM_HEDGE_MIN_SAMPLES", 1)
+    monkeypatch.setattr(settings, "LLM_HEDGE_MIN_DELAY", 0.05)
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("primary")
+
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.is_open()
+    assert not breaker.allow()
+
+
+def test_breaker_lets_one_probe_through_after_reset_timeout(clock):
+    breaker = CircuitBreaker("primary")
+    breaker.record_failure()
+    breaker.record_failure()
+
+    clock(settings.LLM_BREAKER_RESET_TIMEOUT)
+    assert not breaker.is_open()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # The probe is in flight; nothing else gets through
+    assert breaker.is_open()
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens_the_breaker(clock):
+    breaker = CircuitBreaker("primary")
+    breaker.record_failure()
+    breaker.record_failure()
+    clock(settings.LLM_BREAKER_RESET_TIMEOUT)
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    clock(settings.LLM_BREAKER_RESET_TIMEOUT)
+    assert breaker.allow()
+
+
+def test_available_models_does_not_claim_the_probe(clock):
+    resilience = LLMResilience()
+    breaker = resilience.breaker("fallback")
+    breaker.record_failure()
+    breaker.record_failure()
+    assert resilience.available_models("primary") == ["primary"]
+
+    clock(settings.LLM_BREAKER_RESET_TIMEOUT)
+    for _ in range(3):
+        assert resilience.available_models("primary") == ["primary", "fallback"]
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.allow()
+
+
+async def settle():
+    """Let cancelled losing requests finish before the loop closes."""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+class FakeModels:
+    """create() for complete(): per-model delay and result or exception."""
+
+    def __init__(self, **behaviour):
+        self.behaviour = behaviour
+        self.calls = []
+        self.started = asyncio.get_running_loop().time()
+
+    async def create(self, model, timeout):
+        self.calls.append((model, asyncio.get_running_loop().time() - self.started))
+        delay, outcome = self.behaviour[model]
+        await asyncio.sleep(delay)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+
+@pytest.mark.asyncio
+async def test_fast_primary_is_not_hedged():
+    resilience = LLMResilience()
+    resilience.latency("primary").record(0.01)
+    models = FakeModels(primary=(0.0, "primary"), fallback=(0.0, "fallback"))
+
+    assert await resilience.complete(models.create, "primary") == "primary"
+    assert [model for model, _ in models.calls] == ["primary"]
+
+
+@pytest.mark.asyncio
+async def test_slow_primary_is_hedged_after_the_latency_percentile():
+    resilience = LLMResilience()
+    resilience.latency("primary").record(0.01)
+    models = FakeModels(primary=(5.0, "primary"), fallback=(0.0, "fallback"))
+
+    assert await resilience.complete(models.create, "primary") == "fallback"
+
+    (_, primary_at), (hedge_model, hedged_at) = models.calls
+    assert hedge_model == "fallback"
+    # Hedged at LLM_HEDGE_MIN_DELAY (above the recorded p95), not before
+    assert settings.LLM_HEDGE_MIN_DELAY <= hedged_at - primary_at < 1.0
+    await settle()
+
+
+@pytest.mark.asyncio
+async def test_no_hedge_without_latency_samples():
+    resilience = LLMResilience()
+    models = FakeModels(primary=(0.1, "primary"), fallback=(0.0, "fallback"))
+
+    assert await resilience.complete(models.create, "primary") == "primary"
+    assert [model for model, _ in models.calls] == ["primary"]
+
+
+@pytest.mark.asyncio
+async def test_failed_primary_fails_over_within_the_attempt():
+    resilience = LLMResilience()
+    models = FakeModels(primary=(0.0, asyncio.TimeoutError()), fallback=(0.0, "fallback"))
+
+    assert await resilience.complete(models.create, "primary") == "fallback"
+    assert resilience.breaker("primary").failures == 1
+
+
+@pytest.mark.asyncio
+async def test_deadline_bounds_retries(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_FALLBACK_MODEL", "")
+    monkeypatch.setattr(settings, "LLM_DEADLINE", 0.2)
+    monkeypatch.setattr(settings, "LLM_ATTEMPT_TIMEOUT", 0.05)
+    monkeypatch.setattr(settings, "LLM_MAX_ATTEMPTS", 100)
+    monkeypatch.setattr(settings, "LLM_BREAKER_FAILURE_THRESHOLD", 1000)
+    resilience = LLMResilience()
+    models = FakeModels(primary=(10.0, "primary"))
+
+    started = time.perf_counter()
+    with pytest.raises(LLMDeadlineExceeded):
+        await resilience.complete(models.create, "primary")
+
+    assert time.perf_counter() - started < settings.LLM_DEADLINE + 0.1
+    assert 2 <= len(models.calls) <= 4
+    await settle()
+
+
+@pytest.mark.asyncio
+async def test_hanging_model_trips_the_breaker(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_FALLBACK_MODEL", "")
+    monkeypatch.setattr(settings, "LLM_DEADLINE", 0.05)
+    monkeypatch.setattr(settings, "LLM_ATTEMPT_TIMEOUT", 0.02)
+    monkeypatch.setattr(settings, "LLM_MAX_ATTEMPTS", 1)
+    resilience = LLMResilience()
+    models = FakeModels(primary=(10.0, "primary"))
+
+    for _ in range(settings.LLM_BREAKER_FAILURE_THRESHOLD):
+        with pytest.raises(LLMDeadlineExceeded):
+            await resilience.complete(models.create, "primary")
+    assert resilience.breaker("primary").is_open()
+
+    started = time.perf_counter()
+    with pytest.raises(CircuitOpenError):
+        await resilience.complete(models.create, "primary")
+    assert time.perf_counter() - started < 0.01
+    assert len(models.calls) == settings.LLM_BREAKER_FAILURE_THRESHOLD
+    await settle()
+
+
+@pytest.mark.asyncio
+async def test_hedge_loser_is_not_counted_as_a_failure():
+    resilience = LLMResilience()
+    resilience.latency("primary").record(0.01)
+    models = FakeModels(primary=(5.0, "primary"), fallback=(0.0, "fallback"))
+
+    assert await resilience.complete(models.create, "primary") == "fallback"
+    await settle()
+    assert resilience.breaker("primary").failures == 0
+
+
+@pytest.mark.asyncio
+async def test_non_retryable_error_is_raised_without_retry():
+    resilience = LLMResilience()
+    models = FakeModels(primary=(0.0, ValueError("bad request")), fallback=(0.0, ValueError("bad request")))
+
+    with pytest.raises(ValueError):
+        await resilience.complete(models.create, "primary")
+    assert len(models.calls) == 2  # Primary, then the failover in the same attempt
+    assert resilience.breaker("primary").failures == 0
+
+
+@pytest.mark.asyncio
+async def test_open_circuits_fail_fast():
+    resilience = LLMResilience()
+    for model in ("primary", "fallback"):
+        resilience.breaker(model).record_failure()
+        resilience.breaker(model).record_failure()
+    models = FakeModels(primary=(0.0, "primary"), fallback=(0.0, "fallback"))
+
+    with pytest.raises(CircuitOpenError):
+        await resilience.complete(models.create, "primary")
+    assert models.calls == []
@@ -0,0 +1,135 @@
+"""Tests for fair queuing and overload rejection in llm_scheduler."""
+import asyncio
+import pytest
+from app.config import settings
+from app.services.llm_scheduler import LLMOverloadedError, LLMScheduler
+
+
+def make_scheduler(max_concurrency=1, max_queue_depth=10):
+    scheduler = LLMScheduler()
+    scheduler.max_concurrency = max_concurrency
+    scheduler.max_queue_depth = max_queue_depth
+    return scheduler
+
+
+async def settle():
+    """Let queued tasks run up to their next await."""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def queue_calls(scheduler, calls):
+    """Start a waiting acquire per (label, user, priority); returns (grant order, tasks)."""
+    granted = []
+
+    async def call(label, user_id, priority):
+        await scheduler.acquire(user_id, priority)
+        granted.append(label)
+
+    tasks = [asyncio.ensure_future(call(*spec)) for spec in calls]
+    await settle()
+    return granted, tasks
+
+
+async def release_all(scheduler, count):
+    for _ in range(count):
+        scheduler.release()
+        await settle()
+
+
+@pytest.mark.asyncio
+async def test_waiting_users_are_served_round_robin():
+    scheduler = make_scheduler()
+    await scheduler.acquire("busy")
+
+    chat = LLMScheduler.PRIORITY_CHAT
+    granted, tasks = await queue_calls(scheduler, [
+        ("a1", "a", chat), ("a2", "a", chat), ("a3", "a", chat),
+        ("b1", "b", chat),
+        ("c1", "c", chat), ("c2", "c", chat),
+    ])
+    assert scheduler.queued == 6 and granted == []
+
+    await release_all(scheduler, 6)
+
+    assert granted == ["a1", "b1", "c1", "a2", "c2", "a3"]
+    assert scheduler.active == 1 and scheduler.queued == 0
+    await asyncio.gather(*tasks)
+
+
+@pytest.mark.asyncio
+async def test_onboarding_is_served_before_chat():
+    scheduler = make_scheduler()
+    await scheduler.acquire("busy")
+
+    granted, tasks = await queue_calls(scheduler, [
+        ("chat-a", "a", LLMScheduler.PRIORITY_CHAT),
+        ("chat-b", "b", LLMScheduler.PRIORITY_CHAT),
+        ("onboarding-c", "c", scheduler.priority_for(is_onboarding=True)),
+    ])
+    await release_all(scheduler, 3)
+
+    assert granted == ["onboarding-c", "chat-a", "chat-b"]
+    await asyncio.gather(*tasks)
+
+
+@pytest.mark.asyncio
+async def test_calls_run_immediately_below_the_cap():
+    scheduler = make_scheduler(max_concurrency=2)
+
+    async with scheduler.slot("a"):
+        async with scheduler.slot("a"):
+            assert scheduler.stats()["active"] == 2
+            assert scheduler.queued == 0
+
+    assert scheduler.active == 0
+
+
+@pytest.mark.asyncio
+async def test_full_queue_rejects_immediately():
+    scheduler = make_scheduler(max_queue_depth=1)
+    await scheduler.acquire("busy")
+    _, tasks = await queue_calls(scheduler, [("waiting", "a", LLMScheduler.PRIORITY_CHAT)])
+
+    assert not scheduler.has_capacity()
+    with pytest.raises(LLMOverloadedError) as rejected:
+        await scheduler.acquire("b")
+    assert rejected.value.reason == "queue_full"
+
+    await release_all(scheduler, 1)
+    await asyncio.gather(*tasks)
+    assert scheduler.has_capacity()
+
+
+@pytest.mark.asyncio
+async def test_waiting_too_long_is_rejected_and_dequeued(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_QUEUE_TIMEOUT", 0.02)
+    scheduler = make_scheduler()
+    await scheduler.acquire("busy")
+
+    with pytest.raises(LLMOverloadedError) as rejected:
+        await scheduler.acquire("a")
+    assert rejected.value.reason == "timeout"
+    assert scheduler.queued == 0
+
+    # The abandoned waiter is not handed the slot
+    scheduler.release()
+    assert scheduler.active == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_is_skipped():
+    scheduler = make_scheduler()
+    await scheduler.acquire("busy")
+    granted, tasks = await queue_calls(scheduler, [
+        ("a1", "a", LLMScheduler.PRIORITY_CHAT),
+        ("b1", "b", LLMScheduler.PRIORITY_CHAT),
+    ])
+
+    tasks[0].cancel()
+    await settle()
+    assert scheduler.queued == 1
+
+    await release_all(scheduler, 1)
+    assert granted == ["b1"]
+    await tasks[1]
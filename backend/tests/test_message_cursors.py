@@ -0,0 +1,141 @@
+"""Tests for keyset cursors and history paging in message_service."""
+import gzip
+import json
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import httpx
+import pytest
+from app.config import settings
+from app.models import Message, MessageArchive
+from app.services.archive_service import message_record
+from app.services.message_service import InvalidCursorError, message_service
+
+
+START = datetime(2025, 3, 1, 9, 30)
+
+
+def add_messages(db, user, timestamps):
+    """Store one message per timestamp; returns them newest first by (created_at, id)."""
+    messages = [
+        Message(user_id=user.id, role="user", content=f"message {index}", created_at=created_at)
+        for index, created_at in enumerate(timestamps)
+    ]
+    db.add_all(messages)
+    db.commit()
+    return sorted(messages, key=lambda message: (message.created_at, message.id), reverse=True)
+
+
+def page_all(db, user, limit):
+    """Follow cursors through a user's whole history."""
+    pages, before = [], None
+    while True:
+        page, has_more = message_service.get_page(db, user.id, before=before, limit=limit)
+        pages.append(page)
+        if not has_more:
+            return pages
+        before = message_service.decode_cursor(message_service.encode_cursor(page[-1]))
+
+
+def test_cursor_round_trip():
+    message = Message(id=uuid.uuid4(), created_at=START.replace(microsecond=123456))
+
+    cursor = message_service.encode_cursor(message)
+
+    assert "=" not in cursor
+    assert message_service.decode_cursor(cursor) == (message.created_at, message.id)
+
+
+@pytest.mark.parametrize("cursor", ["", "not-a-cursor", "bm9waXBl", str(uuid.uuid4())])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(InvalidCursorError):
+        message_service.decode_cursor(cursor)
+
+
+def test_paging_through_shared_timestamps_has_no_gaps_or_duplicates(db, user):
+    # Five messages per timestamp, so page boundaries fall inside a group
+    expected = add_messages(db, user, [START + timedelta(seconds=index // 5) for index in range(23)])
+
+    pages = page_all(db, user, limit=7)
+
+    assert [len(page) for page in pages] == [7, 7, 7, 2]
+    assert [message.id for page in pages for message in page] == [message.id for message in expected]
+
+
+def test_page_of_exact_size_reports_no_more(db, user):
+    add_messages(db, user, [START] * 4)
+
+    page, has_more = message_service.get_page(db, user.id, limit=4)
+
+    assert len(page) == 4
+    assert not has_more
+
+
+def write_archive(db, user, messages, directory):
+    """Write messages as one archived segment, the way archive_partition does."""
+    rows = sorted(messages, key=lambda message: (message.created_at, message.id), reverse=True)
+    data = gzip.compress("".join(json.dumps(message_record(row)) + "\n" for row in rows).encode())
+    path = "messages_y2024m01-test.ndjson.gz"
+    (directory / path).write_bytes(data)
+    db.add(MessageArchive(
+        user_id=user.id,
+        partition="messages_y2024m01",
+        path=path,
+        offset=0,
+        length=len(data),
+        message_count=len(rows),
+        user_message_count=len(rows),
+        onboarding_message_count=0,
+        first_created_at=rows[-1].created_at,
+        last_created_at=rows[0].created_at
+    ))
+    db.commit()
+    return rows
+
+
+def test_paging_continues_into_archived_messages(db, user, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "ARCHIVE_DIR", str(tmp_path))
+    archived = write_archive(db, user, [
+        SimpleNamespace(
+            id=uuid.uuid4(),
+            user_id=user.id,
+            role="user",
+            content=f"archived {index}",
+            # Shared timestamps inside the archive too
+            created_at=datetime(2024, 1, 10) + timedelta(minutes=index // 3),
+            is_onboarding=False,
+            token_count=3
+        )
+        for index in range(9)
+    ], tmp_path)
+    live = add_messages(db, user, [START + timedelta(seconds=index) for index in range(5)])
+
+    pages = page_all(db, user, limit=4)
+
+    assert [len(page) for page in pages] == [4, 4, 4, 2]
+    # The second page straddles live and archived messages
+    assert [message.id for page in pages for message in page] == (
+        [message.id for message in live] + [row.id for row in archived]
+    )
+
+
+@pytest.mark.asyncio
+async def test_history_route_accepts_legacy_message_id_cursor(db, user):
+    from app.main import app
+
+    messages = add_messages(db, user, [START] * 3 + [START + timedelta(seconds=1)] * 3)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.get(
+            "/api/messages",
+            params={"user_id": str(user.id), "before": str(messages[2].id), "limit": 10}
+        )
+        assert response.status_code == 200
+        body = response.json()
+        # Everything strictly before the cursor message, oldest first
+        assert [item["id"] for item in body["messages"]] == [str(message.id) for message in reversed(messages[3:])]
+        assert body["has_more"] is False
+        assert body["next_cursor"] is None
+
+        response = await client.get("/api/messages", params={"user_id": str(user.id), "before": "bad!"})
+        assert response.status_code == 400
@@ -0,0 +1,121 @@
+"""Tests for rule matching and model choice in model_router."""
+import pytest
+from app.config import settings
+from app.services import model_router as router_module
+from app.services.llm_resilience import LLMResilience
+from app.services.model_router import ModelRouter
+from app.services.protocol_service import ProtocolSnapshot
+
+
+@pytest.fixture(autouse=True)
+def resilience(monkeypatch):
+    """Fresh breakers and latency samples for each test."""
+    resilience = LLMResilience()
+    monkeypatch.setattr(router_module, "llm_resilience", resilience)
+    monkeypatch.setattr(settings, "AI_MODEL", "default-model")
+    monkeypatch.setattr(settings, "AI_MAX_TOKENS", 500)
+    monkeypatch.setattr(settings, "LLM_BREAKER_FAILURE_THRESHOLD", 1)
+    return resilience
+
+
+def protocol(name):
+    return ProtocolSnapshot(id=name, name=name, description=name, keywords=[name])
+
+
+def context(tokens):
+    """A context of roughly this many tokens."""
+    return [{"role": "user", "content": "word " * int(tokens * 4 / 5)}]
+
+
+RULES = [
+    {"name": "onboarding", "when": {"onboarding": True}, "models": ["small"], "max_tokens": 250},
+    {"name": "emergency", "when": {"protocols": ["Chest Pain"]}, "models": ["large"], "max_tokens": 800},
+    {"name": "multi", "when": {"min_protocols": 2}, "models": ["medium"]},
+    {"name": "long", "when": {"min_context_tokens": 2000}, "models": ["long-context"]},
+]
+
+
+def test_default_routes_keep_ai_model_and_max_tokens():
+    assert settings.LLM_ROUTES == []
+    route = ModelRouter().route(context(100), is_onboarding=True)
+
+    assert (route.name, route.model, route.max_tokens) == ("default", "default-model", 500)
+
+
+def test_onboarding_rule():
+    router = ModelRouter(RULES)
+
+    assert router.route(context(100), is_onboarding=True).name == "onboarding"
+    assert router.route(context(100), is_onboarding=True).max_tokens == 250
+    assert router.route(context(100), is_onboarding=False).name == "default"
+
+
+def test_protocol_rules():
+    router = ModelRouter(RULES)
+
+    emergency = router.route(context(100), protocols=[protocol("Sleep"), protocol("Chest Pain")])
+    assert (emergency.name, emergency.model, emergency.max_tokens) == ("emergency", "large", 800)
+
+    multi = router.route(context(100), protocols=[protocol("Sleep"), protocol("Stress")])
+    assert (multi.name, multi.model, multi.max_tokens) == ("multi", "medium", 500)
+
+    assert router.route(context(100), protocols=[protocol("Sleep")]).name == "default"
+
+
+def test_context_token_bounds():
+    router = ModelRouter(RULES + [
+        {"name": "short", "when": {"max_context_tokens": 50}, "models": ["tiny"]}
+    ])
+
+    assert router.route(context(3000)).name == "long"
+    assert router.route(context(20)).name == "short"
+    assert router.route(context(500)).name == "default"
+
+
+def test_first_matching_rule_wins():
+    router = ModelRouter(RULES)
+
+    route = router.route(context(3000), is_onboarding=True, protocols=[protocol("Chest Pain")])
+    assert route.name == "onboarding"
+
+
+def test_unknown_condition_is_rejected():
+    with pytest.raises(ValueError):
+        ModelRouter([{"name": "typo", "when": {"onbaording": True}}])
+
+
+def record(resilience, model, *latencies):
+    for latency in latencies:
+        resilience.latency(model).record(latency)
+
+
+def test_cheapest_model_within_latency_budget(resilience):
+    record(resilience, "cheap", 5.0, 6.0, 7.0)
+    record(resilience, "mid", 1.0, 2.0, 9.0)
+    record(resilience, "premium", 0.5, 0.5, 0.5)
+
+    assert ModelRouter.choose_model(["cheap", "mid", "premium"], latency_budget=3.0) == "mid"
+    assert ModelRouter.choose_model(["cheap", "mid", "premium"], latency_budget=10.0) == "cheap"
+    assert ModelRouter.choose_model(["cheap", "mid", "premium"]) == "cheap"
+
+
+def test_unmeasured_model_counts_as_within_budget(resilience):
+    record(resilience, "cheap", 5.0)
+
+    assert ModelRouter.choose_model(["cheap", "new"], latency_budget=1.0) == "new"
+
+
+def test_fastest_median_when_none_fits(resilience):
+    record(resilience, "cheap", 5.0, 5.0, 5.0)
+    record(resilience, "mid", 3.0, 3.0, 30.0)
+
+    assert ModelRouter.choose_model(["cheap", "mid"], latency_budget=1.0) == "mid"
+
+
+def test_open_breakers_are_skipped(resilience):
+    resilience.breaker("cheap").record_failure()
+
+    assert ModelRouter.choose_model(["cheap", "mid"]) == "mid"
+    # With every circuit open, the first candidate is still returned
+    resilience.breaker("mid").record_failure()
+    assert ModelRouter.choose_model(["cheap", "mid"]) == "cheap"
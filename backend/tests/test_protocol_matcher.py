@@ -0,0 +1,117 @@
+"""Tests for keyword matching and matcher invalidation in protocol_service."""
+import uuid
+import pytest
+from app.config import settings
+from app.models import Protocol
+from app.services.cache_service import cache_service
+from app.services.protocol_service import ProtocolMatcher, ProtocolService, ProtocolSnapshot
+
+
+def snapshot(name, *keywords):
+    return ProtocolSnapshot(id=name, name=name, description=name, keywords=list(keywords))
+
+
+def names(protocols):
+    return [protocol.name for protocol in protocols]
+
+
+def test_keywords_match_at_word_start_only():
+    matcher = ProtocolMatcher([snapshot("pain", "ache"), snapshot("nausea", "vomit")])
+
+    assert names(matcher.match("I have an ache in my back")) == ["pain"]
+    assert names(matcher.match("Aches everywhere")) == ["pain"]
+    assert names(matcher.match("I keep vomiting")) == ["nausea"]
+    assert matcher.match("I have a headache") == []
+    assert matcher.match("a toothache and earache") == []
+
+
+def test_matching_is_case_insensitive_and_ignores_blank_keywords():
+    matcher = ProtocolMatcher([snapshot("chest", " Chest Pain ", "", "  ")])
+
+    assert names(matcher.match("CHEST PAIN since morning")) == ["chest"]
+    assert matcher.match("pain in my chest") == []
+
+
+def test_overlapping_keywords_match_every_protocol():
+    protocols = [
+        snapshot("emergency", "chest pain"),
+        snapshot("pain", "pain"),
+        snapshot("cardio", "chest"),
+    ]
+    matcher = ProtocolMatcher(protocols)
+
+    # "chest pain" is found first at its position; "chest" is its prefix,
+    # and "pain" starts a later word
+    assert names(matcher.match("sudden chest pain")) == ["emergency", "pain", "cardio"]
+    assert names(matcher.match("my chest feels tight")) == ["cardio"]
+
+
+def test_prefix_keywords_are_credited_to_their_protocols():
+    protocols = [snapshot("diabetes", "diabetes"), snapshot("diet", "diab")]
+    matcher = ProtocolMatcher(protocols)
+
+    assert names(matcher.match("type 2 diabetes")) == ["diabetes", "diet"]
+    assert names(matcher.match("diabetic diet")) == ["diet"]
+
+
+def test_shared_keyword_matches_all_declaring_protocols_in_order():
+    protocols = [snapshot("a", "sleep"), snapshot("b", "insomnia"), snapshot("c", "sleep")]
+
+    assert names(ProtocolMatcher(protocols).match("can't sleep")) == ["a", "c"]
+
+
+def test_matcher_without_keywords_matches_nothing():
+    assert ProtocolMatcher([]).match("anything") == []
+    assert ProtocolMatcher([snapshot("empty")]).match("anything") == []
+
+
+@pytest.fixture
+def fresh_matcher(monkeypatch, db):
+    """No cached matcher, and a protocol table holding only what the test adds."""
+    monkeypatch.setattr(ProtocolService, "_matcher", None)
+    monkeypatch.setattr(ProtocolService, "_checked_at", 0.0)
+    db.query(Protocol).delete()
+    db.commit()
+    yield
+    db.query(Protocol).delete()
+    db.commit()
+
+
+def add_protocol(db, name, *keywords):
+    db.add(Protocol(name=name, description=name, instructions={}, keywords=list(keywords)))
+    db.commit()
+
+
+def test_prefetched_version_change_rebuilds_matcher(db, fresh_matcher):
+    first, second = uuid.uuid4().hex, uuid.uuid4().hex
+    add_protocol(db, "Sleep", "sleep")
+
+    matcher = ProtocolService.get_matcher(db, version=first)
+    assert names(matcher.match("sleep and stress")) == ["Sleep"]
+    assert ProtocolService.get_matcher(db, version=first) is matcher
+
+    add_protocol(db, "Stress", "stress")
+    rebuilt = ProtocolService.get_matcher(db, version=second)
+    assert rebuilt is not matcher
+    assert rebuilt.version == second
+    assert names(rebuilt.match("sleep and stress")) == ["Sleep", "Stress"]
+
+
+def test_version_is_rechecked_only_after_the_interval(db, fresh_matcher, monkeypatch):
+    versions = iter([uuid.uuid4().hex, uuid.uuid4().hex])
+    current = {"version": next(versions)}
+    monkeypatch.setattr(cache_service, "get_protocol_version", lambda: current["version"])
+    monkeypatch.setattr(settings, "PROTOCOL_VERSION_CHECK_INTERVAL", 3600.0)
+    add_protocol(db, "Sleep", "sleep")
+
+    matcher = ProtocolService.get_matcher(db)
+    current["version"] = next(versions)
+    assert ProtocolService.get_matcher(db) is matcher
+
+    monkeypatch.setattr(settings, "PROTOCOL_VERSION_CHECK_INTERVAL", 0.0)
+    rebuilt = ProtocolService.get_matcher(db)
+    assert rebuilt is not matcher
+    assert rebuilt.version == current["version"]
+
+    # Unchanged stamp: checked again, but the matcher is kept
+    assert ProtocolService.get_matcher(db) is rebuilt
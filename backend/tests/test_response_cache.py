@@ -0,0 +1,75 @@
+"""Tests for response cache eligibility and keys in response_cache."""
+import pytest
+from app.config import settings
+from app.services.protocol_service import ProtocolSnapshot
+from app.services.response_cache import response_cache
+
+
+def protocol(name, cacheable=True):
+    return ProtocolSnapshot(id=name, name=name, description=name, keywords=[name], response_cacheable=cacheable)
+
+
+REFUND = protocol("refund")
+QUESTION = "How do I get a refund?"
+
+
+@pytest.fixture(autouse=True)
+def enabled(monkeypatch):
+    monkeypatch.setattr(settings, "RESPONSE_CACHE_ENABLED", True)
+    monkeypatch.setattr(settings, "RESPONSE_CACHE_MAX_MESSAGE_CHARS", 200)
+
+
+def test_opted_in_protocols_get_a_key():
+    key = response_cache.key_for(QUESTION, [REFUND], "v1")
+
+    assert key is not None
+    assert key.startswith("response:v1:")
+
+
+def test_normalized_message_shares_a_key():
+    assert response_cache.key_for(QUESTION, [REFUND], "v1") == response_cache.key_for(
+        "  how do i GET a refund ", [REFUND], "v1"
+    )
+    assert response_cache.key_for(QUESTION, [REFUND], "v1") != response_cache.key_for(
+        "How do I cancel?", [REFUND], "v1"
+    )
+
+
+def test_any_non_cacheable_protocol_disables_caching():
+    emergency = protocol("chest pain", cacheable=False)
+
+    assert response_cache.key_for(QUESTION, [REFUND, emergency], "v1") is None
+    assert response_cache.key_for(QUESTION, [emergency], "v1") is None
+
+
+def test_no_matched_protocol_disables_caching():
+    assert response_cache.key_for(QUESTION, [], "v1") is None
+
+
+def test_onboarding_turns_are_never_cached():
+    assert response_cache.key_for(QUESTION, [REFUND], "v1", is_onboarding=True) is None
+
+
+def test_long_or_empty_messages_are_not_cached():
+    long_message = "refund " * (settings.RESPONSE_CACHE_MAX_MESSAGE_CHARS // 7 + 1)
+
+    assert response_cache.key_for(long_message, [REFUND], "v1") is None
+    assert response_cache.key_for(" ?! ", [REFUND], "v1") is None
+
+
+def test_disabled_cache_gives_no_key(monkeypatch):
+    monkeypatch.setattr(settings, "RESPONSE_CACHE_ENABLED", False)
+
+    assert response_cache.key_for(QUESTION, [REFUND], "v1") is None
+
+
+def test_protocol_version_and_set_are_part_of_the_key():
+    key = response_cache.key_for(QUESTION, [REFUND], "v1")
+
+    assert response_cache.key_for(QUESTION, [REFUND], "v2") != key
+    assert response_cache.key_for(QUESTION, [REFUND, protocol("billing")], "v1") != key
+    # Matched protocol order does not matter
+    billing = protocol("billing")
+    assert response_cache.key_for(QUESTION, [REFUND, billing], "v1") == response_cache.key_for(
+        QUESTION, [billing, REFUND], "v1"
+    )
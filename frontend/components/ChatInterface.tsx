@@ -12,6 +12,13 @@ interface ChatInterfaceProps {
   userId: string;
 }
 
+// Append messages that are not already displayed (events and responses can
+// deliver the same stored message)
+const mergeMessages = (prev: Message[], incoming: Message[]): Message[] => {
+  const seen = new Set(prev.map((m) => m.id));
+  return [...prev, ...incoming.filter((m) => !seen.has(m.id))];
+};
+
 export default function ChatInterface({ userId }: ChatInterfaceProps) {
   const [messages, setMessages] = useState<Message[]>([]);
   const [inputValue, setInputValue] = useState("");
@@ -129,15 +136,58 @@ export default function ChatInterface({ userId }: ChatInterfaceProps) {
     // Remember if we should auto-scroll
     const shouldAutoScroll = isNearBottom;
 
-    try {
-      const response = await api.sendMessage(userId, content);
+    // Show the user's message and an empty assistant bubble right away,
+    // then fill the bubble in as tokens stream from the server
+    const now = new Date().toISOString();
+    const pendingUserId = `pending-user-${now}`;
+    const pendingAiId = `pending-ai-${now}`;
+    setMessages((prev) => [
+      ...prev,
+      {
+        id: pendingUserId,
+        user_id: userId,
+        role: "user",
+        content,
+        created_at: now,
+        is_onboarding: false,
+      },
+    ]);
 
-      // Add both messages to state
-      setMessages((prev) => [
-        ...prev,
-        response.user_message,
-        response.ai_response,
-      ]);
+    try {
+      let streamedContent = "";
+      const response = await api.sendMessageStream(userId, content, {
+        onToken: (token) => {
+          streamedContent += token;
+          const partial = streamedContent;
+          setMessages((prev) => {
+            const hasBubble = prev.some((m) => m.id === pendingAiId);
+            if (!hasBubble) {
+              return [
+                ...prev,
+                {
+                  id: pendingAiId,
+                  user_id: userId,
+                  role: "assistant",
+                  content: partial,
+                  created_at: new Date().toISOString(),
+                  is_onboarding: false,
+                },
+              ];
+            }
+            return prev.map((m) =>
+              m.id === pendingAiId ? { ...m, content: partial } : m
+            );
+          });
+        },
+      });
+
+      // Replace placeholders with the stored messages
+      setMessages((prev) =>
+        mergeMessages(
+          prev.filter((m) => m.id !== pendingUserId && m.id !== pendingAiId),
+          [response.user_message, response.ai_response]
+        )
+      );
 
       // Only auto-scroll if user was near bottom
       if (shouldAutoScroll) {
@@ -147,6 +197,9 @@ export default function ChatInterface({ userId }: ChatInterfaceProps) {
       }
     } catch (error) {
       console.error("Error sending message:", error);
+      setMessages((prev) =>
+        prev.filter((m) => m.id !== pendingUserId && m.id !== pendingAiId)
+      );
       alert("Failed to send message. Please try again.");
     } finally {
       setIsTyping(false);
@@ -192,23 +245,26 @@ export default function ChatInterface({ userId }: ChatInterfaceProps) {
     prevMessageCountRef.current = messages.length;
   }, [messages, isNearBottom]);
 
-  // Poll typing indicator
+  // Subscribe to pushed typing and message events
   useEffect(() => {
-    if (isTyping) {
-      const interval = setInterval(async () => {
-        try {
-          const status = await api.getTypingStatus(userId);
-          if (!status.is_typing) {
-            setIsTyping(false);
-          }
-        } catch (error) {
-          console.error("Error checking typing status:", error);
-        }
-      }, 1000);
+    const unsubscribe = api.subscribeEvents(userId, {
+      onTyping: (typing) => setIsTyping(typing),
+      onMessage: (message) =>
+        setMessages((prev) =>
+          // Skip messages this tab is already showing as a placeholder
+          prev.some(
+            (m) =>
+              m.id.startsWith("pending-") &&
+              m.role === message.role &&
+              m.content === message.content
+          )
+            ? prev
+            : mergeMessages(prev, [message])
+        ),
+    });
 
-      return () => clearInterval(interval);
-    }
-  }, [isTyping, userId]);
+    return unsubscribe;
+  }, [userId]);
 
   if (isLoading && initialLoad) {
     return (
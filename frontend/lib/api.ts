@@ -57,6 +57,16 @@ export interface ChatResponse {
   ai_response: Message;
 }
 
+export interface StreamHandlers {
+  onToken: (content: string) => void;
+  onError?: (detail: string) => void;
+}
+
+export interface EventHandlers {
+  onTyping?: (isTyping: boolean) => void;
+  onMessage?: (message: Message) => void;
+}
+
 export interface MessageHistoryResponse {
   messages: Message[];
   has_more: boolean;
@@ -104,6 +114,71 @@ export const api = {
     return response.data;
   },
 
+  /**
+   * Send a message and stream the AI response token by token (SSE).
+   * Resolves with both stored messages once the stream completes.
+   */
+  sendMessageStream: async (
+    userId: string,
+    content: string,
+    handlers: StreamHandlers,
+    isOnboarding: boolean = false
+  ): Promise<ChatResponse> => {
+    const response = await fetch(`${API_BASE_URL}/api/messages/stream`, {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+        Accept: "text/event-stream",
+      },
+      body: JSON.stringify({
+        user_id: userId,
+        content,
+        is_onboarding: isOnboarding,
+      }),
+    });
+
+    if (!response.ok || !response.body) {
+      throw new Error(`Stream request failed with status ${response.status}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    let result: ChatResponse | null = null;
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      // SSE frames are separated by a blank line
+      let boundary = buffer.indexOf("\n\n");
+      while (boundary !== -1) {
+        const frame = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+        boundary = buffer.indexOf("\n\n");
+
+        let event = "message";
+        let data = "";
+        for (const line of frame.split("\n")) {
+          if (line.startsWith("event: ")) event = line.slice(7);
+          else if (line.startsWith("data: ")) data += line.slice(6);
+        }
+        if (!data) continue;
+
+        const payload = JSON.parse(data);
+        if (event === "token") handlers.onToken(payload.content);
+        else if (event === "error") handlers.onError?.(payload.detail);
+        else if (event === "done") result = payload as ChatResponse;
+      }
+    }
+
+    if (!result) {
+      throw new Error("Stream ended before completion");
+    }
+    return result;
+  },
+
   /**
    * Get message history with pagination
    */
@@ -124,7 +199,25 @@ export const api = {
   },
 
   /**
-   * Get typing indicator status
+   * Subscribe to pushed typing and new-message events (SSE).
+   * Returns a function that closes the connection.
+   */
+  subscribeEvents: (userId: string, handlers: EventHandlers): (() => void) => {
+    const source = new EventSource(`${API_BASE_URL}/api/events/${userId}`);
+
+    source.addEventListener("typing", (event) => {
+      const payload = JSON.parse((event as MessageEvent).data);
+      handlers.onTyping?.(payload.is_typing);
+    });
+    source.addEventListener("message", (event) => {
+      handlers.onMessage?.(JSON.parse((event as MessageEvent).data));
+    });
+
+    return () => source.close();
+  },
+
+  /**
+   * Get typing indicator status (polling; prefer subscribeEvents)
    */
   getTypingStatus: async (
     userId: string